@@ -0,0 +1,59 @@
+"""user_items delta sync
+
+Revision ID: 1722747bf86c
+Revises: fe095fe48d13
+Create Date: 2026-10-17 16:12:55.804113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1722747bf86c'
+down_revision: Union[str, Sequence[str], None] = 'fe095fe48d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # constant / stable defaults: no table rewrite on Postgres 11+
+    op.add_column('user_items', sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'))
+    op.add_column('user_items', sa.Column(
+        'updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now(),
+    ))
+
+    op.create_table('user_item_tombstones',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('external_id', sa.String(), nullable=True),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_item_tombstones_user_id_version_id', 'user_item_tombstones', ['user_id', 'version', 'id'])
+    op.create_index('ix_user_item_tombstones_deleted_at', 'user_item_tombstones', ['deleted_at'])
+
+    with op.get_context().autocommit_block():
+        # GET /user/items/changes: WHERE user_id = ? AND (version, id) > (?, ?)
+        op.create_index(
+            'ix_user_items_user_id_version_id', 'user_items', ['user_id', 'version', 'id'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_items_user_id_version_id', table_name='user_items',
+            postgresql_concurrently=True, if_exists=True,
+        )
+    op.drop_index('ix_user_item_tombstones_deleted_at', table_name='user_item_tombstones')
+    op.drop_index('ix_user_item_tombstones_user_id_version_id', table_name='user_item_tombstones')
+    op.drop_table('user_item_tombstones')
+    op.drop_column('user_items', 'updated_at')
+    op.drop_column('user_items', 'version')
@@ -0,0 +1,49 @@
+"""items full-text search
+
+Locks `items`: adding a STORED generated column rewrites the whole table
+under ACCESS EXCLUSIVE, so reads and writes of items (every search and
+list request) wait for the rewrite, which takes as long as copying the
+table. Only the index that follows is built without blocking writes.
+On a large catalog run this in a quiet period, or replace it with a
+plain nullable column kept up by a trigger and backfilled in batches.
+
+Revision ID: 3086a73cdbca
+Revises: 59d86fdcd924
+Create Date: 2026-10-17 13:27:51.804466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3086a73cdbca'
+down_revision: Union[str, Sequence[str], None] = '59d86fdcd924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rewrites the table under ACCESS EXCLUSIVE (see the module docstring).
+    # Maintained by Postgres on every insert/update of name or description.
+    # 'simple' config: no stemming or stop words, titles are multilingual.
+    op.execute("""
+        ALTER TABLE items ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))
+        ) STORED
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_items_search_vector', 'items', ['search_vector'],
+            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_items_search_vector', table_name='items')
+    op.drop_column('items', 'search_vector')
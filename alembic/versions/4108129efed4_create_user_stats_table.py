@@ -0,0 +1,47 @@
+"""create user_stats table
+
+Revision ID: 4108129efed4
+Revises: 3086a73cdbca
+Create Date: 2026-10-17 14:48:09.371525
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4108129efed4'
+down_revision: Union[str, Sequence[str], None] = '3086a73cdbca'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'status', 'type')
+    )
+
+    # Backfill from the existing lists
+    op.execute("""
+        INSERT INTO user_stats (user_id, status, type, item_count, rating_sum, rating_count)
+        SELECT ui.user_id, coalesce(ui.status, ''), coalesce(i.type, ''),
+               count(*), coalesce(sum(ui.rating), 0), count(ui.rating)
+        FROM user_items ui
+        JOIN items i ON i.id = ui.item_id
+        WHERE ui.user_id IS NOT NULL
+        GROUP BY ui.user_id, coalesce(ui.status, ''), coalesce(i.type, '')
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_stats')
@@ -0,0 +1,38 @@
+"""unique user_items (user_id, item_id)
+
+Revision ID: 4a6ad8123f6d
+Revises: efd3463ca9b4
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a6ad8123f6d'
+down_revision: Union[str, Sequence[str], None] = 'efd3463ca9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Collapse duplicates left by concurrent adds, keeping the oldest entry
+    op.execute("""
+        DELETE FROM user_items a
+        USING user_items b
+        WHERE a.user_id = b.user_id
+          AND a.item_id = b.item_id
+          AND a.id > b.id
+    """)
+    op.create_unique_constraint(
+        'uq_user_items_user_id_item_id', 'user_items', ['user_id', 'item_id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_user_items_user_id_item_id', 'user_items', type_='unique')
@@ -0,0 +1,65 @@
+"""user_items query indexes
+
+Revision ID: 59d86fdcd924
+Revises: 4a6ad8123f6d
+Create Date: 2026-10-17 11:02:18.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '59d86fdcd924'
+down_revision: Union[str, Sequence[str], None] = '4a6ad8123f6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction, and avoids locking
+    # user_items against writes while the indexes build.
+    with op.get_context().autocommit_block():
+        # list / export / keyset pagination: WHERE user_id = ? ORDER BY id
+        op.create_index(
+            'ix_user_items_user_id_id', 'user_items', ['user_id', 'id'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # status-filtered lists
+        op.create_index(
+            'ix_user_items_user_id_status', 'user_items', ['user_id', 'status'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # duplicates of the primary key indexes
+        op.drop_index(
+            'ix_users_id', table_name='users',
+            postgresql_concurrently=True, if_exists=True,
+        )
+        op.drop_index(
+            'ix_items_id', table_name='items',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_items_id', 'items', ['id'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_users_id', 'users', ['id'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_user_items_user_id_status', table_name='user_items',
+            postgresql_concurrently=True, if_exists=True,
+        )
+        op.drop_index(
+            'ix_user_items_user_id_id', table_name='user_items',
+            postgresql_concurrently=True, if_exists=True,
+        )
@@ -0,0 +1,38 @@
+"""create enrichment_jobs table
+
+Revision ID: 8dac6ff1a495
+Revises: 1722747bf86c
+Create Date: 2026-10-17 18:40:12.316954
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8dac6ff1a495'
+down_revision: Union[str, Sequence[str], None] = '1722747bf86c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('enrichment_jobs',
+        sa.Column('external_id', sa.String(), nullable=False),
+        sa.Column('item_id', sa.Integer(), sa.ForeignKey('items.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('run_after', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('external_id')
+    )
+    op.create_index('ix_enrichment_jobs_run_after', 'enrichment_jobs', ['run_after'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_enrichment_jobs_run_after', table_name='enrichment_jobs')
+    op.drop_table('enrichment_jobs')
@@ -0,0 +1,41 @@
+"""add users.list_version
+
+Revision ID: fe095fe48d13
+Revises: 4108129efed4
+Create Date: 2026-10-17 15:31:42.106384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fe095fe48d13'
+down_revision: Union[str, Sequence[str], None] = '4108129efed4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # constant default: no table rewrite on Postgres 11+
+    op.add_column('users', sa.Column('list_version', sa.BigInteger(), nullable=False, server_default='0'))
+
+    with op.get_context().autocommit_block():
+        # catalog updates find the lists that contain an item
+        op.create_index(
+            'ix_user_items_item_id', 'user_items', ['item_id'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_items_item_id', table_name='user_items',
+            postgresql_concurrently=True, if_exists=True,
+        )
+    op.drop_column('users', 'list_version')
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app import metrics
+from app.database import env_flag
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Admission Configuration
+# =========================
+ADMISSION_ENABLED = env_flag("ADMISSION_ENABLED", "true")
+ADMISSION_RATE_LIMITS = env_flag("ADMISSION_RATE_LIMITS", "true")
+# memory: token buckets per process; redis: shared by every worker (REDIS_URL)
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory")
+# Retry-After of 503 answers from a full or slow queue
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+# Clients whose token buckets a worker keeps (least recently seen dropped)
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "100000"))
+
+# Bypass admission entirely, so health checks and scrapes always get through
+PROTECTED_PATHS = frozenset({"/health", "/ready", "/metrics"})
+
+
+@dataclass
+class Lane:
+    name: str
+    concurrency: int  # requests running at once; 0 for no limit
+    queue: int  # requests allowed to wait for a slot
+    queue_timeout: float  # longest a request waits before a 503
+    rate: float  # requests per second per client; 0 for no rate limit
+    burst: int  # bucket size: requests a client may send at once
+
+
+def lane_from_env(name: str, concurrency: int, queue: int, queue_timeout: float, rate: float, burst: int) -> Lane:
+    """A lane with defaults overridable by ADMISSION_<NAME>_<SETTING>."""
+    prefix = f"ADMISSION_{name.upper()}_"
+    return Lane(
+        name=name,
+        concurrency=int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+        queue=int(os.getenv(prefix + "QUEUE", queue)),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_SECONDS", queue_timeout)),
+        rate=float(os.getenv(prefix + "RATE", rate)),
+        burst=int(os.getenv(prefix + "BURST", burst)),
+    )
+
+
+LANES = {
+    # bcrypt; keyed by IP for anonymous clients, which also slows password guessing
+    "auth": lane_from_env("auth", concurrency=16, queue=32, queue_timeout=2, rate=1, burst=20),
+    # two upstream calls on a cache miss
+    "search": lane_from_env("search", concurrency=32, queue=64, queue_timeout=2, rate=5, burst=20),
+    # bulk import and export: long-running, large transactions
+    "bulk": lane_from_env("bulk", concurrency=4, queue=8, queue_timeout=5, rate=0.2, burst=3),
+    # everything else: cheap reads and single-row writes
+    "default": lane_from_env("default", concurrency=0, queue=0, queue_timeout=0, rate=0, burst=0),
+}
+
+ROUTE_LANES = {
+    ("POST", "/auth/login"): "auth",
+    ("POST", "/auth/register"): "auth",
+    ("GET", "/search"): "search",
+    ("POST", "/user/items/bulk"): "bulk",
+    ("GET", "/user/items/export"): "bulk",
+}
+
+admission_rejected = metrics.Counter(
+    "admission_rejected_total",
+    "Requests turned away before reaching the app, by lane and reason.",
+    ("lane", "reason"),
+)
+admission_queue_wait = metrics.Histogram(
+    "admission_queue_wait_seconds",
+    "Time admitted requests waited for a slot, by lane.",
+    ("lane",),
+)
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# =========================
+# Concurrency Gates
+# =========================
+class Gate:
+    """
+    At most `lane.concurrency` requests inside; up to `lane.queue` more
+    wait in FIFO order, each for at most `lane.queue_timeout`. Anything
+    beyond is rejected at once, so no work is spent on requests whose
+    clients would have given up by the time their turn came.
+    """
+
+    def __init__(self, lane: Lane):
+        self.lane = lane
+        self.in_flight = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self) -> None:
+        limit = self.lane.concurrency
+        if not limit or (self.in_flight < limit and not self._waiters):
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.lane.queue:
+            raise Rejected(503, "queue_full", ADMISSION_RETRY_AFTER_SECONDS)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            # release() hands its slot straight to the waiter
+            await asyncio.wait_for(waiter, self.lane.queue_timeout)
+        except asyncio.TimeoutError:
+            # a release() in between may already have dropped the cancelled waiter
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise Rejected(503, "queue_timeout", ADMISSION_RETRY_AFTER_SECONDS)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed a slot just as the client went away
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        admission_queue_wait.observe(time.perf_counter() - start, (self.lane.name,))
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+# =========================
+# Rate Limit Backends
+# =========================
+class MemoryRateLimiter:
+    """Token buckets in this process, bounded to the `max_clients` most recently seen."""
+
+    def __init__(self, max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.max_clients = max_clients
+        # key -> [tokens, updated at]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token; returns 0 if there was one, else seconds until there is."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(burst), now]
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+
+class RedisRateLimiter:
+    """
+    Token buckets shared by every worker, updated atomically by a Lua
+    script. If Redis is unreachable requests are let through: a missing
+    rate limit is better than a missing API.
+    """
+
+    SCRIPT = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return tostring(wait)
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "admission:"):
+        if client is None:
+            import redis.asyncio as redis  # optional dependency
+
+            client = redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        try:
+            return float(await self._take(keys=[self.prefix + key], args=[rate, burst]))
+        except Exception as exc:
+            logger.warning("rate limit check failed, letting the request through: %r", exc)
+            return 0.0
+
+
+def create_rate_limiter():
+    if ADMISSION_BACKEND == "redis":
+        from app.cache import REDIS_URL
+
+        return RedisRateLimiter(url=REDIS_URL)
+    return MemoryRateLimiter()
+
+
+# =========================
+# Middleware
+# =========================
+class AdmissionMiddleware:
+    """
+    Decide before any work is done whether a request runs now, waits
+    briefly, or is turned away: per-client token buckets answer 429, and
+    per-lane concurrency gates answer 503, both with Retry-After.
+
+    `identify` maps a bearer token to a stable user key (None if the
+    token is invalid); other clients are keyed by IP address.
+    """
+
+    def __init__(self, app, identify: Callable[[str], Optional[str]] = lambda token: None, limiter=None):
+        self.app = app
+        self.identify = identify
+        self.limiter = limiter or create_rate_limiter()
+        self.gates: Dict[str, Gate] = {name: Gate(lane) for name, lane in LANES.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED or scope["path"] in PROTECTED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        lane = LANES[ROUTE_LANES.get((scope["method"], scope["path"]), "default")]
+        try:
+            if lane.rate > 0 and ADMISSION_RATE_LIMITS:
+                wait = await self.limiter.take(f"{lane.name}:{self.client_key(scope)}", lane.rate, lane.burst)
+                if wait > 0:
+                    raise Rejected(429, "rate_limited", wait)
+            gate = self.gates[lane.name]
+            await gate.acquire()
+        except Rejected as exc:
+            admission_rejected.inc((lane.name, exc.reason))
+            response = JSONResponse(
+                {"detail": "Too many requests" if exc.status_code == 429 else "Server busy, please retry"},
+                status_code=exc.status_code,
+                headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    def client_key(self, scope) -> str:
+        authorization = Headers(scope=scope).get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            user = self.identify(token)
+            if user is not None:
+                return f"user:{user}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
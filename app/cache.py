@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (value, fresh_until, stale_until) as wall-clock timestamps
+Entry = Tuple[Any, float, float]
+
+
+# =========================
+# Backends
+# =========================
+class MemoryCacheBackend:
+    """Bounded in-process store with LRU eviction."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """
+    Shared store for multi-worker deployments. Entries expire in Redis
+    once they are past their stale window; size is bounded by the
+    server's maxmemory / allkeys-lru policy.
+
+    `client` can be any redis.asyncio compatible client (e.g. a
+    fakeredis instance for local runs).
+    """
+
+    evictions = None  # tracked by the Redis server (INFO stats: evicted_keys)
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "cache:"):
+        if client is None:
+            import redis.asyncio as redis  # optional dependency
+
+            client = redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Entry]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return data["v"], data["f"], data["s"]
+
+    async def set(self, key: str, entry: Entry) -> None:
+        value, fresh_until, stale_until = entry
+        ttl_ms = max(1, int((stale_until - time.time()) * 1000))
+        await self.client.set(
+            self.prefix + key,
+            json.dumps({"v": value, "f": fresh_until, "s": stale_until}),
+            px=ttl_ms,
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    def __len__(self):
+        return 0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+# =========================
+# Synchronous TTL Map
+# =========================
+class TTLCache:
+    """
+    Small in-process TTL + LRU map for hot lookups that don't need a
+    loader (e.g. authenticated principals).
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value) -> None:
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+# =========================
+# Cache with SWR + Single-flight
+# =========================
+class SWRCache:
+    """
+    TTL cache in front of an async loader.
+
+    - fresh entries are served directly
+    - stale entries (past `ttl`, within `stale_ttl`) are served while one
+      background refresh runs
+    - concurrent misses for the same key share a single loader call
+    """
+
+    def __init__(self, backend, ttl: float, stale_ttl: float = 0.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.load_errors = 0
+        self._inflight: dict = {}
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Tuple[Any, bool]]],
+    ):
+        """
+        Return the cached value for `key`, calling `loader` on a miss.
+        `loader` returns `(value, cacheable)`; uncacheable values (e.g.
+        partial results) are returned to waiting callers but not stored.
+        """
+        entry = await self.backend.get(key)
+        now = time.time()
+        if entry is not None:
+            value, fresh_until, _ = entry
+            if now < fresh_until:
+                self.hits += 1
+                return value
+            self.stale_hits += 1
+            self._load(key, loader)
+            return value
+
+        self.misses += 1
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: str, loader) -> "asyncio.Task":
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        task = asyncio.ensure_future(self._fill(key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key: str, task: "asyncio.Task") -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.load_errors += 1
+            logger.warning("cache load for %s failed: %r", key, task.exception())
+
+    async def _fill(self, key: str, loader):
+        value, cacheable = await loader()
+        if cacheable:
+            now = time.time()
+            await self.backend.set(
+                key, (value, now + self.ttl, now + self.ttl + self.stale_ttl)
+            )
+        return value
+
+    async def invalidate(self, key: str) -> None:
+        await self.backend.delete(key)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "load_errors": self.load_errors,
+            "evictions": self.backend.evictions,
+            "size": len(self.backend),
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+# =========================
+# Search Cache
+# =========================
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory")  # memory / redis
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+SEARCH_CACHE_STALE_SECONDS = float(os.getenv("SEARCH_CACHE_STALE_SECONDS", "3600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+def create_search_cache() -> SWRCache:
+    if SEARCH_CACHE_BACKEND == "redis":
+        backend = RedisCacheBackend(url=REDIS_URL, prefix="search:")
+    else:
+        backend = MemoryCacheBackend(max_entries=SEARCH_CACHE_MAX_ENTRIES)
+    return SWRCache(backend, ttl=SEARCH_CACHE_TTL_SECONDS, stale_ttl=SEARCH_CACHE_STALE_SECONDS)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize case and whitespace so equivalent searches share an entry."""
+    return " ".join(query.lower().split())
+
+
+def search_cache_key(query: str, type: str) -> str:
+    return f"{type}:{normalize_query(query)}"
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import re
+from typing import List, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import etags, models, serialization
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Catalog Search Configuration
+# =========================
+SEARCH_SOURCE = os.getenv("SEARCH_SOURCE", "auto")  # auto / local / upstream
+SEARCH_LOCAL_LIMIT = int(os.getenv("SEARCH_LOCAL_LIMIT", "20"))
+# In auto mode, skip the providers when the catalog already has this many matches
+SEARCH_LOCAL_MIN_RESULTS = int(os.getenv("SEARCH_LOCAL_MIN_RESULTS", "10"))
+
+# write-back tasks, referenced so they aren't garbage collected mid-flight
+_pending_writes: set = set()
+
+
+def to_tsquery_text(query: str) -> Optional[str]:
+    """Turn free text into a prefix-matching tsquery: 'the dun' -> 'the:* & dun:*'."""
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+# =========================
+# Local Search
+# =========================
+SEARCH_COLUMNS = (
+    models.Item.external_id,
+    models.Item.name,
+    models.Item.description,
+    models.Item.poster_url,
+    models.Item.type,
+)
+
+# same keys as the provider results
+search_row_to_out = serialization.row_serializer(
+    [column.key for column in SEARCH_COLUMNS],
+    [
+        ("externalId", "external_id"),
+        ("title", "name"),
+        ("description", "description"),
+        ("posterUrl", "poster_url"),
+        ("type", "type"),
+    ],
+)
+
+
+def search_local_query(tsquery_text: str, type: str = "all", limit: int = SEARCH_LOCAL_LIMIT):
+    """Rank catalog items against a tsquery using the items.search_vector GIN index."""
+    tsquery = func.to_tsquery("simple", tsquery_text)
+    stmt = (
+        select(*SEARCH_COLUMNS)
+        .where(models.Item.search_vector.op("@@")(tsquery))
+        .order_by(func.ts_rank(models.Item.search_vector, tsquery).desc(), models.Item.id)
+        .limit(limit)
+    )
+    if type != "all":
+        stmt = stmt.where(models.Item.type == type)
+    return stmt
+
+
+async def search_local(db: AsyncSession, query: str, type: str = "all"):
+    tsquery_text = to_tsquery_text(query)
+    if tsquery_text is None:
+        return []
+
+    return [
+        search_row_to_out(row)
+        for row in await db.execute(search_local_query(tsquery_text, type))
+    ]
+
+
+def merge_results(local: List[dict], upstream: List[dict]) -> List[dict]:
+    """Local matches first, then upstream results the catalog didn't already have."""
+    seen = {r["externalId"] for r in local}
+    return local + [r for r in upstream if r["externalId"] not in seen]
+
+
+# =========================
+# Catalog Write-back
+# =========================
+async def store_search_results(results: List[dict]) -> None:
+    """
+    Add upstream search results to the catalog so later searches can be
+    answered locally. Existing items only get missing description and
+    poster fields filled in.
+    """
+    values = {}
+    for r in results:
+        if r.get("externalId") and r.get("title"):
+            values.setdefault(r["externalId"], {
+                "external_id": r["externalId"],
+                "name": r["title"],
+                "type": r["type"],
+                "description": r.get("description"),
+                "poster_url": r.get("posterUrl"),
+            })
+    if not values:
+        return
+
+    # sorted, so concurrent write-backs lock rows in the same order
+    stmt = insert(models.Item).values([values[key] for key in sorted(values)])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Item.external_id],
+        set_={
+            "description": func.coalesce(models.Item.description, stmt.excluded.description),
+            "poster_url": func.coalesce(models.Item.poster_url, stmt.excluded.poster_url),
+        },
+        where=or_(
+            models.Item.description.is_(None) & stmt.excluded.description.isnot(None),
+            models.Item.poster_url.is_(None) & stmt.excluded.poster_url.isnot(None),
+        ),
+    )
+
+    async with AsyncSessionLocal() as db:
+        changed = (await db.execute(stmt.returning(models.Item.id))).scalars().all()
+        await db.commit()
+
+    # Filling in fields changes how the item shows on users' lists, so
+    # those lists get a new version (ETags, delta sync). Done in its own
+    # transaction so item and users row locks are never held together.
+    if changed:
+        await touch_lists_containing(changed)
+
+
+async def touch_lists_containing(item_ids: List[int]) -> None:
+    """Bump the list version of every user with one of `item_ids` on
+    their list, and stamp those entries with it."""
+    lists = select(models.UserItem.user_id).where(models.UserItem.item_id.in_(item_ids))
+    # locked in id order, so concurrent write-backs can't deadlock
+    users = (
+        select(models.User.id)
+        .where(models.User.id.in_(lists))
+        .order_by(models.User.id)
+        .with_for_update()
+        .cte("affected_users")
+    )
+    bumped = (
+        update(models.User)
+        .where(models.User.id.in_(select(users.c.id)))
+        .values(list_version=models.User.list_version + 1)
+        .returning(models.User.id, models.User.list_version)
+        .cte("bumped")
+    )
+    stmt = (
+        update(models.UserItem)
+        .where(
+            models.UserItem.user_id == bumped.c.id,
+            models.UserItem.item_id.in_(item_ids),
+        )
+        .values(version=bumped.c.list_version, updated_at=func.now())
+        .returning(bumped.c.id, bumped.c.list_version)
+    )
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(stmt.execution_options(synchronize_session=False))).all()
+        for row in rows:
+            etags.stage(db, row.id, row.list_version)
+        await db.commit()
+
+
+def store_search_results_later(results: List[dict]) -> None:
+    """Schedule the catalog write-back without making the caller wait for it."""
+
+    def done(task: asyncio.Task):
+        _pending_writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("catalog write-back failed: %r", task.exception())
+
+    task = asyncio.create_task(store_search_results(results))
+    _pending_writes.add(task)
+    task.add_done_callback(done)
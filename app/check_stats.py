@@ -0,0 +1,55 @@
+"""
+Check the user_stats aggregates against user_items.
+
+    python -m app.check_stats                 # report mismatches, exit 1 if any
+    python -m app.check_stats --rebuild       # recompute user_stats from user_items
+    python -m app.check_stats --user-id 42    # limit either to one user
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from app import stats
+from app.database import SessionLocal
+
+
+def check(db, user_id=None) -> int:
+    mismatches = db.execute(stats.mismatch_query(user_id)).all()
+    for row in mismatches:
+        print(
+            f"user {row.user_id} status={row.status!r} type={row.type!r}: "
+            f"count {row.stored_count} != {row.actual_count}, "
+            f"rating_sum {row.stored_rating_sum} != {row.actual_rating_sum}"
+        )
+    return len(mismatches)
+
+
+def rebuild(db, user_id=None) -> None:
+    # Block list writes while recomputing, so no delta lands in between
+    db.execute(text("LOCK TABLE user_items IN SHARE MODE"))
+    for stmt in stats.rebuild_statements(user_id):
+        db.execute(stmt)
+    db.commit()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true", help="recompute user_stats from user_items")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            rebuild(db, args.user_id)
+            print("user_stats rebuilt")
+        count = check(db, args.user_id)
+        print(f"{count} mismatched row(s)")
+        return 1 if count else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# =========================
+# Compression Configuration
+# =========================
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# 4-5 is the usual sweet spot for dynamic responses; 11 is for static assets
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+
+# Already-compressed media, sent as is
+INCOMPRESSIBLE_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "font/woff", "application/zip", "application/gzip",
+    "text/event-stream",
+)
+
+
+# =========================
+# ETags
+# =========================
+# A compressed body is a different representation, so it gets its own
+# strong ETag. Conditional requests strip the suffix before comparing.
+ETAG_SUFFIXES = {"gzip": "-gzip", "br": "-br"}
+
+
+def add_etag_suffix(etag: str, coding: str) -> str:
+    if not etag.endswith('"'):
+        return etag
+    return etag[:-1] + ETAG_SUFFIXES[coding] + '"'
+
+
+def strip_etag_suffix(etag: str) -> str:
+    for suffix in ETAG_SUFFIXES.values():
+        if etag.endswith(suffix + '"'):
+            return etag[: -len(suffix) - 1] + '"'
+    return etag
+
+
+# =========================
+# Responders
+# =========================
+class TaggingResponder:
+    """Adds the content-coding suffix to the ETag of bodies it compresses."""
+
+    content_encoding: str
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def send_tagged(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if not self.content_encoding_set and "etag" in headers and (
+                    headers.get("content-encoding") == self.content_encoding
+                ):
+                    headers["etag"] = add_etag_suffix(headers["etag"], self.content_encoding)
+            await send(message)
+
+        await super().__call__(scope, receive, send_tagged)
+
+
+class SelectiveResponder:
+    """Skips compression for content types in INCOMPRESSIBLE_CONTENT_TYPES."""
+
+    async def send_with_compression(self, message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_compression(message)
+            self.content_type_is_excluded = content_type.startswith(INCOMPRESSIBLE_CONTENT_TYPES)
+            return
+        await super().send_with_compression(message)
+
+
+class GzipTaggingResponder(TaggingResponder, SelectiveResponder, GZipResponder):
+    pass
+
+
+class BrotliResponder(TaggingResponder, SelectiveResponder, IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # flush per chunk, so streamed responses reach the client as they go
+        out = self.compressor.process(body)
+        return out + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+# =========================
+# Middleware
+# =========================
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q-values."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    offered = ("br", "gzip") if brotli is not None else ("gzip",)
+    default = weights.get("*", 0.0)
+    # highest q wins; on a tie, the earlier (smaller) coding
+    best = max(offered, key=lambda coding: (weights.get(coding, default), -offered.index(coding)))
+    return best if weights.get(best, default) > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least `minimum_size` bytes with brotli
+    or gzip, whichever the client prefers. Streaming responses are
+    compressed chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESS_MIN_BYTES,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif coding == "gzip":
+            responder = GzipTaggingResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+
+        await responder(scope, receive, send)
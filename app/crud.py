@@ -0,0 +1,166 @@
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import enrichment, models, stats
+from app.schemas import UserItemCreate
+
+
+USER_ITEM_UNIQUE = "uq_user_items_user_id_item_id"
+
+# In RETURNING of an upsert: true for rows inserted by the statement,
+# false for existing rows that hit ON CONFLICT.
+INSERTED = literal_column("(xmax = 0)").label("inserted")
+
+
+# =========================
+# Catalog Items
+# =========================
+async def upsert_items(db: AsyncSession, records: Iterable[UserItemCreate]) -> Dict[str, tuple]:
+    """
+    Insert catalog items that don't exist yet and return
+    `{external_id: (item id, type)}` for every record, in one statement.
+    Existing items are left unchanged; new ones are queued for
+    enrichment.
+    """
+    values = {}
+    for record in records:
+        values.setdefault(record.external_id, {
+            "external_id": record.external_id,
+            "name": record.title,
+            "type": record.type,
+            "poster_url": record.poster_url,
+        })
+    if not values:
+        return {}
+
+    stmt = insert(models.Item).values(list(values.values()))
+    # no-op update so existing rows are returned as well
+    item_rows = stmt.on_conflict_do_update(
+        index_elements=[models.Item.external_id],
+        set_={"external_id": stmt.excluded.external_id},
+    ).returning(models.Item.external_id, models.Item.id, models.Item.type, INSERTED).cte("item_rows")
+
+    stmt = select(
+        item_rows.c.external_id, item_rows.c.id, item_rows.c.type
+    ).add_cte(enrichment.enqueue_new_items(item_rows))
+
+    return {row.external_id: (row.id, row.type) for row in await db.execute(stmt)}
+
+
+# =========================
+# User List Items
+# =========================
+async def add_list_items(
+    db: AsyncSession, user_id: int, item_ids: List[int], version: int
+) -> Dict[int, tuple]:
+    """
+    Add items to a user's list in one statement, stamped with the list
+    `version`, leaving entries that are already on it untouched.
+    Returns `{item_id: (user_item id, created)}`.
+    """
+    if not item_ids:
+        return {}
+
+    stmt = insert(models.UserItem).values([
+        {"user_id": user_id, "item_id": item_id, "status": "plan", "version": version}
+        for item_id in dict.fromkeys(item_ids)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint=USER_ITEM_UNIQUE,
+        set_={"user_id": stmt.excluded.user_id},
+    ).returning(models.UserItem.item_id, models.UserItem.id, INSERTED)
+
+    return {row.item_id: (row.id, row.inserted) for row in await db.execute(stmt)}
+
+
+async def add_list_item(db: AsyncSession, user_id: int, record: UserItemCreate):
+    """
+    Upsert the catalog item and the user's list entry in a single
+    statement (data-modifying CTEs) and return the joined row with
+    USER_ITEM_COLUMNS names plus `inserted` and `list_version`. Safe
+    under concurrent adds of the same item. The same statement bumps the
+    list version (first, see etags.bump_list_version), stamps a new entry
+    with it, counts the entry into user_stats and queues a new catalog
+    item for enrichment.
+    """
+    version_row = update(models.User).where(
+        models.User.id == user_id
+    ).values(
+        list_version=models.User.list_version + 1
+    ).returning(models.User.list_version).cte("version_row")
+
+    item_stmt = insert(models.Item).values(
+        external_id=record.external_id,
+        name=record.title,
+        type=record.type,
+        poster_url=record.poster_url,
+    )
+    item_row = item_stmt.on_conflict_do_update(
+        index_elements=[models.Item.external_id],
+        set_={"external_id": item_stmt.excluded.external_id},
+    ).returning(
+        models.Item.id,
+        models.Item.external_id,
+        models.Item.name,
+        models.Item.type,
+        models.Item.poster_url,
+        INSERTED,
+    ).cte("item_row")
+
+    user_item_stmt = insert(models.UserItem).from_select(
+        ["user_id", "item_id", "status", "version"],
+        select(
+            literal(user_id),
+            item_row.c.id,
+            literal("plan"),
+            select(version_row.c.list_version).scalar_subquery(),
+        ),
+    )
+    user_item_row = user_item_stmt.on_conflict_do_update(
+        constraint=USER_ITEM_UNIQUE,
+        set_={"user_id": user_item_stmt.excluded.user_id},
+    ).returning(
+        models.UserItem.id,
+        models.UserItem.user_id,
+        models.UserItem.item_id,
+        models.UserItem.status,
+        models.UserItem.rating,
+        models.UserItem.review,
+        INSERTED,
+    ).cte("user_item_row")
+
+    stats_row = stats.accumulate(insert(models.UserStat).from_select(
+        ["user_id", "status", "type", "item_count", "rating_sum", "rating_count"],
+        select(
+            user_item_row.c.user_id,
+            user_item_row.c.status,
+            func.coalesce(item_row.c.type, ""),
+            literal(1),
+            literal(0),
+            literal(0),
+        )
+        .join_from(user_item_row, item_row, user_item_row.c.item_id == item_row.c.id)
+        .where(user_item_row.c.inserted),
+    )).cte("stats_row")
+
+    stmt = select(
+        user_item_row.c.id,
+        user_item_row.c.user_id,
+        user_item_row.c.item_id,
+        item_row.c.external_id,
+        item_row.c.name,
+        item_row.c.type,
+        item_row.c.poster_url,
+        user_item_row.c.status,
+        user_item_row.c.rating,
+        user_item_row.c.review,
+        user_item_row.c.inserted,
+        select(version_row.c.list_version).scalar_subquery().label("list_version"),
+    ).join_from(
+        user_item_row, item_row, user_item_row.c.item_id == item_row.c.id
+    ).add_cte(stats_row, enrichment.enqueue_new_items(item_row))
+
+    return (await db.execute(stmt)).one()
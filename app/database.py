@@ -1,10 +1,140 @@
 import os
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import metrics, runtime
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# =========================
+# Pool Configuration
+# =========================
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", "true")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 disables
+
+# PgBouncer in transaction pooling mode hands each transaction to a
+# different server connection, so named server-side prepared statements
+# and connection-level settings can't be relied on.
+DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+
+# Connections all server workers together may open (Postgres'
+# max_connections less headroom for migrations, psql and other
+# services); 0 leaves DB_POOL_SIZE and DB_MAX_OVERFLOW as set.
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+
+
+def pool_limits(pool_size: int, max_overflow: int, max_connections: int, workers: int):
+    """
+    Shrink one worker's pool so that `workers` of them open at most
+    `max_connections` between them. Only the async pool counts: server
+    processes never check out a sync connection (its pool connects
+    lazily), and the scripts that do (migrations, check_stats) use one
+    each, out of the headroom left below max_connections.
+    """
+    if max_connections <= 0:
+        return pool_size, max_overflow
+    per_worker = max(1, max_connections // workers)
+    pool_size = min(pool_size, per_worker)
+    return pool_size, min(max_overflow, per_worker - pool_size)
+
+
+DB_POOL_SIZE, DB_MAX_OVERFLOW = pool_limits(
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_MAX_CONNECTIONS, runtime.worker_count()
+)
+
+POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+
+def async_database_url(url: str):
+    """Point a postgresql:// URL at the asyncpg driver."""
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    # asyncpg takes `ssl`, not libpq's `sslmode`
+    if "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+
+def async_connect_args() -> dict:
+    if DB_PGBOUNCER:
+        from uuid import uuid4
+
+        args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+        if DB_STATEMENT_TIMEOUT_MS:
+            # startup parameters don't survive PgBouncer; time out client-side
+            args["command_timeout"] = DB_STATEMENT_TIMEOUT_MS / 1000
+        return args
+
+    if DB_STATEMENT_TIMEOUT_MS:
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {}
+
+
+def sync_connect_args() -> dict:
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return {}
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The default async pool, timing how long each checkout waits."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.db_pool_wait.observe(time.perf_counter() - start)
+
+
+# =========================
+# Engines & Sessions
+# =========================
+# Sync engine: scripts, tests and anything outside the request path.
+engine = create_engine(DATABASE_URL, connect_args=sync_connect_args(), **POOL_OPTIONS)
 SessionLocal = sessionmaker(bind=engine)
 
+# Async engine: used by the API endpoints.
+async_engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    connect_args=async_connect_args(),
+    poolclass=TimedQueuePool,
+    **POOL_OPTIONS,
+)
+metrics.GaugeFunc(
+    "db_pool_connections_in_use",
+    "Async pool connections currently checked out.",
+    lambda: async_engine.pool.checkedout(),
+)
+metrics.GaugeFunc(
+    "db_pool_connections_idle",
+    "Async pool connections open and idle.",
+    lambda: async_engine.pool.checkedin(),
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
 Base = declarative_base()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import String, column, delete, func, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+
+from app import catalog, metrics, models, providers, resilience
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Enrichment Configuration
+# =========================
+# Idle poll interval of the worker; 0 disables it in this process
+ENRICH_INTERVAL_SECONDS = float(os.getenv("ENRICH_INTERVAL_SECONDS", "2"))
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "20"))
+# Provider calls in flight per worker, kept below PROVIDER_MAX_CONCURRENCY
+# so enrichment never takes all of a provider's slots from searches
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "4"))
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "5"))
+# A claimed job is retried by any worker after this, e.g. if its worker died
+ENRICH_LEASE_SECONDS = int(os.getenv("ENRICH_LEASE_SECONDS", "120"))
+# Failed jobs wait this long, doubling per attempt
+ENRICH_RETRY_BACKOFF_SECONDS = int(os.getenv("ENRICH_RETRY_BACKOFF_SECONDS", "60"))
+
+Job = models.EnrichmentJob
+
+enrichment_jobs = metrics.Counter(
+    "enrichment_jobs_total",
+    "Enrichment jobs processed, by outcome (done, failed, deferred, abandoned).",
+    ("outcome",),
+)
+
+
+# =========================
+# Queueing
+# =========================
+def enqueue_new_items(item_rows):
+    """
+    A CTE queueing a job for each row of `item_rows` (a CTE of upserted
+    items with id, external_id and inserted) that was just inserted and
+    comes from a provider with a details lookup. One job per external_id:
+    an item that is already queued is skipped.
+    """
+    stmt = insert(Job).from_select(
+        ["external_id", "item_id"],
+        select(item_rows.c.external_id, item_rows.c.id).where(
+            item_rows.c.inserted,
+            or_(*(item_rows.c.external_id.startswith(p.prefix) for p in providers.PROVIDERS)),
+        ),
+    ).on_conflict_do_nothing(index_elements=[Job.external_id])
+    return stmt.cte("queued_jobs")
+
+
+def claim_statement(limit: int):
+    """Lease up to `limit` due jobs to this worker; concurrent workers skip each other's."""
+    due = (
+        select(Job.external_id)
+        .where(Job.run_after <= func.now(), Job.attempts < ENRICH_MAX_ATTEMPTS)
+        .order_by(Job.run_after)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Job)
+        .where(Job.external_id.in_(due))
+        .values(
+            run_after=func.now() + timedelta(seconds=ENRICH_LEASE_SECONDS),
+            attempts=Job.attempts + 1,
+        )
+        .returning(Job.external_id, Job.item_id, Job.attempts)
+    )
+
+
+# =========================
+# Worker
+# =========================
+async def run_batch(client: httpx.AsyncClient, limit: int = ENRICH_BATCH_SIZE) -> int:
+    """
+    Claim a batch of jobs, fetch the items' details concurrently through
+    the provider guards, and write them back in bulk. Returns the number
+    of jobs claimed.
+    """
+    async with AsyncSessionLocal() as db:
+        jobs = (await db.execute(claim_statement(limit))).all()
+        await db.commit()
+    if not jobs:
+        return 0
+
+    slots = asyncio.Semaphore(ENRICH_CONCURRENCY)
+
+    async def fetch(external_id: str):
+        provider = providers.provider_for(external_id)
+        if provider is None:
+            return None
+        async with slots:
+            return await providers.timed(
+                provider.name, provider.call(client, external_id, provider.details)
+            )
+
+    outcomes = await asyncio.gather(*(fetch(job.external_id) for job in jobs), return_exceptions=True)
+
+    results, done, deferred = [], [], []
+    failed: Dict[str, str] = {}
+    for job, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, (resilience.CircuitOpen, resilience.Saturated)):
+            # the provider is unavailable, not the item: doesn't use up an attempt
+            deferred.append(job.external_id)
+        elif isinstance(outcome, httpx.HTTPStatusError) and outcome.response.status_code == 404:
+            done.append(job.external_id)  # gone upstream, nothing to fill in
+        elif isinstance(outcome, BaseException):
+            failed[job.external_id] = repr(outcome)[:500]
+        else:
+            if outcome is not None:
+                results.append(outcome)
+            done.append(job.external_id)
+
+    # the search write-back: fills in only missing fields, and gives the
+    # lists showing changed items a new version
+    await catalog.store_search_results(results)
+    abandoned = await finish(done, failed, deferred)
+
+    enrichment_jobs.inc(("done",), len(done))
+    enrichment_jobs.inc(("failed",), len(failed) - abandoned)
+    enrichment_jobs.inc(("deferred",), len(deferred))
+    enrichment_jobs.inc(("abandoned",), abandoned)
+    return len(jobs)
+
+
+async def finish(done: List[str], failed: Dict[str, str], deferred: List[str]) -> int:
+    """
+    Record a batch's outcomes in one transaction. Failed jobs on their
+    last attempt are deleted rather than kept for a retry that would never
+    be claimed; their errors are logged. Returns how many were deleted.
+    """
+    abandoned = []
+    async with AsyncSessionLocal() as db:
+        if done:
+            await db.execute(delete(Job).where(Job.external_id.in_(done)))
+        if failed:
+            errors = values(
+                column("external_id", String), column("error", String), name="errors"
+            ).data(list(failed.items()))
+            await db.execute(
+                update(Job)
+                .where(Job.external_id == errors.c.external_id)
+                .values(
+                    run_after=func.now() + func.make_interval(
+                        0, 0, 0, 0, 0, 0, ENRICH_RETRY_BACKOFF_SECONDS * func.power(2, Job.attempts - 1)
+                    ),
+                    last_error=errors.c.error,
+                )
+            )
+            abandoned = (await db.scalars(
+                delete(Job)
+                .where(Job.external_id.in_(list(failed)), Job.attempts >= ENRICH_MAX_ATTEMPTS)
+                .returning(Job.external_id)
+            )).all()
+        if deferred:
+            await db.execute(
+                update(Job)
+                .where(Job.external_id.in_(deferred))
+                .values(
+                    run_after=func.now() + timedelta(seconds=providers.PROVIDER_BREAKER_RESET_SECONDS),
+                    attempts=Job.attempts - 1,
+                )
+            )
+        await db.commit()
+
+    for external_id in abandoned:
+        logger.warning(
+            "giving up on enriching %s after %d attempts: %s",
+            external_id, ENRICH_MAX_ATTEMPTS, failed[external_id],
+        )
+    return len(abandoned)
+
+
+async def worker_loop(client: httpx.AsyncClient) -> None:
+    """
+    Process jobs until cancelled: batch after batch while there is a
+    backlog, then every ENRICH_INTERVAL_SECONDS. Requests only insert
+    jobs and never wait for this loop.
+    """
+    while True:
+        try:
+            claimed = await run_batch(client)
+        except Exception:
+            logger.exception("enrichment batch failed")
+            claimed = 0
+        if claimed < ENRICH_BATCH_SIZE:
+            await asyncio.sleep(ENRICH_INTERVAL_SECONDS)
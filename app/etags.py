@@ -0,0 +1,132 @@
+import hashlib
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import cache, compression, models
+
+# List versions read by this process are reused for this long, so
+# conditional requests are answered without touching the database.
+# Writes made by this process are seen immediately; writes made by other
+# workers can take up to this long to change the ETag.
+LIST_VERSION_CACHE_TTL_SECONDS = float(os.getenv("LIST_VERSION_CACHE_TTL_SECONDS", "2"))
+LIST_VERSION_CACHE_MAX_ENTRIES = int(os.getenv("LIST_VERSION_CACHE_MAX_ENTRIES", "10000"))
+
+list_versions = cache.TTLCache(
+    ttl=LIST_VERSION_CACHE_TTL_SECONDS, max_entries=LIST_VERSION_CACHE_MAX_ENTRIES
+)
+
+# session.info key for versions bumped by the open transaction
+PENDING_VERSIONS = "pending_list_versions"
+
+
+# =========================
+# List Versions
+# =========================
+def remember(user_id: int, version: int) -> None:
+    """Cache a version read or committed; never moves a cached version back."""
+    current = list_versions.get(user_id)
+    if current is None or version > current:
+        list_versions.set(user_id, version)
+
+
+async def get_list_version(db: AsyncSession, user_id: int) -> int:
+    version = list_versions.get(user_id)
+    if version is None:
+        version = await db.scalar(
+            select(models.User.list_version).where(models.User.id == user_id)
+        ) or 0
+        remember(user_id, version)
+    return version
+
+
+def stage(db: AsyncSession, user_id: int, version: Optional[int]) -> None:
+    """Publish a version bumped in the current transaction once it commits."""
+    if version is not None:
+        db.info.setdefault(PENDING_VERSIONS, {})[user_id] = version
+
+
+async def bump_list_version(db: AsyncSession, user_id: int) -> int:
+    """
+    Increment the user's list version as part of the current transaction.
+    Call it before touching the list: the users row stays locked until
+    commit, which serializes the user's writes so versions are handed
+    out in commit order (the delta sync feed relies on that).
+    """
+    version = await db.scalar(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(list_version=models.User.list_version + 1)
+        .returning(models.User.list_version)
+        .execution_options(synchronize_session=False)
+    )
+    stage(db, user_id, version)
+    return version
+
+
+@event.listens_for(Session, "after_commit")
+def publish_versions(session):
+    for user_id, version in session.info.pop(PENDING_VERSIONS, {}).items():
+        remember(user_id, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_versions(session):
+    session.info.pop(PENDING_VERSIONS, None)
+
+
+# =========================
+# Conditional Requests
+# =========================
+def make_etag(request: Request, user_id: int, version: int) -> str:
+    """Strong ETag for one user's view of `request` at a list version."""
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(f"{user_id}:{request.url.path}:{query}".encode()).hexdigest()
+    return f'"{version}-{digest[:16]}"'
+
+
+def matching_etag(request: Request, etag: str) -> Optional[str]:
+    """
+    The If-None-Match validator that matches `etag`, as the client holds
+    it, or None. A compressed 200 carried `etag` with its coding suffix;
+    a 304 sends back that one, so the representation's ETag never changes
+    on revalidation.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*":
+            return etag
+        if compression.strip_etag_suffix(tag) == etag:
+            return tag
+    return None
+
+
+
+async def check_not_modified(
+    request: Request, response: Response, db: AsyncSession, user_id: int
+) -> Optional[Response]:
+    """
+    Put the current ETag on `response`, and return a 304 response to
+    send instead when the client's copy is still current. Must run
+    before the data is read, so a body is never paired with a newer
+    version than the one it was read at.
+    """
+    version = await get_list_version(db, user_id)
+    etag = make_etag(request, user_id, version)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization",
+    }
+    matched = matching_etag(request, etag)
+    if matched is not None:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    response.headers.update(headers)
+    return None
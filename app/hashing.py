@@ -0,0 +1,96 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from app import metrics, runtime
+
+# =========================
+# Hashing Configuration
+# =========================
+# Changing BCRYPT_ROUNDS is safe: existing hashes keep verifying and are
+# rehashed at the new cost on the user's next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt is CPU-bound: by default the server's workers split the CPUs
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, runtime.cpu_limit() // runtime.worker_count()))))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("HASH_QUEUE_TIMEOUT_SECONDS", "2"))
+
+
+@lru_cache(maxsize=None)
+def password_context():
+    """passlib and bcrypt load on first use (or during warm-up), not at import."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class HashingUnavailable(Exception):
+    """The hashing pool is saturated or the request waited past its deadline."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on its own bounded thread pool (bcrypt releases the GIL),
+    so a burst of logins can't take over the request threadpool or the
+    event loop. At most `workers` hashes run at once; at most
+    `max_pending` requests wait, each for no longer than `queue_timeout`.
+    """
+
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.pending = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingUnavailable()
+
+        self.pending += 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise HashingUnavailable()
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, fn, *args)
+            finally:
+                self._slots.release()
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(password_context().hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Return `(valid, new_hash)`; `new_hash` is set when the stored cost is outdated."""
+        return await self._run(password_context().verify_and_update, password, hashed_password)
+
+
+hasher = PasswordHasher(
+    workers=HASH_WORKERS,
+    max_pending=HASH_MAX_PENDING,
+    queue_timeout=HASH_QUEUE_TIMEOUT_SECONDS,
+)
+
+metrics.GaugeFunc(
+    "bcrypt_requests_pending",
+    "Password hashing requests running or queued.",
+    lambda: hasher.pending,
+)
+metrics.GaugeFunc(
+    "bcrypt_requests_rejected_total",
+    "Password hashing requests turned away with 503.",
+    lambda: hasher.rejected,
+    type="counter",
+)
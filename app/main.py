@@ -1,25 +1,81 @@
+# first, so that it times the app's imports
+from app import startup
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Body, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
 
-from app.database import SessionLocal
+from app.database import AsyncSessionLocal, async_engine, env_flag
 from app.schemas import UserItemCreate
-from app import models, schemas
-from sqlalchemy import text
+from app import (
+    admission, cache, catalog, compression, crud, enrichment, etags, hashing, metrics, models,
+    pagination, posters, providers, schemas, serialization, sqltrace, stats, streaming, sync,
+)
+from sqlalchemy import event, inspect, select, text
 
 # Auth imports
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-import httpx
-import os
 from fastapi import Query
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # from here to ready is this worker's startup; the import is timed apart
+    startup.timings.start()
+    with startup.timings.phase("lifespan"):
+        # One pooled client for the whole process, so upstream TLS sessions
+        # are reused across requests instead of being set up per search.
+        app.state.http_client = providers.create_http_client()
+        app.state.search_cache = cache.create_search_cache()
+        app.state.poster_store = posters.PosterStore()
+        await asyncio.to_thread(app.state.poster_store.load)
+    # /health answers from here on; /ready once warm-up is done
+    background = [asyncio.create_task(startup.warm_up(app.state.http_client))]
+    if sync.SYNC_COMPACT_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(sync.compaction_loop()))
+    if enrichment.ENRICH_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(enrichment.worker_loop(app.state.http_client)))
+    if metrics.METRICS_DIR:
+        background.append(asyncio.create_task(metrics.flush_loop(metrics.METRICS_DIR)))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        # let them unwind (release leases, end transactions) before the
+        # connections they hold are disposed of
+        await asyncio.gather(*background, return_exceptions=True)
+        await app.state.search_cache.close()
+        await app.state.http_client.aclose()
+        await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(hashing.HashingUnavailable)
+async def hashing_unavailable_handler(request: Request, exc: hashing.HashingUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+# inside CORS, so rejections carry CORS headers and preflights are never limited
+app.add_middleware(admission.AdmissionMiddleware, identify=lambda token: token_subject(token))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -31,6 +87,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(sqltrace.SQLTraceMiddleware)
+# outermost, so recorded latency covers the other middleware too
+app.add_middleware(metrics.MetricsMiddleware)
+sqltrace.instrument_engine(async_engine.sync_engine)
 
 
 # =========================
@@ -41,8 +102,33 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated principals are cached by token subject so protected
+# routes don't re-read the users row on every request.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+# Let id-only routes trust the `uid` claim of a valid token without
+# checking that the user still exists.
+AUTH_TRUST_TOKEN_UID = env_flag("AUTH_TRUST_TOKEN_UID")
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+principal_cache = cache.TTLCache(ttl=AUTH_CACHE_TTL_SECONDS, max_entries=AUTH_CACHE_MAX_ENTRIES)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, as needed by protected routes."""
+    id: int
+    username: str
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def invalidate_principal(mapper, connection, target):
+    """Drop cached principals when a user is deleted or their credentials change."""
+    history = inspect(target).attrs.username.history
+    for username in (target.username, *(history.deleted or ())):
+        principal_cache.invalidate(username)
 
 # =========================
 # Pydantic Schemas
@@ -62,20 +148,9 @@ class UserOut(BaseModel):
 # =========================
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
-
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
 
 
 def create_access_token(
@@ -86,40 +161,81 @@ def create_access_token(
         expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     to_encode.update({"exp": expire})
+    from jose import jwt  # loaded on first use or during warm-up
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-):
+def decode_access_token(token: str) -> dict:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return payload
 
-        user = (
-            db.query(models.User)
-            .filter(models.User.username == username)
-            .first()
-        )
 
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+def token_subject(token: str) -> Optional[str]:
+    """The user a valid token was issued to, else None; keys rate limits per user."""
+    try:
+        payload = decode_access_token(token)
+    except HTTPException:
+        return None
+    return str(payload.get("uid") or payload["sub"])
 
-        return user
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    username: str = decode_access_token(token)["sub"]
+
+    principal = principal_cache.get(username)
+    if principal is not None:
+        return principal
+
+    user = (await db.execute(
+        select(models.User.id, models.User.username, models.User.list_version)
+        .where(models.User.username == username)
+    )).first()
+
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    # the list version comes for free here; saves a lookup on ETag checks
+    etags.remember(user.id, user.list_version)
+    principal = Principal(id=user.id, username=user.username)
+    principal_cache.set(username, principal)
+    return principal
+
+
+async def get_current_user_id(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> int:
+    """
+    Current user's id for routes that need nothing else. With
+    AUTH_TRUST_TOKEN_UID enabled this is read from the token and never
+    touches the cache or the database.
+    """
+    if AUTH_TRUST_TOKEN_UID:
+        uid = decode_access_token(token).get("uid")
+        if uid is not None:
+            return uid
+
+    return (await get_current_user(token, db)).id
 # ==============
 # Table Check
 # ==============
 
 @app.get("/debug/tables")
-def debug_tables(db: Session = Depends(get_db)):
-    result = db.execute(text("""
+async def debug_tables(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(text("""
         SELECT table_name
         FROM information_schema.tables
         WHERE table_schema = 'public';
@@ -128,8 +244,8 @@ def debug_tables(db: Session = Depends(get_db)):
     return [row[0] for row in result]
 
 @app.get("/debug/users")
-def debug_users(db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
+async def debug_users(db: AsyncSession = Depends(get_db)):
+    users = await db.execute(select(models.User.id, models.User.username))
     return [
         {
             "id": u.id,
@@ -140,86 +256,183 @@ def debug_users(db: Session = Depends(get_db)):
 
 
 @app.get("/debug/users/raw")
-def debug_users_raw(db: Session = Depends(get_db)):
-    result = db.execute(text("SELECT * FROM users"))
-    return [dict(row._mapping) for row in result]
+async def debug_users_raw():
+    return StreamingResponse(
+        streaming.stream_rows(text("SELECT * FROM users"), "json"),
+        media_type=streaming.MEDIA_TYPES["json"],
+    )
+
+@app.get("/debug/cache")
+def debug_cache(request: Request):
+    return {
+        "search": request.app.state.search_cache.stats(),
+        "principals": principal_cache.stats(),
+    }
 
 # =========================
 # Auth Endpoints
 # =========================
 @app.post("/auth/register", response_model=Token)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.username == user.username).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(
+        select(models.User).where(models.User.username == user.username)
+    )
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
     
     db_user = models.User(
         username=user.username,
-        hashed_password=hash_password(user.password),
+        hashed_password=await hashing.hasher.hash(user.password),
     )
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
 
     # Return token immediately
-    access_token = create_access_token({"sub": db_user.username})
+    access_token = create_access_token({"sub": db_user.username, "uid": db_user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 
 @app.post("/auth/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = (
-        db.query(models.User)
-        .filter(models.User.username == form_data.username)
-        .first()
+    user = await db.scalar(
+        select(models.User).where(models.User.username == form_data.username)
     )
 
-    if not user or not verify_password(
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+
+    valid, new_hash = await hashing.hasher.verify_and_update(
         form_data.password, user.hashed_password
-    ):
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
 
-    access_token = create_access_token({"sub": user.username})
+    # stored hash uses an outdated bcrypt cost; upgrade it transparently
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    access_token = create_access_token({"sub": user.username, "uid": user.id})
 
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @app.get("/auth/me", response_model=UserOut)
-def me(current_user: models.User = Depends(get_current_user)):
+async def me(current_user: Principal = Depends(get_current_user)):
     return {"username": current_user.username}
 
 
 # =========================
 # Health Endpoint
 # =========================
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus scrape target; the sum over all workers when METRICS_DIR is set."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health", tags=["Health"])
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready", tags=["Health"])
+async def ready_check():
+    """
+    Readiness: 503 until this worker has warmed its DB pool, upstream
+    connections and auth imports, 200 after. Both carry the startup
+    phase timings. /health stays the liveness check.
+    """
+    ready = startup.timings.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "warming", "startup": startup.timings.phases},
+    )
+
+
+
+
+# Columns for read-only list queries. Selecting plain columns from the
+# UserItem/Item join skips ORM identity-map work and lazy loads entirely.
+USER_ITEM_COLUMNS = (
+    models.UserItem.id,
+    models.UserItem.user_id,
+    models.UserItem.item_id,
+    models.Item.external_id,
+    models.Item.name,
+    models.Item.type,
+    models.Item.poster_url,
+    models.UserItem.status,
+    models.UserItem.rating,
+    models.UserItem.review,
+)
+
+
+def user_items_select():
+    return select(*USER_ITEM_COLUMNS).join(
+        models.Item, models.UserItem.item_id == models.Item.id
+    )
+
+
+# Response keys of a list entry: the snake_case keys the frontend reads
+# plus the camelCase ones UserItemOut declares. Responses built from
+# rows are returned as ORJSONResponse and skip response_model, which
+# would otherwise drop everything but UserItemOut's fields.
+USER_ITEM_FIELDS = (
+    ("id", "id"),
+    ("user_id", "user_id"),
+    ("item_id", "item_id"),
+    ("external_id", "external_id"),
+    ("externalId", "external_id"),
+    ("name", "name"),
+    ("title", "name"),
+    ("type", "type"),
+    ("poster_url", "poster_url"),
+    ("posterUrl", "poster_url"),
+    ("status", "status"),
+    ("rating", "rating"),
+    ("review", "review"),
+)
+
+# The shape of every list entry response (schemas.UserItemOut), built
+# from a row whose leading columns are USER_ITEM_COLUMNS. List queries
+# don't select the description.
+user_item_row_to_out = serialization.row_serializer(
+    [column.key for column in USER_ITEM_COLUMNS],
+    USER_ITEM_FIELDS,
+    constants={"description": None},
+)
 
 
 def user_item_to_out(user_item: models.UserItem):
-    """Convert a UserItem ORM object into the shape expected by UserItemOut."""
+    """Serialize a UserItem ORM object (item loaded) exactly like a list row."""
     item = user_item.item
-    return {
-        "id": user_item.id,
-        "user_id": user_item.user_id,
-        "item_id": user_item.item_id,
-        "external_id": item.external_id,
-        "name": item.name,
-        "title": item.name,
-        "type": item.type,
-        "poster_url": item.poster_url,
-        "status": user_item.status,
-        "rating": user_item.rating,
-        "review": user_item.review,
-    }
+    return user_item_row_to_out((
+        user_item.id, user_item.user_id, user_item.item_id, item.external_id, item.name,
+        item.type, item.poster_url, user_item.status, user_item.rating, user_item.review,
+    ))
+
+
+# Columns of /user/items/export, in order: the fields bulk import reads
+# (so an export can be imported again) plus the entry's own.
+EXPORT_FIELDS = (
+    ("id", "id"),
+    ("external_id", "external_id"),
+    ("title", "name"),
+    ("type", "type"),
+    ("poster_url", "poster_url"),
+    ("status", "status"),
+    ("rating", "rating"),
+    ("review", "review"),
+)
+export_row_to_out = serialization.row_serializer(
+    [column.key for column in USER_ITEM_COLUMNS], EXPORT_FIELDS
+)
 
 # =========================
 # Protected Item Endpoints
@@ -243,28 +456,36 @@ def user_item_to_out(user_item: models.UserItem):
 
 
 @app.get("/items/{external_id}", response_model=schemas.UserItemOut)
-def get_item_by_external_id(
+async def get_item_by_external_id(
     external_id: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     """
     Get a single item from the current user's list by its external ID.
+    Supports If-None-Match against the user's list version.
     """
-    user_item = (
-        db.query(models.UserItem)
-        .join(models.Item)
-        .filter(
-            models.UserItem.user_id == current_user.id,
+    not_modified = await etags.check_not_modified(request, response, db, current_user_id)
+    if not_modified:
+        return not_modified
+
+    row = (await db.execute(
+        user_items_select()
+        .where(
+            models.UserItem.user_id == current_user_id,
             models.Item.external_id == external_id
         )
-        .first()
-    )
+        .limit(1)
+    )).first()
 
-    if not user_item:
+    if not row:
         raise HTTPException(status_code=404, detail="Item not found in your list")
 
-    return user_item_to_out(user_item)
+    return serialization.ORJSONResponse(
+        user_item_row_to_out(row), headers=dict(response.headers)
+    )
 
 
 
@@ -312,133 +533,417 @@ def get_item_by_external_id(
 
 
 # =========================
-# TMDB API + Functions
+# Search (TMDb + Google Books)
 # =========================
-TMDB_API_KEY = os.getenv("TMDB_API_KEY") 
-GOOGLE_BOOKS_API = "https://www.googleapis.com/books/v1/volumes"
-
 @app.get("/search")
-def search(query: str = Query(...), type: str = Query("all")):
-    results = []
+async def search(
+    request: Request,
+    query: str = Query(...),
+    type: str = Query("all"),
+    source: str = Query(catalog.SEARCH_SOURCE, pattern="^(auto|local|upstream)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Search movies and books.
 
-    # Search movies via TMDb
-    if type in ["all", "movie"]:
-        tmdb_url = f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={query}"
-        with httpx.Client() as client:
-            r = client.get(tmdb_url)
-            data = r.json()
-            for m in data.get("results", []):
-                results.append({
-                    "externalId": f"tmdb-{m['id']}",
-                    "title": m["title"],
-                    "description": m.get("overview"),
-                    "posterUrl": f"https://image.tmdb.org/t/p/w500{m.get('poster_path')}" if m.get("poster_path") else None,
-                    "type": "movie"
-                })
-
-    # Search books via Google Books
-    if type in ["all", "book"]:
-        gb_url = f"{GOOGLE_BOOKS_API}?q={query}"
-        with httpx.Client() as client:
-            r = client.get(gb_url)
-            data = r.json()
-            for b in data.get("items", []):
-                volume = b.get("volumeInfo", {})
-                results.append({
-                    "externalId": f"gb-{b['id']}",
-                    "title": volume.get("title"),
-                    "description": volume.get("description"),
-                    "posterUrl": volume.get("imageLinks", {}).get("thumbnail"),
-                    "type": "book"
-                })
+    - local: only the items catalog (full-text, no external calls)
+    - upstream: TMDb and Google Books, queried concurrently; a provider
+      that is slow or failing is left out of the results
+    - auto: the catalog first; the providers are only called when it
+      has fewer than SEARCH_LOCAL_MIN_RESULTS matches, and fill the gaps
+
+    Upstream results are cached per normalized (query, type), with
+    partial results returned but never cached, and are written back to
+    the catalog in the background.
+    """
+    local = []
+    if source != "upstream":
+        local = await catalog.search_local(db, query, type)
+        if source == "local" or len(local) >= catalog.SEARCH_LOCAL_MIN_RESULTS:
+            return serialization.ORJSONResponse(local)
+
+    key = cache.search_cache_key(query, type)
+    normalized_query = cache.normalize_query(query)
+
+    async def load():
+        results, complete = await providers.search_all(
+            request.app.state.http_client, normalized_query, type
+        )
+        catalog.store_search_results_later(results)
+        return results, complete
+
+    upstream = await request.app.state.search_cache.get_or_load(key, load)
+    return serialization.ORJSONResponse(catalog.merge_results(local, upstream))
 
-    return results
+
+# =========================
+# Posters
+# =========================
+@app.get("/posters/{item_id}")
+async def get_poster(
+    item_id: int,
+    request: Request,
+    w: Optional[int] = Query(None, description="Thumbnail width, one of POSTER_THUMBNAIL_WIDTHS"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    An item's poster image, served from the server's disk cache so
+    clients never load TMDb or Google Books images directly. The first
+    request for a poster fetches it; later ones are file responses with
+    a content-based ETag.
+    """
+    if w is not None and (posters.Image is None or w not in posters.POSTER_THUMBNAIL_WIDTHS):
+        raise HTTPException(status_code=400, detail="Unsupported thumbnail width")
+
+    url = posters.poster_urls.get(item_id)
+    if url is None:
+        url = await db.scalar(select(models.Item.poster_url).where(models.Item.id == item_id))
+        if url is None:
+            raise HTTPException(status_code=404, detail="Poster not found")
+        posters.poster_urls.set(item_id, url)
+    if not posters.allowed_source(url):
+        raise HTTPException(status_code=404, detail="Poster not found")
+
+    try:
+        poster = await request.app.state.poster_store.get(request.app.state.http_client, url, w)
+    except posters.PosterUnavailable:
+        raise HTTPException(status_code=502, detail="Poster source unavailable")
+
+    headers = {
+        "ETag": f'"{poster.digest[:32]}"',
+        "Cache-Control": f"public, max-age={posters.POSTER_MAX_AGE_SECONDS}",
+    }
+    matched = etags.matching_etag(request, headers["ETag"])
+    if matched is not None:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    # sent with http.response.pathsend (zero-copy) where the server supports it
+    return FileResponse(
+        poster.path, media_type=poster.content_type, headers=headers, stat_result=poster.stat
+    )
 
 
 @app.post("/user/items", response_model=schemas.UserItemOut)
-def add_user_item(
+async def add_user_item(
     item: UserItemCreate = Body(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    db_item = db.query(models.Item).filter(
-        models.Item.external_id == item.external_id
-    ).first()
-
-    if not db_item:
-        db_item = models.Item(
-            external_id=item.external_id,
-            name=item.title,
-            type=item.type,
-            poster_url=item.poster_url
-        )
-        db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
-
-    existing_user_item = db.query(models.UserItem).filter(
-        models.UserItem.user_id == current_user.id,
-        models.UserItem.item_id == db_item.id
-    ).first()
-
-    user_item = existing_user_item
-
-    if not existing_user_item:
-        user_item = models.UserItem(
-            user_id=current_user.id,
-            item_id=db_item.id,
-            status="plan"
-        )
-        db.add(user_item)
-        db.commit()
-        db.refresh(user_item)
+    """
+    Add an item to the current user's list, creating the catalog item if
+    needed. Adding an item that is already on the list returns it as is.
+    """
+    row = await crud.add_list_item(db, current_user_id, item)
+    etags.stage(db, current_user_id, row.list_version)
+    await db.commit()
+    return serialization.ORJSONResponse(user_item_row_to_out(row))
+
+
+# =========================
+# Bulk Import
+# =========================
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "20000"))
+
+
+async def read_bulk_records(request: Request):
+    """
+    Yield raw records from either a JSON array body or an NDJSON body
+    (Content-Type: application/x-ndjson). NDJSON is parsed line by line
+    as it streams in, so large imports are never buffered whole.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        for record in body:
+            yield record
+        return
+
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def parse_bulk_record(raw) -> UserItemCreate:
+    if isinstance(raw, bytes):
+        return UserItemCreate.model_validate_json(raw)
+    return UserItemCreate.model_validate(raw)
+
+
+async def import_batch(db: AsyncSession, user_id: int, batch: list):
+    """Upsert one batch of (index, record) pairs: one statement each for
+    the list version, the catalog items, the user's list and its stats."""
+    version = await etags.bump_list_version(db, user_id)
+    items = await crud.upsert_items(db, [record for _, record in batch])
+    list_items = await crud.add_list_items(
+        db, user_id, [items[record.external_id][0] for _, record in batch], version
+    )
+
+    results = []
+    deltas = []
+    seen = set()
+    for index, record in batch:
+        item_id, item_type = items[record.external_id]
+        user_item_id, created = list_items[item_id]
+        if created and item_id not in seen:
+            deltas.append(stats.entry_delta("plan", item_type, None))
+        results.append({
+            "index": index,
+            "status": "created" if created and item_id not in seen else "exists",
+            "external_id": record.external_id,
+            "id": user_item_id,
+        })
+        seen.add(item_id)
+
+    await stats.apply_deltas(db, user_id, deltas)
+    return results
+
+
+@app.post("/user/items/bulk", response_model=schemas.BulkImportResult)
+async def bulk_add_user_items(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Add many items to the current user's list in one request.
+    Accepts a JSON array or NDJSON of UserItemCreate records and applies
+    them in batches inside a single transaction. Invalid records are
+    reported per row and don't abort the import.
+    """
+    # every batch runs the same few statements
+    sqltrace.expect_repeats()
 
-    return user_item_to_out(user_item)
+    results = []
+    batch = []
+    index = 0
+
+    async for raw in read_bulk_records(request):
+        if index >= BULK_MAX_ROWS:
+            raise HTTPException(
+                status_code=413, detail=f"At most {BULK_MAX_ROWS} records per import"
+            )
+        try:
+            batch.append((index, parse_bulk_record(raw)))
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "status": "invalid",
+                "error": e.errors()[0]["msg"],
+            })
+        index += 1
+
+        if len(batch) >= BULK_BATCH_SIZE:
+            results.extend(await import_batch(db, current_user_id, batch))
+            batch = []
+
+    if batch:
+        results.extend(await import_batch(db, current_user_id, batch))
+
+    await db.commit()
+
+    results.sort(key=lambda row: row["index"])
+    statuses = [row["status"] for row in results]
+    return {
+        "created": statuses.count("created"),
+        "existing": statuses.count("exists"),
+        "invalid": statuses.count("invalid"),
+        "results": results,
+    }
 
 
-@app.get("/user/items", response_model=List[schemas.UserItemOut])
-def list_user_items(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+@app.get("/user/items/export")
+async def export_user_items(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Stream the current user's whole list as NDJSON or CSV."""
+    stmt = (
+        user_items_select()
+        .where(models.UserItem.user_id == current_user_id)
+        .order_by(models.UserItem.id)
+    )
+    return StreamingResponse(
+        streaming.stream_rows(
+            stmt, format, export_row_to_out, fields=[key for key, _ in EXPORT_FIELDS]
+        ),
+        media_type=streaming.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="my-list.{format}"'},
+    )
+
+
+@app.get("/user/items/changes", response_model=schemas.UserItemChanges)
+async def list_user_item_changes(
+    since: Optional[str] = Query(None),
+    limit: int = Query(500, ge=1, le=2000),
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     """
-    List all items in the current user's list.
-    Joins UserItem with Item to return full item info.
+    Entries added, changed or removed after `since`, oldest change first.
+    Without `since` the whole list is returned, paged the same way.
+
+    Call again with `next_cursor` until `has_more` is false. A 410 means
+    the cursor is older than the tombstone retention window and the list
+    has to be fetched in full again.
     """
-    user_items = (
-        db.query(models.UserItem)
-        .join(models.Item)
-        .filter(models.UserItem.user_id == current_user.id)
-        .all()
+    after = issued_at = None
+    if since:
+        version, last_id, issued_at = sync.decode_cursor(since)
+        after = (version, last_id)
+    stmt = sync.changes_query(
+        current_user_id, after, include_deleted=after is not None
+    ).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+    # the shape of every other list entry: a client replaces its copy with it
+    to_out = serialization.row_serializer(
+        list(stmt.selected_columns.keys()), USER_ITEM_FIELDS, constants={"description": None}
     )
 
-    return [user_item_to_out(ui) for ui in user_items]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = (rows[-1].version, rows[-1].id) if rows else after or (0, 0)
+    # Mid-feed the next page continues this sync and keeps its start time,
+    # as tombstones not fetched yet may be compacted once that expires; a
+    # drained feed starts the clock again.
+    next_cursor = sync.encode_cursor(*last, issued_at if has_more else None)
+
+    return {
+        "items": [to_out(row) for row in rows if not row.deleted],
+        "deleted": [
+            {"id": row.id, "external_id": row.external_id}
+            for row in rows if row.deleted
+        ],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
+
+
+@app.get(
+    "/user/items",
+    response_model=Union[schemas.UserItemPage, List[schemas.UserItemOut]],
+)
+async def list_user_items(
+    request: Request,
+    response: Response,
+    paginate: bool = Query(False),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    type: Optional[str] = Query(None),
+    min_rating: Optional[int] = Query(None),
+    max_rating: Optional[int] = Query(None),
+    sort: Optional[str] = Query(None, pattern="^(recent|rating|name)$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    List items in the current user's list, optionally filtered by
+    status, type and rating range.
+
+    With `paginate=true` the response is a page of at most `limit` items
+    plus an opaque `next_cursor` to pass back for the following page.
+    Without it, the whole list is returned as a plain array, in the
+    requested sort order if one is given.
+
+    Responses carry an ETag derived from the user's list version; a
+    matching If-None-Match gets a 304 without reading user_items.
+    """
+    not_modified = await etags.check_not_modified(request, response, db, current_user_id)
+    if not_modified:
+        return not_modified
+
+    stmt = user_items_select().where(models.UserItem.user_id == current_user_id)
+    if status is not None:
+        stmt = stmt.where(models.UserItem.status == status)
+    if type is not None:
+        stmt = stmt.where(models.Item.type == type)
+    if min_rating is not None:
+        stmt = stmt.where(models.UserItem.rating >= min_rating)
+    if max_rating is not None:
+        stmt = stmt.where(models.UserItem.rating <= max_rating)
+
+    if not paginate:
+        if sort is not None:
+            stmt = pagination.apply_sort(
+                stmt, sort, order or pagination.DEFAULT_ORDER[sort]
+            )
+        return serialization.ORJSONResponse(
+            [user_item_row_to_out(row) for row in await db.execute(stmt)],
+            headers=dict(response.headers),
+        )
+
+    sort = sort or "recent"
+    order = order or pagination.DEFAULT_ORDER[sort]
+    stmt = pagination.apply_sort(stmt, sort, order, cursor).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = pagination.encode_cursor(
+            sort, order, pagination.sort_value(last, sort), last.id
+        )
+
+    return serialization.ORJSONResponse(
+        {"items": [user_item_row_to_out(row) for row in rows], "next_cursor": next_cursor},
+        headers=dict(response.headers),
+    )
+
+
+@app.get("/user/stats", response_model=schemas.UserStatsOut)
+async def get_user_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Counts per status and type plus the average rating of the current
+    user's list. Read from the user_stats aggregates, which the list
+    endpoints keep up to date, so the cost doesn't grow with the list.
+    """
+    return await stats.get_user_stats(db, current_user_id)
 
 
 @app.put("/user/items/{user_item_id}", response_model=schemas.UserItemOut)
-def update_user_item(
+async def update_user_item(
     user_item_id: int,
     updates: dict = Body(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     """
     Update the user's item fields: status, rating, review.
     The React frontend sends these values as a JSON body.
     """
-    user_item = (
-        db.query(models.UserItem)
-        .join(models.Item)
-        .filter(
+    version = await etags.bump_list_version(db, current_user_id)
+    user_item = await db.scalar(
+        select(models.UserItem)
+        .join(models.UserItem.item)
+        .options(contains_eager(models.UserItem.item))
+        .where(
             models.UserItem.id == user_item_id,
-            models.UserItem.user_id == current_user.id
+            models.UserItem.user_id == current_user_id
         )
-        .first()
+        .with_for_update(of=models.UserItem)
     )
 
     if not user_item:
         raise HTTPException(status_code=404, detail="User item not found")
 
+    before = (user_item.status, user_item.rating)
+
     if "status" in updates and updates["status"] is not None:
         user_item.status = updates["status"]
 
@@ -448,30 +953,56 @@ def update_user_item(
     if "review" in updates and updates["review"] is not None:
         user_item.review = updates["review"]
 
-    db.commit()
-    db.refresh(user_item)
-    return user_item_to_out(user_item)
+    user_item.version = version
+
+    if (user_item.status, user_item.rating) != before:
+        item_type = user_item.item.type
+        await stats.apply_deltas(db, current_user_id, [
+            stats.entry_delta(before[0], item_type, before[1], sign=-1),
+            stats.entry_delta(user_item.status, item_type, user_item.rating),
+        ])
+
+    await db.commit()
+    return serialization.ORJSONResponse(user_item_to_out(user_item))
 
 
 @app.delete("/user/items/{user_item_id}")
-def delete_user_item(
+async def delete_user_item(
     user_item_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
-    """Remove an item from the current user's list."""
-    user_item = (
-        db.query(models.UserItem)
-        .filter(
+    """
+    Remove an item from the current user's list, leaving a tombstone for
+    GET /user/items/changes.
+    """
+    version = await etags.bump_list_version(db, current_user_id)
+    row = (await db.execute(
+        select(models.UserItem, models.Item.type, models.Item.external_id)
+        .join(models.UserItem.item)
+        .where(
             models.UserItem.id == user_item_id,
-            models.UserItem.user_id == current_user.id
+            models.UserItem.user_id == current_user_id
         )
-        .first()
-    )
+        .with_for_update(of=models.UserItem)
+    )).first()
 
-    if not user_item:
+    if not row:
         raise HTTPException(status_code=404, detail="User item not found")
 
-    db.delete(user_item)
-    db.commit()
+    user_item, item_type, external_id = row
+    await db.delete(user_item)
+    db.add(models.UserItemTombstone(
+        id=user_item.id,
+        user_id=current_user_id,
+        external_id=external_id,
+        version=version,
+    ))
+    await stats.apply_deltas(db, current_user_id, [
+        stats.entry_delta(user_item.status, item_type, user_item.rating, sign=-1),
+    ])
+    await db.commit()
     return {"message": "Item removed from your list"}
+
+
+startup.timings.record("import", time.perf_counter() - startup.IMPORT_STARTED)
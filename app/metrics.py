@@ -0,0 +1,371 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics in the Prometheus text exposition format.
+#
+# Recording is a dict lookup and a few additions, with no locks:
+# everything that records runs on the event loop thread (SQLAlchemy's
+# async engine events included), and the GIL keeps single updates atomic
+# for the odd caller on another thread. Values are per process; with
+# METRICS_DIR set, the workers of one server add theirs up (see collect).
+
+# =========================
+# Metrics Configuration
+# =========================
+# Directory shared by the worker processes of one server (gunicorn.conf.py
+# sets and empties it). Every worker writes its values there, and /metrics,
+# whichever worker answers it, shows their sum. Unset, /metrics shows the
+# answering process only, which is right for a single-process server.
+METRICS_DIR = os.getenv("METRICS_DIR")
+# How often a worker writes its values: the most a scrape can lag behind,
+# and what a worker killed without a clean shutdown loses.
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# seconds; tuned for API latencies (5ms .. 10s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY: List["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# =========================
+# Metric Types
+# =========================
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    @property
+    def cumulative(self) -> bool:
+        """Whether an exited worker's values still count towards the total."""
+        return self.type != "gauge"
+
+    def series(self) -> Dict[Tuple, object]:
+        """This process's values by label values, as plain JSON-able data."""
+        raise NotImplementedError
+
+    def combine(self, a, b):
+        """The sum of two values of one series from different processes."""
+        return a + b
+
+    def samples(self, series: Dict[Tuple, object]) -> List[str]:
+        raise NotImplementedError
+
+    def render(self, series: Optional[Dict[Tuple, object]] = None) -> str:
+        if series is None:
+            series = self.series()
+        header = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.type}\n"
+        return header + "".join(line + "\n" for line in self.samples(series))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def series(self) -> Dict[Tuple, object]:
+        return dict(self._values)
+
+    def samples(self, series: Dict[Tuple, object]) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in series.items()
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]; cumulated on render
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, labels: Tuple = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def series(self) -> Dict[Tuple, object]:
+        return {labels: [list(counts), total] for labels, (counts, total) in list(self._series.items())}
+
+    def combine(self, a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    def samples(self, series: Dict[Tuple, object]) -> List[str]:
+        lines = []
+        for labels, (counts, total) in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class GaugeFunc(Metric):
+    """A gauge (or counter) read from `fn` at scrape time, so recording costs nothing."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], type: str = "gauge"):
+        super().__init__(name, help)
+        self.fn = fn
+        self.type = type
+
+    def series(self) -> Dict[Tuple, object]:
+        try:
+            return {(): self.fn()}
+        except Exception:
+            return {}
+
+    def samples(self, series: Dict[Tuple, object]) -> List[str]:
+        return [f"{self.name} {_number(value)}" for value in series.values()]
+
+
+def render() -> str:
+    if not METRICS_DIR:
+        return "".join(metric.render() for metric in REGISTRY)
+    combined = collect(METRICS_DIR)
+    return "".join(metric.render(combined.get(metric.name, {})) for metric in REGISTRY)
+
+
+# =========================
+# Workers
+# =========================
+# Each worker keeps its values in <pid>.json; those of exited workers are
+# folded into EXITED_FILE, so counters never go back when gunicorn
+# recycles a worker.
+EXITED_FILE = "exited.json"
+
+
+def snapshot() -> dict:
+    return {
+        metric.name: [[list(labels), value] for labels, value in metric.series().items()]
+        for metric in REGISTRY
+    }
+
+
+def _write(path: str, data: dict) -> None:
+    # written aside and renamed, so readers never see half a file
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def flush(directory: str) -> None:
+    """Write this process's values for the other workers' scrapes."""
+    _write(os.path.join(directory, f"{os.getpid()}.json"), snapshot())
+
+
+async def flush_loop(directory: str) -> None:
+    """Flush every METRICS_FLUSH_SECONDS until cancelled, then once more."""
+    try:
+        while True:
+            await asyncio.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(flush, directory)
+            except OSError:
+                logger.exception("writing metrics to %s failed", directory)
+    finally:
+        flush(directory)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add(into: Dict[str, Dict[Tuple, object]], data: dict, cumulative_only: bool = False) -> None:
+    metrics_by_name = {metric.name: metric for metric in REGISTRY}
+    for name, rows in data.items():
+        metric = metrics_by_name.get(name)
+        if metric is None or (cumulative_only and not metric.cumulative):
+            continue
+        series = into.setdefault(name, {})
+        for labels, value in rows:
+            labels = tuple(labels)
+            series[labels] = metric.combine(series[labels], value) if labels in series else value
+
+
+def collect(directory: str) -> Dict[str, Dict[Tuple, object]]:
+    """
+    The sum of every worker's values in `directory`, this one's written
+    fresh first. Files of exited workers are folded into EXITED_FILE,
+    keeping their counters and histograms and dropping their gauges.
+    """
+    flush(directory)
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        # one scrape at a time, so a file being folded is never counted twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited: Dict[str, Dict[Tuple, object]] = {}
+        exited_path = os.path.join(directory, EXITED_FILE)
+        if os.path.exists(exited_path):
+            with open(exited_path) as f:
+                _add(exited, json.load(f))
+
+        live, folded = [], []
+        for filename in os.listdir(directory):
+            stem, ext = os.path.splitext(filename)
+            if ext != ".json" or not stem.isdigit():
+                continue
+            path = os.path.join(directory, filename)
+            with open(path) as f:
+                data = json.load(f)
+            if _alive(int(stem)):
+                live.append(data)
+            else:
+                _add(exited, data, cumulative_only=True)
+                folded.append(path)
+
+        if folded:
+            _write(exited_path, {
+                name: [[list(labels), value] for labels, value in series.items()]
+                for name, series in exited.items()
+            })
+            for path in folded:
+                os.remove(path)
+
+    combined = exited
+    for data in live:
+        _add(combined, data)
+    return combined
+
+
+# =========================
+# Application Metrics
+# =========================
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by route template, method and status.",
+    ("route", "method", "status"),
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request, by route template.",
+    ("route",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+http_request_db_seconds = Histogram(
+    "http_request_db_seconds",
+    "Time spent executing SQL per request, by route template.",
+    ("route",),
+)
+db_pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the async pool, including connecting.",
+)
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Search provider call latency, by provider and outcome.",
+    ("provider", "outcome"),
+)
+upstream_errors = Counter(
+    "upstream_errors_total",
+    "Failed search provider calls, by provider and reason.",
+    ("provider", "reason"),
+)
+upstream_retries = Counter(
+    "upstream_retries_total",
+    "Search provider requests retried after a failure, by provider.",
+    ("provider",),
+)
+upstream_hedges = Counter(
+    "upstream_hedges_total",
+    "Hedged (duplicate) search provider requests sent, by provider.",
+    ("provider",),
+)
+upstream_circuit_transitions = Counter(
+    "upstream_circuit_transitions_total",
+    "Search provider circuit breaker state changes, by provider and new state.",
+    ("provider", "state"),
+)
+
+
+# =========================
+# Middleware
+# =========================
+def route_template(scope) -> str:
+    """Route path template of a handled request, e.g. /user/items/{user_item_id}."""
+    route = scope.get("route")
+    # unmatched paths share one label, so scans can't blow up cardinality
+    return getattr(route, "path_format", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Record the latency of every HTTP request by route template and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - start, (route_template(scope), scope["method"], status)
+            )
@@ -0,0 +1,78 @@
+"""
+Bring the database schema to head, skipping Alembic altogether when it
+already is there (the usual case on a container restart or scale-out).
+
+    python -m app.migrations
+
+Importing Alembic and SQLAlchemy costs more than the check itself, so
+the head revision is read straight from alembic/versions and the current
+one with a single query. Whenever either is unclear, `alembic upgrade
+head` runs as before.
+"""
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Set
+
+ROOT = Path(__file__).resolve().parent.parent
+VERSIONS_DIR = ROOT / "alembic" / "versions"
+
+REVISION = re.compile(r"^revision(?:\s*:\s*str)?\s*=\s*['\"](\w+)['\"]", re.M)
+DOWN_REVISION = re.compile(r"^down_revision(?:\s*:[^=]+)?\s*=\s*(.+)$", re.M)
+
+
+def script_heads(versions_dir: Path = VERSIONS_DIR) -> Set[str]:
+    """Revisions of the migration scripts that no other script revises."""
+    revisions, revised = set(), set()
+    for path in versions_dir.glob("*.py"):
+        source = path.read_text()
+        revision = REVISION.search(source)
+        down = DOWN_REVISION.search(source)
+        if revision is None or down is None:
+            return set()  # not a script this parser understands
+        revisions.add(revision.group(1))
+        revised.update(re.findall(r"['\"](\w+)['\"]", down.group(1)))
+    return revisions - revised
+
+
+def database_revision(url: str) -> Optional[str]:
+    """The revision recorded in alembic_version, None if there is none or it can't be read."""
+    import psycopg2
+
+    try:
+        conn = psycopg2.connect(url, connect_timeout=10)
+    except psycopg2.Error:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version_num FROM alembic_version")
+            rows = cur.fetchall()
+    except psycopg2.Error:
+        return None  # e.g. a fresh database without the table
+    finally:
+        conn.close()
+    return rows[0][0] if len(rows) == 1 else None
+
+
+def main() -> int:
+    start = time.perf_counter()
+    heads = script_heads()
+    url = os.getenv("DATABASE_URL")
+    current = database_revision(url) if url and len(heads) == 1 else None
+    if current is not None and {current} == heads:
+        print(f"Database already at head {current}, migrations skipped ({time.perf_counter() - start:.2f}s)")
+        return 0
+
+    print(f"Database at {current or 'unknown revision'}, upgrading to head...")
+    from alembic.config import main as alembic
+
+    os.chdir(ROOT)
+    alembic(argv=["upgrade", "head"])
+    print(f"Migrations applied ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
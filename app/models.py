@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Computed, DateTime, Integer, String, ForeignKey, Index, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from app.database import Base
 
 # ---------------------
@@ -7,13 +8,24 @@ from app.database import Base
 # ---------------------
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     external_id = Column(String, unique=True, index=True)  # e.g. tmdb-123 or gb-abc
     name = Column(String, index=True)
     type = Column(String)  # "movie" or "book"
     description = Column(String, nullable=True)
     poster_url = Column(String, nullable=True)
+    # full-text search over name + description, computed by Postgres
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))",
+            persisted=True,
+        ),
+    ))
 
     users = relationship("UserItem", back_populates="item")
 
@@ -24,9 +36,11 @@ class Item(Base):
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    # bumped by every change to the user's list; drives ETags (app/etags.py)
+    list_version = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     items = relationship("UserItem", back_populates="user")
 
@@ -36,13 +50,75 @@ class User(Base):
 # ---------------------
 class UserItem(Base):
     __tablename__ = "user_items"
+    __table_args__ = (
+        UniqueConstraint("user_id", "item_id", name="uq_user_items_user_id_item_id"),
+        Index("ix_user_items_user_id_id", "user_id", "id"),
+        Index("ix_user_items_user_id_status", "user_id", "status"),
+        Index("ix_user_items_item_id", "item_id"),
+        Index("ix_user_items_user_id_version_id", "user_id", "version", "id"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     item_id = Column(Integer, ForeignKey("items.id"))
     status = Column(String, default="plan")  # plan / reading / watched
     rating = Column(Integer, nullable=True)
     review = Column(String, nullable=True)
+    # the user's list_version at the last change; orders the delta sync feed
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", back_populates="items")
     item = relationship("Item", back_populates="users")
+
+
+# ---------------------
+# UserItemTombstone Model
+# ---------------------
+class UserItemTombstone(Base):
+    """A deleted list entry, kept for delta sync until compacted (see app/sync.py)."""
+    __tablename__ = "user_item_tombstones"
+    __table_args__ = (
+        Index("ix_user_item_tombstones_user_id_version_id", "user_id", "version", "id"),
+        Index("ix_user_item_tombstones_deleted_at", "deleted_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # the deleted user_items.id
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    external_id = Column(String)
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# ---------------------
+# UserStat Model
+# ---------------------
+class UserStat(Base):
+    """Per-user list aggregates, kept in step with user_items (see app/stats.py)."""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, primary_key=True)  # "" when unset
+    type = Column(String, primary_key=True)    # item type, "" when unset
+    item_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(BigInteger, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+
+
+# ---------------------
+# EnrichmentJob Model
+# ---------------------
+class EnrichmentJob(Base):
+    """A catalog item waiting for its details from upstream (see app/enrichment.py)."""
+    __tablename__ = "enrichment_jobs"
+    __table_args__ = (
+        Index("ix_enrichment_jobs_run_after", "run_after"),
+    )
+
+    external_id = Column(String, primary_key=True)  # one job per item, however often it's added
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="CASCADE"), nullable=False)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    # not claimable before this; claiming moves it forward by the lease
+    run_after = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(String)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
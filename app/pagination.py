@@ -0,0 +1,85 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import func, tuple_
+
+from app import models
+
+# =========================
+# Sort Keys
+# =========================
+# NULLs are folded into a sentinel so every row has a comparable key.
+SORT_KEYS = {
+    "recent": models.UserItem.id,
+    "rating": func.coalesce(models.UserItem.rating, -1),
+    "name": func.coalesce(models.Item.name, ""),
+}
+
+DEFAULT_ORDER = {"recent": "desc", "rating": "desc", "name": "asc"}
+
+# Type of each sort key's value in a cursor (never NULL, see above)
+KEY_TYPES = {"recent": int, "rating": int, "name": str}
+
+
+# =========================
+# Cursors
+# =========================
+def encode_cursor(sort: str, order: str, key, last_id: int) -> str:
+    raw = json.dumps([sort, order, key, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str):
+    """Return `(key, last_id)` from a cursor issued for the same sort/order."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        c_sort, c_order, key, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if (c_sort, c_order) != (sort, order):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+
+    # the values go straight into the keyset comparison; bool is an int subclass
+    if not (_is_a(key, KEY_TYPES[sort]) and _is_a(last_id, int)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return key, last_id
+
+
+def _is_a(value, type_) -> bool:
+    return isinstance(value, type_) and not isinstance(value, bool)
+
+
+# =========================
+# Keyset Pagination
+# =========================
+def apply_sort(stmt, sort: str, order: str, cursor=None):
+    """
+    Order `stmt` by (sort key, user_items.id) and, when a cursor is given,
+    keep only rows strictly after it. Seeking on the key instead of using
+    OFFSET keeps deep pages as cheap as the first one.
+    """
+    key = SORT_KEYS[sort]
+    row_id = models.UserItem.id
+
+    if cursor is not None:
+        last_key, last_id = decode_cursor(cursor, sort, order)
+        position = tuple_(key, row_id)
+        after = tuple_(last_key, last_id)
+        stmt = stmt.where(position < after if order == "desc" else position > after)
+
+    if order == "desc":
+        return stmt.order_by(key.desc(), row_id.desc())
+    return stmt.order_by(key.asc(), row_id.asc())
+
+
+def sort_value(row, sort: str):
+    """Sort key of a USER_ITEM_COLUMNS row, as compared by apply_sort."""
+    if sort == "rating":
+        return row.rating if row.rating is not None else -1
+    if sort == "name":
+        return row.name or ""
+    return row.id
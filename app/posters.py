@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app import cache, metrics
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without it no thumbnails are made
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Poster Cache Configuration
+# =========================
+POSTER_CACHE_DIR = os.getenv("POSTER_CACHE_DIR", "/tmp/poster-cache")
+POSTER_CACHE_MAX_BYTES = int(os.getenv("POSTER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+POSTER_MAX_IMAGE_BYTES = int(os.getenv("POSTER_MAX_IMAGE_BYTES", str(5 * 1024 * 1024)))
+POSTER_FETCH_TIMEOUT_SECONDS = float(os.getenv("POSTER_FETCH_TIMEOUT_SECONDS", "5"))
+POSTER_MAX_AGE_SECONDS = int(os.getenv("POSTER_MAX_AGE_SECONDS", "86400"))
+# Only these hosts are fetched from. poster_url can come from clients,
+# so anything else (internal addresses included) is refused.
+POSTER_ALLOWED_HOSTS = frozenset(
+    host.strip().lower()
+    for host in os.getenv(
+        "POSTER_ALLOWED_HOSTS", "image.tmdb.org,books.google.com,books.googleusercontent.com"
+    ).split(",")
+    if host.strip()
+)
+# e.g. "92,185": thumbnail widths made once when a poster is first fetched
+POSTER_THUMBNAIL_WIDTHS = tuple(sorted(
+    int(width) for width in os.getenv("POSTER_THUMBNAIL_WIDTHS", "").split(",") if width.strip()
+))
+POSTER_URL_CACHE_TTL_SECONDS = float(os.getenv("POSTER_URL_CACHE_TTL_SECONDS", "300"))
+
+# item id -> poster_url, so cache hits skip the database
+poster_urls = cache.TTLCache(ttl=POSTER_URL_CACHE_TTL_SECONDS, max_entries=10000)
+
+# a blob's mtime is its LRU position on disk; refresh it at most this often
+TOUCH_INTERVAL_SECONDS = 60
+
+
+class PosterUnavailable(Exception):
+    """The poster could not be fetched from its source."""
+
+
+class Poster(NamedTuple):
+    path: Path
+    stat: os.stat_result
+    digest: str
+    content_type: str
+
+
+poster_requests = metrics.Counter(
+    "poster_requests_total",
+    "Poster proxy lookups, by outcome (hit, miss, error).",
+    ("outcome",),
+)
+
+
+def allowed_source(url: str) -> bool:
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and (parts.hostname or "").lower() in POSTER_ALLOWED_HOSTS
+
+
+# =========================
+# Content-addressed Store
+# =========================
+class PosterStore:
+    """
+    Size-bounded disk cache of poster images.
+
+    Image bytes live in blobs/ under their sha256, so the same image
+    behind several URLs is stored once. refs/ maps a source URL (and
+    thumbnail width) to a blob digest and content type. When the blobs
+    pass `max_bytes` the least recently served are deleted along with
+    the refs to them, so neither directory grows without bound. Workers
+    sharing the directory each keep their own index, rebuilt from blob
+    mtimes on start; a ref another worker wrote to a blob this one
+    evicts is deleted when next looked up, or at the next start.
+    """
+
+    def __init__(self, root: str = POSTER_CACHE_DIR, max_bytes: int = POSTER_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        # digest -> [size, last touched], least recently served first
+        self._blobs: "OrderedDict[str, list]" = OrderedDict()
+        # ref key -> (digest, content type), and digest -> ref keys
+        self._refs: Dict[str, Tuple[str, str]] = {}
+        self._refs_by_blob: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def load(self) -> None:
+        """
+        Create the directories, index existing blobs oldest first, and
+        their refs; refs to missing blobs are deleted.
+        """
+        (self.root / "blobs").mkdir(parents=True, exist_ok=True)
+        (self.root / "refs").mkdir(parents=True, exist_ok=True)
+        blobs = []
+        for path in (self.root / "blobs").glob("*/*"):
+            if path.name.startswith("."):
+                path.unlink(missing_ok=True)  # an interrupted write
+                continue
+            stat = path.stat()
+            blobs.append((stat.st_mtime, path.name, stat.st_size))
+        for mtime, digest, size in sorted(blobs):
+            self._blobs[digest] = [size, mtime]
+            self.total_bytes += size
+        for path in (self.root / "refs").glob("*/*"):
+            ref = None if path.name.startswith(".") else self._read_ref(path.name)
+            if ref is None or ref[0] not in self._blobs:
+                path.unlink(missing_ok=True)
+            else:
+                self._remember_ref(path.name, ref)
+        self._evict()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def ref_path(self, key: str) -> Path:
+        return self.root / "refs" / key[:2] / key
+
+    @staticmethod
+    def ref_key(url: str, width: Optional[int] = None) -> str:
+        return hashlib.sha256(f"{url}#{width or ''}".encode()).hexdigest()
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+    async def get(self, client: httpx.AsyncClient, url: str, width: Optional[int] = None) -> Poster:
+        """The cached poster for `url`, fetching and storing it on a miss."""
+        poster = await self._lookup(url, width)
+        if poster is not None:
+            poster_requests.inc(("hit",))
+            return poster
+
+        poster_requests.inc(("miss",))
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(client, url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._inflight.pop(url, None))
+        try:
+            await asyncio.shield(task)
+        except PosterUnavailable:
+            poster_requests.inc(("error",))
+            raise
+
+        poster = await self._lookup(url, width)
+        if poster is None:
+            # evicted straight away (a tiny max_bytes), or an unknown width
+            raise PosterUnavailable(f"{url} could not be cached")
+        return poster
+
+    async def _lookup(self, url: str, width: Optional[int]) -> Optional[Poster]:
+        key = self.ref_key(url, width)
+        ref = self._refs.get(key)
+        if ref is None:
+            ref = await asyncio.to_thread(self._read_ref, key)
+            if ref is None:
+                return None
+            self._remember_ref(key, ref)
+
+        digest, content_type = ref
+        path = self.blob_path(digest)
+        blob = self._blobs.get(digest)
+        now = time.time()
+        touch = blob is None or now - blob[1] > TOUCH_INTERVAL_SECONDS
+        try:
+            stat = await asyncio.to_thread(self._stat, path, touch)
+        except FileNotFoundError:
+            # evicted, possibly by another worker
+            self._forget(digest)
+            self._drop_refs(digest)
+            return None
+        if blob is None:
+            # stored by another worker since this one started
+            self._blobs[digest] = [stat.st_size, now]
+            self.total_bytes += stat.st_size
+        elif touch:
+            blob[1] = now
+        self._blobs.move_to_end(digest)
+        return Poster(path, stat, digest, content_type)
+
+    def _read_ref(self, key: str) -> Optional[Tuple[str, str]]:
+        try:
+            digest, content_type = self.ref_path(key).read_text().split(maxsplit=1)
+        except (FileNotFoundError, ValueError):
+            return None
+        return digest, content_type.strip()
+
+    @staticmethod
+    def _stat(path: Path, touch: bool) -> os.stat_result:
+        if touch:
+            os.utime(path)
+        return path.stat()
+
+    # -------------------------
+    # Ingest
+    # -------------------------
+    async def _fill(self, client: httpx.AsyncClient, url: str) -> None:
+        body, content_type = await fetch(client, url)
+        stored = await asyncio.to_thread(self._ingest, url, body, content_type)
+        for key, digest, size, stored_type in stored:
+            if digest not in self._blobs:
+                self._blobs[digest] = [size, time.time()]
+                self.total_bytes += size
+            self._blobs.move_to_end(digest)
+            self._remember_ref(key, (digest, stored_type))
+        self._evict()
+
+    def _ingest(self, url: str, body: bytes, content_type: str) -> List[Tuple[str, str, int, str]]:
+        """Write the image and its thumbnails (runs in a worker thread)."""
+        stored = [(self.ref_key(url), *self._write_blob(body), content_type)]
+        for width, thumbnail, thumbnail_type in make_thumbnails(body, content_type):
+            stored.append((self.ref_key(url, width), *self._write_blob(thumbnail), thumbnail_type))
+        for key, digest, _, stored_type in stored:
+            self._write_atomic(self.ref_path(key), f"{digest} {stored_type}\n".encode())
+        return stored
+
+    def _write_blob(self, body: bytes) -> Tuple[str, int]:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(digest)
+        if not path.exists():
+            self._write_atomic(path, body)
+        return digest, len(body)
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    # -------------------------
+    # Eviction
+    # -------------------------
+    def _forget(self, digest: str) -> None:
+        blob = self._blobs.pop(digest, None)
+        if blob is not None:
+            self.total_bytes -= blob[0]
+
+    def _remember_ref(self, key: str, ref: Tuple[str, str]) -> None:
+        old = self._refs.get(key)
+        if old is not None and old[0] != ref[0]:
+            self._refs_by_blob.get(old[0], set()).discard(key)
+        self._refs[key] = ref
+        self._refs_by_blob.setdefault(ref[0], set()).add(key)
+
+    def _drop_refs(self, digest: str) -> None:
+        """Delete the refs to a blob that is gone."""
+        for key in self._refs_by_blob.pop(digest, ()):
+            self._refs.pop(key, None)
+            # unless another worker has since pointed it at a new image
+            on_disk = self._read_ref(key)
+            if on_disk is None or on_disk[0] == digest:
+                self.ref_path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._blobs:
+            digest, (size, _) = self._blobs.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            self.blob_path(digest).unlink(missing_ok=True)
+            self._drop_refs(digest)
+
+
+# =========================
+# Fetching
+# =========================
+async def fetch(client: httpx.AsyncClient, url: str) -> Tuple[bytes, str]:
+    """Download one image through the shared client, bounded in time and size."""
+    try:
+        async with asyncio.timeout(POSTER_FETCH_TIMEOUT_SECONDS):
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").split(";")[0].strip()
+                if not content_type.startswith("image/"):
+                    raise PosterUnavailable(f"{url} is {content_type or 'untyped'}, not an image")
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > POSTER_MAX_IMAGE_BYTES:
+                        raise PosterUnavailable(f"{url} is larger than {POSTER_MAX_IMAGE_BYTES} bytes")
+                    chunks.append(chunk)
+    except (httpx.HTTPError, TimeoutError) as exc:
+        raise PosterUnavailable(f"fetching {url} failed: {exc!r}") from exc
+    return b"".join(chunks), content_type
+
+
+def make_thumbnails(body: bytes, content_type: str) -> List[Tuple[int, bytes, str]]:
+    """
+    (width, image, content type) for each configured thumbnail width.
+    Widths the image doesn't exceed get the original, which the store
+    keeps once since it is the same blob.
+    """
+    if Image is None or not POSTER_THUMBNAIL_WIDTHS:
+        return []
+    try:
+        with Image.open(BytesIO(body)) as image:
+            image.load()
+            thumbnails = []
+            for width in POSTER_THUMBNAIL_WIDTHS:
+                if width >= image.width:
+                    thumbnails.append((width, body, content_type))
+                    continue
+                resized = image.copy()
+                resized.thumbnail((width, image.height), Image.LANCZOS)
+                out = BytesIO()
+                if resized.mode in ("RGBA", "LA", "P"):
+                    resized.save(out, "PNG", optimize=True)
+                    thumbnails.append((width, out.getvalue(), "image/png"))
+                else:
+                    resized.convert("RGB").save(out, "JPEG", quality=85, optimize=True)
+                    thumbnails.append((width, out.getvalue(), "image/jpeg"))
+            return thumbnails
+    except Exception as exc:
+        # the original is still served; only the thumbnails are skipped
+        logger.warning("could not make poster thumbnails: %r", exc)
+        return []
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import httpx
+
+from app import metrics, resilience
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Provider Configuration
+# =========================
+TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+# The API URLs can be pointed at local stand-ins (see bench/stub_providers.py)
+TMDB_SEARCH_URL = os.getenv("TMDB_SEARCH_URL", "https://api.themoviedb.org/3/search/movie")
+TMDB_MOVIE_URL = os.getenv("TMDB_MOVIE_URL", "https://api.themoviedb.org/3/movie")
+TMDB_IMAGE_URL = "https://image.tmdb.org/t/p/w500"
+GOOGLE_BOOKS_API = os.getenv("GOOGLE_BOOKS_API", "https://www.googleapis.com/books/v1/volumes")
+
+# Per-provider budget for a single search call. A provider that misses its
+# budget is dropped from the response instead of holding up the others.
+TMDB_TIMEOUT_SECONDS = float(os.getenv("TMDB_TIMEOUT_SECONDS", "2.5"))
+GOOGLE_BOOKS_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_BOOKS_TIMEOUT_SECONDS", "2.5"))
+
+# Calls in flight per provider; past this, searches skip the provider at once
+PROVIDER_MAX_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "20"))
+# Retries of connection errors, 5xx and 429 (within the provider's budget)
+PROVIDER_RETRIES = int(os.getenv("PROVIDER_RETRIES", "1"))
+PROVIDER_RETRY_BACKOFF_SECONDS = float(os.getenv("PROVIDER_RETRY_BACKOFF_SECONDS", "0.1"))
+# Send a second request when the first is slower than this (0 disables);
+# set it near the provider's p95 to cut the tail for ~5% more calls
+PROVIDER_HEDGE_AFTER_SECONDS = float(os.getenv("PROVIDER_HEDGE_AFTER_SECONDS", "0"))
+# Failed searches in a row that open a provider's circuit, and how long
+# it stays open (provider skipped without a call) before one probe
+PROVIDER_BREAKER_FAILURES = int(os.getenv("PROVIDER_BREAKER_FAILURES", "5"))
+PROVIDER_BREAKER_RESET_SECONDS = float(os.getenv("PROVIDER_BREAKER_RESET_SECONDS", "30"))
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the shared, pooled client used for every upstream call."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=30.0,
+        ),
+        timeout=httpx.Timeout(10.0, connect=3.0),
+    )
+
+
+# =========================
+# Providers
+# =========================
+def tmdb_result(movie: dict) -> dict:
+    poster_path = movie.get("poster_path")
+    return {
+        "externalId": f"tmdb-{movie['id']}",
+        "title": movie["title"],
+        "description": movie.get("overview"),
+        "posterUrl": f"{TMDB_IMAGE_URL}{poster_path}" if poster_path else None,
+        "type": "movie",
+    }
+
+
+def google_books_result(volume: dict) -> dict:
+    info = volume.get("volumeInfo", {})
+    return {
+        "externalId": f"gb-{volume['id']}",
+        "title": info.get("title"),
+        "description": info.get("description"),
+        "posterUrl": info.get("imageLinks", {}).get("thumbnail"),
+        "type": "book",
+    }
+
+
+async def search_tmdb(client: httpx.AsyncClient, query: str):
+    r = await client.get(
+        TMDB_SEARCH_URL, params={"api_key": TMDB_API_KEY, "query": query}
+    )
+    r.raise_for_status()
+    return [tmdb_result(m) for m in r.json().get("results", [])]
+
+
+async def search_google_books(client: httpx.AsyncClient, query: str):
+    r = await client.get(GOOGLE_BOOKS_API, params={"q": query})
+    r.raise_for_status()
+    return [google_books_result(b) for b in r.json().get("items", [])]
+
+
+async def tmdb_details(client: httpx.AsyncClient, external_id: str) -> dict:
+    r = await client.get(
+        f"{TMDB_MOVIE_URL}/{external_id.removeprefix('tmdb-')}", params={"api_key": TMDB_API_KEY}
+    )
+    r.raise_for_status()
+    return tmdb_result(r.json())
+
+
+async def google_books_details(client: httpx.AsyncClient, external_id: str) -> dict:
+    r = await client.get(f"{GOOGLE_BOOKS_API}/{external_id.removeprefix('gb-')}")
+    r.raise_for_status()
+    return google_books_result(r.json())
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """Errors that say the provider is unhealthy: retried, and counted by the breaker."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, (asyncio.TimeoutError, httpx.TransportError))
+
+
+def failure_reason(exc: BaseException) -> str:
+    if isinstance(exc, resilience.CircuitOpen):
+        return "circuit_open"
+    if isinstance(exc, resilience.Saturated):
+        return "saturated"
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"http_{exc.response.status_code}"
+    if isinstance(exc, httpx.TransportError):
+        return "transport"
+    return "other"
+
+
+def circuit_changed(provider: str, state: str) -> None:
+    metrics.upstream_circuit_transitions.inc((provider, state))
+
+
+class Provider:
+    """
+    One search provider and the guards around calling it: a time budget
+    per search, a concurrency cap, retries, optional hedging, and a
+    circuit breaker that skips the provider while it keeps failing.
+    """
+
+    def __init__(self, type: str, name: str, prefix: str, search, details, timeout: float):
+        self.type = type
+        self.name = name
+        self.prefix = prefix  # of the external ids it issues
+        self.search = search
+        self.details = details
+        self.timeout = timeout
+        self.breaker = resilience.CircuitBreaker(
+            name, PROVIDER_BREAKER_FAILURES, PROVIDER_BREAKER_RESET_SECONDS, on_change=circuit_changed
+        )
+        self.limit = resilience.ConcurrencyLimit(name, PROVIDER_MAX_CONCURRENCY)
+
+    async def call(self, client: httpx.AsyncClient, query: str, operation=None):
+        """Run `operation` (default: search) for `query` through the guards."""
+        operation = operation or self.search
+        self.breaker.before_call()
+        try:
+            results = await asyncio.wait_for(self._attempts(client, query, operation), self.timeout)
+        except asyncio.CancelledError:
+            self.breaker.record_ignored()
+            raise
+        except Exception as exc:
+            if is_upstream_failure(exc):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_ignored()
+            raise
+        self.breaker.record_success()
+        return results
+
+    async def _attempts(self, client: httpx.AsyncClient, query: str, operation):
+        return await resilience.retry(
+            lambda: resilience.hedge(
+                lambda: self._attempt(client, query, operation),
+                PROVIDER_HEDGE_AFTER_SECONDS,
+                can_hedge=self.limit.available,
+                on_hedge=lambda: metrics.upstream_hedges.inc((self.name,)),
+            ),
+            attempts=PROVIDER_RETRIES + 1,
+            backoff=PROVIDER_RETRY_BACKOFF_SECONDS,
+            retryable=is_upstream_failure,
+            on_retry=lambda exc: metrics.upstream_retries.inc((self.name,)),
+        )
+
+    async def _attempt(self, client: httpx.AsyncClient, query: str, operation):
+        with self.limit:
+            return await operation(client, query)
+
+
+# in response order
+PROVIDERS = [
+    Provider("movie", "tmdb", "tmdb-", search_tmdb, tmdb_details, TMDB_TIMEOUT_SECONDS),
+    Provider(
+        "book", "google_books", "gb-", search_google_books, google_books_details,
+        GOOGLE_BOOKS_TIMEOUT_SECONDS,
+    ),
+]
+
+
+def provider_for(external_id: str) -> Optional[Provider]:
+    """The provider that issued `external_id`, if any."""
+    for provider in PROVIDERS:
+        if external_id.startswith(provider.prefix):
+            return provider
+    return None
+
+
+async def timed(provider: str, call):
+    """Await one provider call, recording its latency and any failure."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        return await call
+    except BaseException as exc:
+        outcome = "error"
+        if not isinstance(exc, asyncio.CancelledError):
+            metrics.upstream_errors.inc((provider, failure_reason(exc)))
+        raise
+    finally:
+        metrics.upstream_request_duration.observe(time.perf_counter() - start, (provider, outcome))
+
+
+async def search_all(client: httpx.AsyncClient, query: str, type: str = "all"):
+    """
+    Query every provider matching `type` concurrently.
+    Providers that fail, time out, are at their concurrency cap or have
+    an open circuit are skipped, so the caller gets partial results
+    rather than an error.
+
+    Returns `(results, complete)`; `complete` is False when any provider
+    was skipped.
+    """
+    selected = [p for p in PROVIDERS if type in ("all", p.type)]
+    outcomes = await asyncio.gather(
+        *(timed(p.name, p.call(client, query)) for p in selected),
+        return_exceptions=True,
+    )
+
+    results = []
+    complete = True
+    for provider, outcome in zip(selected, outcomes):
+        if isinstance(outcome, BaseException):
+            # an open circuit was logged when it opened
+            if not isinstance(outcome, resilience.CircuitOpen):
+                logger.warning("search provider %s failed: %r", provider.name, outcome)
+            complete = False
+            continue
+        results.extend(outcome)
+    return results, complete
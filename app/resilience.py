@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Everything here is used from the event loop thread only, so the state
+# below is plain attributes with no locks.
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open, next probe in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class Saturated(Exception):
+    def __init__(self, name: str, limit: int):
+        super().__init__(f"{name} already has {limit} calls in flight")
+        self.name = name
+        self.limit = limit
+
+
+# =========================
+# Circuit Breaker
+# =========================
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through; `failure_threshold` failures in a row open it.
+    open: calls fail fast with CircuitOpen for `reset_seconds`.
+    half_open: a single probe call goes through; its success closes the
+    circuit, its failure opens it for another `reset_seconds`.
+
+    Callers report every call they were let through with exactly one of
+    record_success, record_failure or record_ignored (an outcome that
+    says nothing about the dependency's health, e.g. a cancellation).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        on_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen unless a call may go through now."""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if retry_in > 0:
+                raise CircuitOpen(self.name, retry_in)
+            self._set_state(self.HALF_OPEN)
+        if self.probing:
+            raise CircuitOpen(self.name, 0.0)
+        self.probing = True
+
+    def record_success(self) -> None:
+        self.probing = False
+        if self.state == self.OPEN:
+            # a call from before the circuit opened; only a probe may close it
+            return
+        self.failures = 0
+        if self.state == self.HALF_OPEN:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.probing = False
+        if self.state == self.OPEN:
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def record_ignored(self) -> None:
+        self.probing = False
+
+    def reset(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def _set_state(self, state: str) -> None:
+        logger.warning("%s circuit %s -> %s", self.name, self.state, state)
+        self.state = state
+        if self.on_change is not None:
+            self.on_change(self.name, state)
+
+
+# =========================
+# Concurrency Limit
+# =========================
+class ConcurrencyLimit:
+    """
+    Caps calls in flight to one dependency. Over the cap, calls fail at
+    once with Saturated instead of queueing behind a slow dependency.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+
+    def available(self) -> bool:
+        return self.in_flight < self.limit
+
+    def __enter__(self):
+        if self.in_flight >= self.limit:
+            raise Saturated(self.name, self.limit)
+        self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.in_flight -= 1
+
+
+# =========================
+# Retries and Hedging
+# =========================
+async def retry(
+    call: Callable[[], Awaitable[T]],
+    attempts: int,
+    backoff: float,
+    retryable: Callable[[BaseException], bool],
+    on_retry: Optional[Callable[[BaseException], None]] = None,
+) -> T:
+    """
+    Await `call()` up to `attempts` times, retrying errors `retryable`
+    accepts after a full-jitter backoff (0..backoff * 2**n seconds).
+    The caller bounds the total time, e.g. with asyncio.wait_for.
+    """
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception as exc:
+            if attempt == attempts - 1 or not retryable(exc):
+                raise
+            if on_retry is not None:
+                on_retry(exc)
+            await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+    raise ValueError("attempts must be at least 1")
+
+
+async def hedge(
+    call: Callable[[], Awaitable[T]],
+    delay: float,
+    can_hedge: Callable[[], bool] = lambda: True,
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> T:
+    """
+    Await `call()`; if it hasn't finished after `delay` seconds (and
+    `can_hedge()`), start a second identical call and return whichever
+    succeeds first. The other is cancelled. A delay of 0 disables it.
+    """
+    if delay <= 0:
+        return await call()
+
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and can_hedge():
+            if on_hedge is not None:
+                on_hedge()
+            tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
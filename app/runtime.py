@@ -0,0 +1,58 @@
+import math
+import os
+from typing import Optional
+
+# Process-level sizing shared by the server config and the app: how many
+# CPUs this container may really use, and how many workers share them.
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota (may be fractional), or None if unlimited."""
+    cpu_max = _read(CGROUP_V2_CPU_MAX)
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota, period = _read(CGROUP_V1_QUOTA), _read(CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cpu_limit() -> int:
+    """
+    CPUs this process can actually use: the cgroup quota rounded up,
+    bounded by the CPUs it may be scheduled on. os.cpu_count() reports
+    the host's CPUs, which in a container can be many times the quota.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """
+    Server processes sharing this container's CPUs and its database
+    connection budget. The production server exports WEB_CONCURRENCY
+    for its workers; a lone uvicorn process leaves it unset.
+    """
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
@@ -1,6 +1,6 @@
 # app/schemas.py
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 
 # ------------------------
 # Item Schemas
@@ -37,17 +37,34 @@ class UserOut(BaseModel):
 # User Item Schema (for /user/items)
 # ------------------------
 class UserItemOut(Item):
+    """
+    An entry of the user's list, as every /user/items endpoint sends it:
+    the snake_case keys the frontend reads plus ItemBase's camelCase ones.
+    """
     id: int
+    user_id: int
+    item_id: int
+    external_id: str
+    externalId: Optional[str] = None
     name: str
+    title: str
     description: Optional[str] = None
     type: str
-    externalId: Optional[str] = None
+    poster_url: Optional[str] = None
     posterUrl: Optional[str] = None
+    status: Optional[str] = None
+    rating: Optional[int] = None
+    review: Optional[str] = None
 
     class Config:
         orm_mode = True
 
 
+class UserItemPage(BaseModel):
+    items: List[UserItemOut]
+    next_cursor: Optional[str] = None
+
+
 class UserItemCreate(BaseModel):
     external_id: str
     title: str
@@ -60,4 +77,45 @@ class UserItemCreate(BaseModel):
         fields = {
             "external_id": "externalId",
             "poster_url": "posterUrl",
-        }
\ No newline at end of file
+        }
+
+
+class DeletedUserItem(BaseModel):
+    id: int                          # user item id
+    external_id: Optional[str] = None
+
+
+class UserItemChanges(BaseModel):
+    items: List[UserItemOut]         # added or changed entries, in full
+    deleted: List[DeletedUserItem]
+    next_cursor: str
+    has_more: bool
+
+
+# ------------------------
+# Bulk Import Schemas (for /user/items/bulk)
+# ------------------------
+class BulkImportRow(BaseModel):
+    index: int
+    status: str                      # 'created' / 'exists' / 'invalid'
+    external_id: Optional[str] = None
+    id: Optional[int] = None         # user item id
+    error: Optional[str] = None
+
+
+class BulkImportResult(BaseModel):
+    created: int
+    existing: int
+    invalid: int
+    results: List[BulkImportRow]
+
+
+# ------------------------
+# List Statistics Schemas (for /user/stats)
+# ------------------------
+class UserStatsOut(BaseModel):
+    total: int
+    by_status: Dict[str, int]        # "" for entries without a status
+    by_type: Dict[str, int]          # "" for items without a type
+    rating_count: int
+    average_rating: Optional[float] = None
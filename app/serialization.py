@@ -0,0 +1,46 @@
+import operator
+from typing import Callable, Mapping, Optional, Sequence, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=str, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response encoded by orjson. Endpoints return it directly with
+    content built by a row serializer, which skips response_model
+    validation and FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def row_serializer(
+    columns: Sequence[str],
+    fields: Sequence[Tuple[str, str]],
+    constants: Optional[Mapping] = None,
+) -> Callable:
+    """
+    Compile a row -> dict function for result rows whose leading columns
+    are `columns`. `fields` lists (output key, column name) pairs; a
+    column can feed several keys. Positions are resolved once here, so
+    each row costs one itemgetter call and one dict update.
+    """
+    position = {name: i for i, name in enumerate(columns)}
+    keys = tuple(key for key, _ in fields)
+    getter = operator.itemgetter(*(position[column] for _, column in fields))
+    base = dict(constants or {})
+
+    def serialize(row) -> dict:
+        out = base.copy()
+        out.update(zip(keys, getter(row)))
+        return out
+
+    return serialize
@@ -0,0 +1,160 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from app import metrics
+from app.database import env_flag
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# SQL Tracing Configuration
+# =========================
+# Log requests that run more statements than this
+SQL_TRACE_MAX_QUERIES = int(os.getenv("SQL_TRACE_MAX_QUERIES", "20"))
+# The same statement this many times in one request looks like N+1
+SQL_TRACE_REPEAT_THRESHOLD = int(os.getenv("SQL_TRACE_REPEAT_THRESHOLD", "5"))
+# Raise NPlusOneDetected instead of logging (meant for tests)
+SQL_TRACE_STRICT = env_flag("SQL_TRACE_STRICT")
+SQL_TRACE_SERVER_TIMING = env_flag("SQL_TRACE_SERVER_TIMING", "true")
+
+
+class NPlusOneDetected(RuntimeError):
+    def __init__(self, statement: str, count: int):
+        super().__init__(f"statement ran {count} times in one request: {statement[:200]}")
+        self.statement = statement
+        self.count = count
+
+
+# =========================
+# Per-request Accounting
+# =========================
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "statements", "repeats_expected")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        # statement text (parameters are placeholders) -> times run
+        self.statements: Dict[str, int] = {}
+        self.repeats_expected = False
+
+    def most_repeated(self):
+        if not self.statements:
+            return None, 0
+        return max(self.statements.items(), key=lambda item: item[1])
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def track():
+    """Account statements run in this context (and tasks it starts) to a fresh RequestStats."""
+    stats = RequestStats()
+    token = current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        current_request.reset(token)
+
+
+def expect_repeats() -> None:
+    """Mark the current request as running the same statements on purpose (e.g. batches)."""
+    stats = current_request.get()
+    if stats is not None:
+        stats.repeats_expected = True
+
+
+def instrument_engine(sync_engine) -> None:
+    """Count and time every statement run on `sync_engine` against the current request."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        if stats is None:
+            return
+        count = stats.statements.get(statement, 0) + 1
+        stats.statements[statement] = count
+        if (
+            SQL_TRACE_STRICT
+            and not stats.repeats_expected
+            and count >= SQL_TRACE_REPEAT_THRESHOLD
+        ):
+            raise NPlusOneDetected(statement, count)
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def finished(conn):
+        started = conn.info.get("query_started")
+        stats = current_request.get()
+        if started and stats is not None:
+            stats.queries += 1
+            stats.db_seconds += time.perf_counter() - started.pop()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        finished(conn)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None:
+            finished(context.connection)
+
+
+# =========================
+# Middleware
+# =========================
+class SQLTraceMiddleware:
+    """
+    Count and time the SQL each request runs. Adds a Server-Timing
+    header, feeds the per-route metrics, and logs requests with too many
+    statements or a statement repeated like an N+1 loop.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track() as stats:
+
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start" and SQL_TRACE_SERVER_TIMING:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                self.report(scope, stats)
+
+    def report(self, scope, stats: RequestStats) -> None:
+        route = metrics.route_template(scope)
+        metrics.http_request_db_queries.observe(stats.queries, (route,))
+        metrics.http_request_db_seconds.observe(stats.db_seconds, (route,))
+
+        if stats.queries > SQL_TRACE_MAX_QUERIES:
+            logger.warning(
+                "%s %s ran %d SQL statements in %.1f ms",
+                scope["method"], route, stats.queries, stats.db_seconds * 1000,
+            )
+
+        statement, count = stats.most_repeated()
+        if count >= SQL_TRACE_REPEAT_THRESHOLD and not stats.repeats_expected:
+            logger.warning(
+                "possible N+1 in %s %s: statement ran %d times: %s",
+                scope["method"], route, count, " ".join(statement.split())[:200],
+            )
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# app.main imports this module before anything else, so this marks the
+# start of the app's imports.
+IMPORT_STARTED = time.perf_counter()
+
+# =========================
+# Warm-up Configuration
+# =========================
+# DB connections opened before the worker reports ready (default: DB_POOL_SIZE)
+WARMUP_DB_CONNECTIONS = os.getenv("WARMUP_DB_CONNECTIONS")
+# Open keep-alive connections to TMDb and Google Books before reporting ready
+# (parsed here rather than with database.env_flag, which imports SQLAlchemy)
+WARMUP_UPSTREAMS = os.getenv("WARMUP_UPSTREAMS", "true").strip().lower() in ("1", "true", "yes", "on")
+WARMUP_UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("WARMUP_UPSTREAM_TIMEOUT_SECONDS", "3"))
+
+
+class StartupTimer:
+    """Durations of the startup phases, and whether warm-up has finished."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.started = time.perf_counter()
+
+    def start(self) -> None:
+        """
+        Restart the clock as a worker starts serving. Under gunicorn's
+        preload_app the import ran once in the master, possibly hours
+        before this worker was forked: its phase is kept as it was and
+        left out of the worker's total.
+        """
+        self.started = time.perf_counter()
+        self.ready = False
+        self.phases = {name: seconds for name, seconds in self.phases.items() if name == "import"}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = round(seconds, 3)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    async def timed(self, name: str, awaitable: Awaitable):
+        with self.phase(name):
+            return await awaitable
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+
+
+timings = StartupTimer()
+
+
+# =========================
+# Warm-up
+# =========================
+def load_deferred_imports() -> None:
+    """
+    Import what the app keeps off its import path because only auth
+    routes use it (jose with its crypto backends, passlib and bcrypt),
+    so the first login doesn't pay for it.
+    """
+    import jose.jwt  # noqa: F401
+
+    from app import hashing
+
+    hashing.password_context()
+
+
+async def warm_database(connections: Optional[int] = None) -> None:
+    """
+    Open `connections` pool connections at once, so the first requests
+    find them established (asyncpg connect, TLS, SQLAlchemy's first-
+    connect dialect setup). Retries until the database answers: until
+    then the worker isn't ready.
+    """
+    from sqlalchemy import text
+
+    from app.database import DB_POOL_SIZE, async_engine
+
+    if connections is None:
+        connections = int(WARMUP_DB_CONNECTIONS or DB_POOL_SIZE)
+
+    async def ping():
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    while True:
+        try:
+            await asyncio.gather(*(ping() for _ in range(connections)))
+            return
+        except Exception as exc:
+            logger.warning("database warm-up failed, retrying: %r", exc)
+            await asyncio.sleep(1)
+
+
+async def warm_upstreams(client, urls: Iterable[str], timeout: float = WARMUP_UPSTREAM_TIMEOUT_SECONDS) -> None:
+    """
+    Leave a keep-alive connection (TCP and TLS) to each upstream origin
+    in `client`'s pool. Any response will do; failures are logged, and
+    the first real request connects as it would have anyway.
+    """
+    origins = {"{0.scheme}://{0.netloc}/".format(urlsplit(url)) for url in urls}
+
+    async def touch(origin: str):
+        try:
+            await client.head(origin, timeout=timeout)
+        except Exception as exc:
+            logger.warning("warm-up of %s failed: %r", origin, exc)
+
+    await asyncio.gather(*(touch(origin) for origin in sorted(origins)))
+
+
+async def warm_up(client) -> None:
+    """Warm everything the first requests would otherwise pay for, then report ready."""
+    from app import providers
+
+    jobs = [
+        timings.timed("warm_db", warm_database()),
+        timings.timed("warm_imports", asyncio.to_thread(load_deferred_imports)),
+    ]
+    if WARMUP_UPSTREAMS:
+        urls = (
+            providers.TMDB_SEARCH_URL,
+            providers.TMDB_MOVIE_URL,
+            providers.TMDB_IMAGE_URL,
+            providers.GOOGLE_BOOKS_API,
+        )
+        jobs.append(timings.timed("warm_upstreams", warm_upstreams(client, urls)))
+
+    with timings.phase("warmup"):
+        await asyncio.gather(*jobs)
+    timings.record("total", time.perf_counter() - timings.started)
+    timings.ready = True
+    # the server's logger: the app's own loggers only pass warnings
+    logging.getLogger("uvicorn.error").info("ready, startup took: %s", timings.summary())
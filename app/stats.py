@@ -0,0 +1,179 @@
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+
+# (status, type, item_count, rating_sum, rating_count)
+Delta = Tuple[str, str, int, int, int]
+
+
+# =========================
+# Incremental Maintenance
+# =========================
+def entry_delta(status: Optional[str], type: Optional[str], rating: Optional[int], sign: int = 1) -> Delta:
+    """Contribution of one list entry to the aggregates; sign=-1 removes it."""
+    rated = rating is not None
+    return (
+        status or "",
+        type or "",
+        sign,
+        sign * rating if rated else 0,
+        sign if rated else 0,
+    )
+
+
+async def apply_deltas(db: AsyncSession, user_id: int, deltas: Iterable[Delta]) -> None:
+    """
+    Fold deltas into user_stats with one upsert. Runs in the caller's
+    transaction, so the aggregates commit or roll back with the list
+    change that produced them.
+    """
+    totals = {}
+    for status, type, count, rating_sum, rating_count in deltas:
+        t = totals.setdefault((status, type), [0, 0, 0])
+        t[0] += count
+        t[1] += rating_sum
+        t[2] += rating_count
+
+    rows = [
+        {
+            "user_id": user_id,
+            "status": status,
+            "type": type,
+            "item_count": count,
+            "rating_sum": rating_sum,
+            "rating_count": rating_count,
+        }
+        # sorted, so concurrent writers lock stats rows in the same order
+        for (status, type), (count, rating_sum, rating_count) in sorted(totals.items())
+        if count or rating_sum or rating_count
+    ]
+    if not rows:
+        return
+
+    await db.execute(accumulate(insert(models.UserStat).values(rows)))
+
+
+def accumulate(stmt):
+    """ON CONFLICT clause that adds the inserted counts onto an existing row."""
+    return stmt.on_conflict_do_update(
+        index_elements=[models.UserStat.user_id, models.UserStat.status, models.UserStat.type],
+        set_={
+            "item_count": models.UserStat.item_count + stmt.excluded.item_count,
+            "rating_sum": models.UserStat.rating_sum + stmt.excluded.rating_sum,
+            "rating_count": models.UserStat.rating_count + stmt.excluded.rating_count,
+        },
+    )
+
+
+# =========================
+# Reads
+# =========================
+async def get_user_stats(db: AsyncSession, user_id: int) -> dict:
+    """Summarize a user's list from their (few) user_stats rows."""
+    rows = await db.execute(
+        select(models.UserStat).where(
+            models.UserStat.user_id == user_id,
+            models.UserStat.item_count > 0,
+        )
+    )
+
+    total = rating_sum = rating_count = 0
+    by_status, by_type = {}, {}
+    for stat in rows.scalars():
+        status, type = stat.status, stat.type
+        total += stat.item_count
+        rating_sum += stat.rating_sum
+        rating_count += stat.rating_count
+        by_status[status] = by_status.get(status, 0) + stat.item_count
+        by_type[type] = by_type.get(type, 0) + stat.item_count
+
+    return {
+        "total": total,
+        "by_status": by_status,
+        "by_type": by_type,
+        "rating_count": rating_count,
+        "average_rating": round(rating_sum / rating_count, 2) if rating_count else None,
+    }
+
+
+# =========================
+# Consistency Checks
+# =========================
+def actual_stats_query(user_id: Optional[int] = None):
+    """Aggregates computed from scratch from user_items."""
+    status = func.coalesce(models.UserItem.status, "")
+    type = func.coalesce(models.Item.type, "")
+    stmt = (
+        select(
+            models.UserItem.user_id,
+            status.label("status"),
+            type.label("type"),
+            func.count().label("item_count"),
+            func.coalesce(func.sum(models.UserItem.rating), 0).label("rating_sum"),
+            func.count(models.UserItem.rating).label("rating_count"),
+        )
+        .join(models.Item, models.UserItem.item_id == models.Item.id)
+        .where(models.UserItem.user_id.isnot(None))
+        .group_by(models.UserItem.user_id, status, type)
+    )
+    if user_id is not None:
+        stmt = stmt.where(models.UserItem.user_id == user_id)
+    return stmt
+
+
+def mismatch_query(user_id: Optional[int] = None):
+    """Rows where user_stats disagrees with user_items."""
+    actual = actual_stats_query(user_id).subquery("actual")
+    stored_stmt = select(models.UserStat).where(
+        or_(
+            models.UserStat.item_count != 0,
+            models.UserStat.rating_sum != 0,
+            models.UserStat.rating_count != 0,
+        )
+    )
+    if user_id is not None:
+        stored_stmt = stored_stmt.where(models.UserStat.user_id == user_id)
+    stored = stored_stmt.subquery("stored")
+
+    return select(
+        func.coalesce(actual.c.user_id, stored.c.user_id).label("user_id"),
+        func.coalesce(actual.c.status, stored.c.status).label("status"),
+        func.coalesce(actual.c.type, stored.c.type).label("type"),
+        actual.c.item_count.label("actual_count"),
+        stored.c.item_count.label("stored_count"),
+        actual.c.rating_sum.label("actual_rating_sum"),
+        stored.c.rating_sum.label("stored_rating_sum"),
+    ).select_from(
+        actual.join(
+            stored,
+            and_(
+                actual.c.user_id == stored.c.user_id,
+                actual.c.status == stored.c.status,
+                actual.c.type == stored.c.type,
+            ),
+            full=True,
+        )
+    ).where(
+        or_(
+            actual.c.item_count.is_distinct_from(stored.c.item_count),
+            actual.c.rating_sum.is_distinct_from(stored.c.rating_sum),
+            actual.c.rating_count.is_distinct_from(stored.c.rating_count),
+        )
+    )
+
+
+def rebuild_statements(user_id: Optional[int] = None):
+    """DELETE + INSERT ... SELECT that recompute user_stats from user_items."""
+    clear = delete(models.UserStat)
+    if user_id is not None:
+        clear = clear.where(models.UserStat.user_id == user_id)
+
+    fill = insert(models.UserStat).from_select(
+        ["user_id", "status", "type", "item_count", "rating_sum", "rating_count"],
+        actual_stats_query(user_id),
+    )
+    return clear, fill
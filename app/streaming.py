@@ -0,0 +1,72 @@
+import csv
+import io
+import os
+from typing import Callable, Optional, Sequence
+
+from app import serialization
+from app.database import AsyncSessionLocal
+
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "500"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+def row_to_dict(row) -> dict:
+    return dict(row._mapping)
+
+
+async def stream_rows(
+    stmt,
+    format: str,
+    to_dict: Callable = row_to_dict,
+    chunk_rows: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
+):
+    """
+    Run `stmt` on a server-side cursor and yield it encoded as NDJSON, CSV
+    or a JSON array, one chunk per `chunk_rows` rows. Memory use depends
+    on the chunk size only, never on the size of the result.
+
+    The generator owns its session, since it outlives the request's
+    dependencies while the response is being sent.
+
+    `fields` are the CSV columns, in order; they also make the header of
+    an empty result. Without them the first row's keys are used.
+    """
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    fieldnames = list(fields) if fields is not None else None
+    first = True
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=chunk_rows))
+
+        async for partition in result.partitions():
+            records = [to_dict(row) for row in partition]
+
+            if format == "csv":
+                buffer = io.StringIO()
+                fieldnames = fieldnames or list(records[0])
+                writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+                if first:
+                    writer.writeheader()
+                writer.writerows(records)
+                chunk = buffer.getvalue()
+            elif format == "json":
+                body = b",".join(serialization.dumps(r) for r in records)
+                chunk = (b"[" if first else b",") + body
+            else:
+                chunk = b"\n".join(serialization.dumps(r) for r in records) + b"\n"
+
+            first = False
+            yield chunk
+
+    if format == "json":
+        yield "[]" if first else "]"
+    elif format == "csv" and first and fieldnames:
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=fieldnames).writeheader()
+        yield buffer.getvalue()
@@ -0,0 +1,163 @@
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, String, delete, false, null, select, true, tuple_
+
+from app import models
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Delta Sync Configuration
+# =========================
+# Tombstones are kept this long, and change cursors are honoured for as
+# long as every deletion after them is guaranteed to still be there.
+SYNC_TOMBSTONE_RETENTION_DAYS = float(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+SYNC_COMPACT_INTERVAL_SECONDS = float(os.getenv("SYNC_COMPACT_INTERVAL_SECONDS", "3600"))
+SYNC_COMPACT_BATCH_SIZE = int(os.getenv("SYNC_COMPACT_BATCH_SIZE", "5000"))
+
+# Tombstones outlive cursors by this much, covering long transactions and
+# clock differences between workers.
+COMPACT_MARGIN_SECONDS = 86400
+
+CURSOR_MAX_AGE_SECONDS = SYNC_TOMBSTONE_RETENTION_DAYS * 86400
+
+
+# =========================
+# Cursors
+# =========================
+def encode_cursor(version: int, last_id: int, issued_at: Optional[int] = None) -> str:
+    """
+    A cursor after (version, last_id). `issued_at` is when the sync it
+    continues started (now by default): tombstones are only guaranteed
+    for CURSOR_MAX_AGE_SECONDS after that, however many pages later.
+    """
+    if issued_at is None:
+        issued_at = int(time.time())
+    raw = json.dumps([version, last_id, issued_at], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return `(version, last_id, issued_at)`; 410 once tombstones after it may be gone."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        version, last_id, issued_at = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (version, last_id, issued_at)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if issued_at < time.time() - CURSOR_MAX_AGE_SECONDS:
+        raise HTTPException(status_code=410, detail="Cursor expired, sync the full list again")
+
+    return version, last_id, issued_at
+
+
+# =========================
+# Change Feed
+# =========================
+def changes_query(user_id: int, after: Optional[tuple] = None, include_deleted: bool = True):
+    """
+    Live entries and tombstones of a user's list ordered by (version, id),
+    optionally strictly after `after`. User item ids are never reused, so
+    (version, id) is unique across both tables.
+    """
+    live = select(
+        models.UserItem.version,
+        models.UserItem.id,
+        models.UserItem.user_id,
+        models.UserItem.item_id,
+        models.Item.external_id,
+        models.Item.name,
+        models.Item.type,
+        models.Item.poster_url,
+        models.UserItem.status,
+        models.UserItem.rating,
+        models.UserItem.review,
+        false().label("deleted"),
+    ).join(
+        models.Item, models.UserItem.item_id == models.Item.id
+    ).where(models.UserItem.user_id == user_id)
+
+    if after is not None:
+        live = live.where(tuple_(models.UserItem.version, models.UserItem.id) > tuple_(*after))
+    if not include_deleted:
+        return live.order_by(models.UserItem.version, models.UserItem.id)
+
+    tombstones = select(
+        models.UserItemTombstone.version,
+        models.UserItemTombstone.id,
+        models.UserItemTombstone.user_id,
+        null().cast(Integer),
+        models.UserItemTombstone.external_id,
+        null().cast(String),
+        null().cast(String),
+        null().cast(String),
+        null().cast(String),
+        null().cast(Integer),
+        null().cast(String),
+        true(),
+    ).where(models.UserItemTombstone.user_id == user_id)
+
+    if after is not None:
+        tombstones = tombstones.where(
+            tuple_(models.UserItemTombstone.version, models.UserItemTombstone.id) > tuple_(*after)
+        )
+
+    feed = live.union_all(tombstones).subquery("feed")
+    return select(feed).order_by(feed.c.version, feed.c.id)
+
+
+# =========================
+# Tombstone Compaction
+# =========================
+async def compact_tombstones(batch_size: Optional[int] = None) -> int:
+    """Delete tombstones past the retention window, one batch per transaction."""
+    batch_size = batch_size or SYNC_COMPACT_BATCH_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=CURSOR_MAX_AGE_SECONDS + COMPACT_MARGIN_SECONDS
+    )
+    removed = 0
+
+    while True:
+        # other workers compact concurrently; skip the batches they hold
+        expired = (
+            select(models.UserItemTombstone.id)
+            .where(models.UserItemTombstone.deleted_at < cutoff)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(models.UserItemTombstone)
+                .where(models.UserItemTombstone.id.in_(expired.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+        removed += result.rowcount
+        if result.rowcount < batch_size:
+            return removed
+
+
+async def compaction_loop() -> None:
+    """Compact tombstones every SYNC_COMPACT_INTERVAL_SECONDS until cancelled."""
+    while True:
+        await asyncio.sleep(SYNC_COMPACT_INTERVAL_SECONDS)
+        try:
+            removed = await compact_tombstones()
+            if removed:
+                logger.info("compacted %d user item tombstones", removed)
+        except Exception:
+            logger.exception("tombstone compaction failed")
@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select
+
+from app import models
+from app.database import SessionLocal
+from app.main import app, create_access_token, principal_cache
+from app.test_query_counts import capture_statements
+
+PARALLEL_REQUESTS = 20
+
+
+def test_concurrent_adds_create_one_list_entry():
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"add-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    body = {"external_id": f"add-{tag}", "title": "Arrival", "type": "movie"}
+
+    async def add_in_parallel():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/user/items", json=body, headers=headers)
+                for _ in range(PARALLEL_REQUESTS)
+            ))
+
+    try:
+        with TestClient(app) as client:
+            # the first insert of both the catalog item and the entry races
+            responses = client.portal.call(add_in_parallel)
+
+            assert all(r.status_code == 200 for r in responses)
+            assert len({r.json()["id"] for r in responses}) == 1
+            assert db.scalar(
+                select(func.count()).where(models.UserItem.user_id == user.id)
+            ) == 1
+
+            # principal lookup + one upsert statement, also when the entry exists
+            principal_cache.clear()
+            statements = capture_statements(
+                lambda: client.post("/user/items", json=body, headers=headers)
+            )
+            assert len(statements) == 2
+    finally:
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id == body["external_id"]))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
+
+
+def test_every_endpoint_returns_the_same_entry_shape():
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"shape-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    body = {"external_id": f"shape-{tag}", "title": "Arrival", "type": "movie"}
+
+    try:
+        with TestClient(app) as client:
+            added = client.post("/user/items", json=body, headers=headers).json()
+            updated = client.put(f"/user/items/{added['id']}", json={"rating": 4}, headers=headers).json()
+            listed = client.get("/user/items", headers=headers).json()[0]
+            found = client.get(f"/items/{body['external_id']}", headers=headers).json()
+            synced = client.get("/user/items/changes", headers=headers).json()["items"][0]
+            declared = client.get("/openapi.json").json()["components"]["schemas"]["UserItemOut"]["properties"]
+
+        assert updated == {**added, "rating": 4}
+        assert synced == listed
+        assert set(updated) == set(listed) == set(found) == set(declared)
+        assert updated["rating"] == listed["rating"] == 4
+    finally:
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id == body["external_id"]))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
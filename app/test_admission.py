@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.responses import PlainTextResponse
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from app import admission
+
+
+def make_app(release: asyncio.Event = None):
+    """The middleware in front of an app whose routes other than /health
+    answer once `release` is set."""
+
+    async def inner(scope, receive, send):
+        if release is not None and scope["path"] != "/health":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    return admission.AdmissionMiddleware(
+        inner, identify=lambda token: "alice" if token == "alice-token" else None
+    )
+
+
+def test_clients_over_their_rate_get_429_with_retry_after(monkeypatch):
+    monkeypatch.setitem(admission.LANES, "auth", admission.Lane("auth", 0, 0, 0, rate=0.5, burst=2))
+    app = make_app()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            anonymous = [(await client.post("/auth/login")) for _ in range(3)]
+            # a signed-in user has a bucket of their own; cheap routes have none
+            user = await client.post("/auth/login", headers={"Authorization": "Bearer alice-token"})
+            health = [(await client.get("/health")).status_code for _ in range(5)]
+            items = [(await client.get("/user/items")).status_code for _ in range(5)]
+            return anonymous, user, health, items
+
+    anonymous, user, health, items = asyncio.run(run())
+    assert [r.status_code for r in anonymous] == [200, 200, 429]
+    assert anonymous[2].headers["retry-after"] == "2"
+    assert user.status_code == 200
+    assert health == items == [200] * 5
+
+
+def test_anonymous_clients_behind_a_trusted_proxy_get_a_bucket_each(monkeypatch):
+    monkeypatch.setitem(admission.LANES, "auth", admission.Lane("auth", 0, 0, 0, rate=0.5, burst=1))
+
+    async def statuses(app, forwarded_for):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return [
+                (await client.post("/auth/login", headers={"X-Forwarded-For": f"{ip}, 127.0.0.1"})).status_code
+                for ip in forwarded_for
+            ]
+
+    # what the server does with FORWARDED_ALLOW_IPS covering the proxy
+    trusted = ProxyHeadersMiddleware(make_app(), trusted_hosts="127.0.0.1")
+    assert asyncio.run(statuses(trusted, ["203.0.113.1", "203.0.113.2", "203.0.113.1"])) == [200, 200, 429]
+
+    # from an untrusted peer the header is ignored: one bucket for everyone
+    untrusted = ProxyHeadersMiddleware(make_app(), trusted_hosts="10.0.0.1")
+    assert asyncio.run(statuses(untrusted, ["198.51.100.1", "198.51.100.2"])) == [200, 429]
+
+
+def test_full_or_slow_queues_answer_503_and_hand_slots_over(monkeypatch):
+    monkeypatch.setitem(admission.LANES, "bulk", admission.Lane("bulk", 1, queue=1, queue_timeout=0.1, rate=0, burst=0))
+
+    async def run():
+        release = asyncio.Event()
+        app = make_app(release)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            export = lambda: asyncio.ensure_future(client.get("/user/items/export"))  # noqa: E731
+            running = export()
+            await asyncio.sleep(0.01)
+            # one waits in the queue; the next finds it full
+            queued, rejected = export(), await client.get("/user/items/export")
+            # /health is never queued behind the lane
+            health = await asyncio.wait_for(client.get("/health"), 1)
+            # the queued request gives up at its deadline
+            timed_out = await queued
+
+            waiting = export()
+            await asyncio.sleep(0.01)
+            release.set()
+            return rejected, health, timed_out, await running, await waiting, app.gates["bulk"]
+
+    rejected, health, timed_out, first, waiting, gate = asyncio.run(run())
+    assert rejected.status_code == 503 and rejected.headers["retry-after"] == "1"
+    assert health.status_code == 200
+    assert timed_out.status_code == 503
+    assert first.status_code == waiting.status_code == 200
+    assert gate.in_flight == 0
+
+
+def test_a_slot_freed_as_a_waiter_times_out_is_not_lost(monkeypatch):
+    gate = admission.Gate(admission.Lane("bulk", 1, queue=1, queue_timeout=0.1, rate=0, burst=0))
+
+    async def timed_out(waiter, timeout):
+        # wait_for cancels the waiter and yields before acquire() cleans up;
+        # the running request finishes in that gap
+        waiter.cancel()
+        gate.release()
+        raise asyncio.TimeoutError
+
+    async def run():
+        await gate.acquire()
+        monkeypatch.setattr(admission.asyncio, "wait_for", timed_out)
+        with pytest.raises(admission.Rejected) as rejected:
+            await gate.acquire()
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert (rejected.status_code, rejected.reason) == (503, "queue_timeout")
+    assert gate.in_flight == 0 and not gate._waiters
@@ -0,0 +1,94 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+import app.main as main
+from app import cache, models
+from app.database import SessionLocal
+from app.main import app, create_access_token, principal_cache
+
+
+def bearer(username: str, **claims) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username, **claims})}"}
+
+
+def test_updating_or_deleting_a_user_evicts_their_principal():
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"auth-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    old_name, new_name = user.username, f"auth-{tag}-renamed"
+
+    try:
+        with TestClient(app) as client:
+            assert client.get("/auth/me", headers=bearer(old_name)).status_code == 200
+            assert principal_cache.get(old_name) is not None
+
+            # a rename drops the cached principal: the old name no longer signs in
+            user.username = new_name
+            db.commit()
+            assert principal_cache.get(old_name) is None
+            assert client.get("/auth/me", headers=bearer(old_name)).status_code == 401
+
+            assert client.get("/auth/me", headers=bearer(new_name)).json() == {"username": new_name}
+            assert principal_cache.get(new_name) is not None
+
+            # so does a delete, before the TTL runs out
+            db.delete(user)
+            db.commit()
+            assert principal_cache.get(new_name) is None
+            assert client.get("/auth/me", headers=bearer(new_name)).status_code == 401
+    finally:
+        db.rollback()
+        db.execute(delete(models.User).where(models.User.id == user_id))
+        db.commit()
+        db.close()
+
+
+def test_a_user_deleted_elsewhere_is_signed_out_once_the_ttl_ends(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    db = SessionLocal()
+    user = models.User(username=f"auth-{uuid.uuid4().hex}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = bearer(user.username)
+
+    try:
+        with TestClient(app) as client:
+            assert client.get("/auth/me", headers=headers).status_code == 200
+            # a statement (or another worker) removes the row: no ORM event here
+            db.execute(delete(models.User).where(models.User.id == user.id))
+            db.commit()
+            assert client.get("/auth/me", headers=headers).status_code == 200
+
+            now[0] += main.AUTH_CACHE_TTL_SECONDS
+            assert client.get("/auth/me", headers=headers).status_code == 401
+    finally:
+        db.rollback()
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
+
+
+def test_trusted_token_uid_skips_the_user_lookup(monkeypatch):
+    # a valid token for a user that doesn't exist
+    ghost = f"auth-{uuid.uuid4().hex}"
+
+    with TestClient(app) as client:
+        changes = lambda **claims: client.get("/user/items/changes", headers=bearer(ghost, **claims))  # noqa: E731
+        assert changes(uid=2_000_000_000).status_code == 401
+
+        monkeypatch.setattr(main, "AUTH_TRUST_TOKEN_UID", True)
+        response = changes(uid=2_000_000_000)
+        assert response.status_code == 200
+        assert response.json()["items"] == []
+        assert principal_cache.get(ghost) is None
+
+        # without a uid claim the user is looked up as usual
+        assert changes().status_code == 401
+        # routes that need the whole user always look it up
+        assert client.get("/auth/me", headers=bearer(ghost, uid=2_000_000_000)).status_code == 401
@@ -0,0 +1,72 @@
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select
+
+import app.main as main
+from app import admission, models
+from app.database import SessionLocal
+from app.main import app, create_access_token
+
+
+def test_bulk_import_json_and_ndjson(monkeypatch):
+    # small batches, so one import spans several
+    monkeypatch.setattr(main, "BULK_BATCH_SIZE", 2)
+    monkeypatch.setattr(main, "BULK_MAX_ROWS", 6)
+    monkeypatch.setattr(admission, "ADMISSION_RATE_LIMITS", False)
+
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"bulk-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    ids = [f"bulk-{tag}-{n}" for n in range(5)]
+    record = lambda n: {"external_id": ids[n], "title": f"T{n}", "type": "movie"}  # noqa: E731
+    count = lambda: db.scalar(  # noqa: E731
+        select(func.count()).select_from(models.UserItem).where(models.UserItem.user_id == user.id)
+    )
+
+    try:
+        with TestClient(app) as client:
+            # JSON: new rows, a repeat within the import, and an invalid row
+            body = client.post(
+                "/user/items/bulk", headers=headers,
+                json=[record(0), record(1), {"title": "no id"}, record(0), record(2)],
+            ).json()
+            assert (body["created"], body["existing"], body["invalid"]) == (3, 1, 1)
+            assert [row["status"] for row in body["results"]] == ["created", "created", "invalid", "exists", "created"]
+            assert body["results"][2]["error"]
+            assert body["results"][3]["id"] == body["results"][0]["id"]
+            assert count() == 3
+
+            # NDJSON, blank lines and no trailing newline included
+            lines = [json.dumps(record(2)), "", json.dumps(record(3)), "{not json", json.dumps(record(4))]
+            response = client.post(
+                "/user/items/bulk",
+                content="\n".join(lines),
+                headers={**headers, "Content-Type": "application/x-ndjson"},
+            )
+            body = response.json()
+            assert response.status_code == 200
+            assert (body["created"], body["existing"], body["invalid"]) == (2, 1, 1)
+            assert [row["index"] for row in body["results"]] == [0, 1, 2, 3]
+            assert count() == 5
+
+            # over BULK_MAX_ROWS: 413, and nothing from it is kept
+            response = client.post(
+                "/user/items/bulk", headers=headers,
+                json=[{"external_id": f"bulk-{tag}-big-{n}", "title": "B", "type": "book"} for n in range(7)],
+            )
+            assert response.status_code == 413
+            assert count() == 5
+
+            assert client.post("/user/items/bulk", headers=headers, json={"a": 1}).status_code == 400
+    finally:
+        db.rollback()
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.like(f"bulk-{tag}-%")))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
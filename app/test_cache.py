@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+
+from app import cache
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    entries = cache.TTLCache(ttl=10, max_entries=2)
+
+    entries.set("a", 1)
+    entries.set("b", 2)
+    assert entries.get("a") == 1  # "b" is now the least recently used
+    entries.set("c", 3)
+    assert entries.get("b") is None
+    assert entries.get("a") == 1 and entries.get("c") == 3
+    assert entries.evictions == 1
+
+    now[0] += 10
+    assert entries.get("a", "gone") == "gone"
+    assert entries.stats()["size"] == 1
+
+
+def test_memory_backend_evicts_at_max_entries():
+    async def run():
+        backend = cache.MemoryCacheBackend(max_entries=3)
+        far = time.time() + 60
+        for key in "abcd":
+            await backend.set(key, (key, far, far))
+        return [await backend.get(key) for key in "abcd"], backend
+
+    entries, backend = asyncio.run(run())
+    assert entries[0] is None
+    assert [entry[0] for entry in entries[1:]] == ["b", "c", "d"]
+    assert backend.evictions == 1 and len(backend) == 3
+
+
+def test_concurrent_misses_share_one_load():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value", True
+
+    async def run():
+        swr = cache.SWRCache(cache.MemoryCacheBackend(), ttl=60)
+        values = await asyncio.gather(*(swr.get_or_load("k", loader) for _ in range(50)))
+        return values, swr.stats()
+
+    values, stats = asyncio.run(run())
+    assert values == ["value"] * 50
+    assert len(calls) == 1
+    assert stats["misses"] == 50 and stats["coalesced"] == 49
+
+
+def test_stale_value_is_served_while_one_refresh_runs(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    versions = iter(["v1", "v2", "v3"])
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return next(versions), True
+
+    async def run():
+        swr = cache.SWRCache(cache.MemoryCacheBackend(), ttl=10, stale_ttl=100)
+        first = await swr.get_or_load("k", loader)
+        now[0] += 20  # stale, not expired
+        stale = await asyncio.gather(*(swr.get_or_load("k", loader) for _ in range(10)))
+        await asyncio.sleep(0.1)  # let the refresh land
+        refreshed = await swr.get_or_load("k", loader)
+        now[0] += 1000  # past the stale window: a plain miss
+        expired = await swr.get_or_load("k", loader)
+        return first, stale, refreshed, expired, swr.stats()
+
+    first, stale, refreshed, expired, stats = asyncio.run(run())
+    assert first == "v1"
+    assert stale == ["v1"] * 10
+    assert refreshed == "v2"
+    assert expired == "v3"
+    assert len(calls) == 3
+    assert stats["stale_hits"] == 10
+
+
+def test_uncacheable_results_are_not_stored():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return "partial", False
+
+    async def run():
+        swr = cache.SWRCache(cache.MemoryCacheBackend(), ttl=60)
+        return [await swr.get_or_load("k", loader) for _ in range(2)]
+
+    assert asyncio.run(run()) == ["partial", "partial"]
+    assert len(calls) == 2
+
+
+def test_redis_backend_round_trips_and_expires():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        backend = cache.RedisCacheBackend(client=fakeredis.FakeAsyncRedis(), prefix="test:")
+        now = time.time()
+        await backend.set("k", ({"results": [1, 2]}, now + 60, now + 120))
+        await backend.set("short", ("x", now, now + 0.05))
+        stored = await backend.get("k")
+        ttl = await backend.client.pttl("test:k")
+        await asyncio.sleep(0.1)
+        expired = await backend.get("short")
+        await backend.delete("k")
+        deleted = await backend.get("k")
+
+        swr = cache.SWRCache(backend, ttl=60)
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return ["shared"], True
+
+        values = await asyncio.gather(*(swr.get_or_load("q", loader) for _ in range(20)))
+        cached = await swr.get_or_load("q", loader)
+        await backend.close()
+        return stored, ttl, expired, deleted, values, cached, calls
+
+    stored, ttl, expired, deleted, values, cached, calls = asyncio.run(run())
+    assert stored[0] == {"results": [1, 2]}
+    assert 110_000 < ttl <= 120_000  # kept until the end of the stale window
+    assert expired is None and deleted is None
+    assert values == [["shared"]] * 20 and cached == ["shared"]
+    assert len(calls) == 1
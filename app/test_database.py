@@ -0,0 +1,82 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import database, startup
+from app.main import app
+
+
+def pool_settings(**env) -> str:
+    """DB_POOL_SIZE, DB_MAX_OVERFLOW and the async pool's size, as a fresh process sees them."""
+    code = (
+        "from app import database as d; "
+        "print(d.DB_POOL_SIZE, d.DB_MAX_OVERFLOW, d.async_engine.pool.size())"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_workers_split_db_max_connections():
+    base = {"DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10"}
+    assert pool_settings(**base, DB_MAX_CONNECTIONS="0", WEB_CONCURRENCY="4") == "5 10 5"
+    assert pool_settings(**base, DB_MAX_CONNECTIONS="40", WEB_CONCURRENCY="4") == "5 5 5"
+    assert pool_settings(**base, DB_MAX_CONNECTIONS="12", WEB_CONCURRENCY="4") == "3 0 3"
+    assert pool_settings(**base, DB_MAX_CONNECTIONS="12", WEB_CONCURRENCY="1") == "5 7 5"
+
+
+def test_pgbouncer_mode_disables_statement_caches(monkeypatch):
+    monkeypatch.setattr(database, "DB_PGBOUNCER", True)
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 1500)
+
+    args = database.async_connect_args()
+    assert args["statement_cache_size"] == 0
+    assert args["prepared_statement_cache_size"] == 0
+    names = {args["prepared_statement_name_func"]() for _ in range(3)}
+    assert len(names) == 3
+    # no startup parameters: PgBouncer doesn't pass them on
+    assert "server_settings" not in args and args["command_timeout"] == 1.5
+    assert database.sync_connect_args() == {}
+
+    async def run():
+        engine = create_async_engine(
+            database.async_database_url(database.DATABASE_URL), connect_args=args, poolclass=NullPool
+        )
+        try:
+            async with engine.connect() as conn:
+                return [await conn.scalar(text("SELECT CAST(:n AS int) + 1"), {"n": n}) for n in (1, 2)]
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == [2, 3]
+
+
+def test_the_server_opens_no_sync_connections(monkeypatch):
+    # why DB_MAX_CONNECTIONS only budgets the async pool
+    monkeypatch.setattr(startup, "WARMUP_UPSTREAMS", False)
+    checkouts = []
+
+    def checkout(*args):
+        checkouts.append(1)
+
+    event.listen(database.engine.pool, "checkout", checkout)
+    try:
+        with TestClient(app) as client:
+            # warm-up, the background loops and some requests
+            for _ in range(100):
+                if client.get("/ready").status_code == 200:
+                    break
+                time.sleep(0.05)
+            for path in ("/health", "/metrics", "/debug/tables"):
+                assert client.get(path).status_code == 200
+    finally:
+        event.remove(database.engine.pool, "checkout", checkout)
+    assert checkouts == []
@@ -0,0 +1,99 @@
+import uuid
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select, update
+
+from app import enrichment, models
+from app.database import AsyncSessionLocal, SessionLocal
+from app.main import app, create_access_token
+from bench import stub_providers
+
+Job = models.EnrichmentJob
+
+
+def run_jobs(client: TestClient, stub, external_ids):
+    """Run worker batches against `stub`, on the app's event loop, until
+    none of `external_ids` is due."""
+
+    async def work():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub)) as upstream:
+            for _ in range(10):
+                await enrichment.run_batch(upstream)
+                async with AsyncSessionLocal() as db:
+                    due = await db.scalar(
+                        select(Job.external_id)
+                        .where(Job.external_id.in_(external_ids), Job.run_after <= func.now())
+                        .limit(1)
+                    )
+                if due is None:
+                    return
+
+    client.portal.call(work)
+
+
+def test_new_items_are_enriched_in_the_background(monkeypatch):
+    # the test runs the worker's batches itself
+    monkeypatch.setattr(enrichment, "ENRICH_INTERVAL_SECONDS", 0)
+    stub = stub_providers.create_app(latency_ms=0, jitter_ms=0)
+
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"enrich-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    movie, book, failing, local = f"tmdb-e{tag}", f"gb-e{tag}", f"tmdb-f{tag}", f"enrich-{tag}"
+
+    try:
+        with TestClient(app) as client:
+            client.post("/user/items", json={"external_id": movie, "title": "M", "type": "movie"}, headers=headers)
+            client.post("/user/items/bulk", headers=headers, json=[
+                {"external_id": book, "title": "B", "type": "book"},
+                {"external_id": movie, "title": "M", "type": "movie"},
+                {"external_id": local, "title": "L", "type": "movie"},
+            ])
+            etag = client.get("/user/items", headers=headers).headers["etag"]
+
+            # one job per new provider item; nothing for ids no provider knows
+            queued = db.scalars(select(Job.external_id).where(Job.external_id.in_([movie, book, local])))
+            assert sorted(queued) == [book, movie]
+
+            run_jobs(client, stub, [movie, book])
+
+            items = {
+                item.external_id: item
+                for item in db.scalars(select(models.Item).where(models.Item.external_id.in_([movie, book])))
+            }
+            assert items[movie].description == f"Details of stub movie e{tag}."
+            assert items[movie].poster_url.endswith(f"/e{tag}.jpg")
+            assert items[book].description == f"Details of stub book e{tag}."
+            assert not db.scalars(select(Job).where(Job.external_id.in_([movie, book]))).all()
+
+            # the lists showing them changed
+            response = client.get("/user/items", headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 200
+
+            # a failing provider leaves the job for a later, backed-off attempt
+            stub.state.faults["error_rate"] = 1.0
+            client.post("/user/items", json={"external_id": failing, "title": "F", "type": "movie"}, headers=headers)
+            run_jobs(client, stub, [failing])
+            job = db.scalar(select(Job).where(Job.external_id == failing))
+            assert job.attempts == 1
+            assert "503" in job.last_error
+
+            # its last attempt fails too: the job is dropped, the item kept
+            monkeypatch.setattr(enrichment, "ENRICH_MAX_ATTEMPTS", 2)
+            db.execute(update(Job).where(Job.external_id == failing).values(run_after=func.now()))
+            db.commit()
+            run_jobs(client, stub, [failing])
+            db.expire_all()
+            assert db.scalar(select(Job).where(Job.external_id == failing)) is None
+            assert db.scalar(select(models.Item.id).where(models.Item.external_id == failing)) is not None
+    finally:
+        db.rollback()
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.in_([movie, book, failing, local])))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
@@ -0,0 +1,49 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import admission, models
+from app.database import SessionLocal
+from app.main import app, create_access_token
+
+
+def test_revalidating_a_compressed_list_keeps_its_etag(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_RATE_LIMITS", False)
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"etag-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+    try:
+        with TestClient(app) as client:
+            # big enough to be compressed
+            records = [{"external_id": f"etag-{tag}-{n}", "title": f"Title {n}", "type": "book"} for n in range(30)]
+            client.post("/user/items/bulk", json=records, headers=auth)
+
+            for coding in ("gzip", "br"):
+                headers = {**auth, "Accept-Encoding": coding}
+                first = client.get("/user/items", headers=headers)
+                assert first.headers["content-encoding"] == coding
+                etag = first.headers["etag"]
+                assert etag.endswith(f'-{coding}"')
+
+                again = client.get("/user/items", headers={**headers, "If-None-Match": etag})
+                assert again.status_code == 304
+                assert again.headers["etag"] == etag
+
+                weak = client.get("/user/items", headers={**headers, "If-None-Match": f'"other", W/{etag}'})
+                assert weak.status_code == 304 and weak.headers["etag"] == etag
+
+            # the uncompressed copy revalidates under its own ETag
+            plain = client.get("/user/items", headers={**auth, "Accept-Encoding": "identity"})
+            again = client.get("/user/items", headers={**auth, "If-None-Match": plain.headers["etag"]})
+            assert again.status_code == 304 and again.headers["etag"] == plain.headers["etag"]
+    finally:
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.like(f"etag-{tag}-%")))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
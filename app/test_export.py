@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import admission, models, streaming
+from app.database import SessionLocal
+import app.main as main
+from app.main import EXPORT_FIELDS, app, create_access_token
+
+ROWS = 1200
+
+
+def test_export_streams_large_lists_as_ndjson_and_csv(monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_CHUNK_ROWS", 100)
+    # five exports and an import from one user in a few seconds
+    monkeypatch.setattr(admission, "ADMISSION_RATE_LIMITS", False)
+
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"export-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {
+        "Authorization": f"Bearer {create_access_token({'sub': user.username})}",
+        "Accept-Encoding": "identity",
+    }
+    columns = [key for key, _ in EXPORT_FIELDS]
+
+    def export(client, format):
+        response = client.get("/user/items/export", params={"format": format}, headers=headers)
+        assert response.status_code == 200
+        return response.text
+
+    def chunks(client, format):
+        """Chunks of the export's generator; the test client buffers responses."""
+        stmt = main.user_items_select().where(models.UserItem.user_id == user.id)
+
+        async def collect():
+            return [c async for c in streaming.stream_rows(stmt, format, main.export_row_to_out, fields=columns)]
+
+        return client.portal.call(collect)
+
+    try:
+        with TestClient(app) as client:
+            # an empty list: no NDJSON lines, but a CSV header
+            assert export(client, "ndjson") == ""
+            body = export(client, "csv")
+            assert body.splitlines() == [",".join(columns)]
+
+            records = [
+                {"external_id": f"export-{tag}-{n}", "title": f"Title, {n}", "type": "book"}
+                for n in range(ROWS)
+            ]
+            assert client.post("/user/items/bulk", json=records, headers=headers).json()["created"] == ROWS
+
+            lines = [json.loads(line) for line in export(client, "ndjson").splitlines()]
+            assert len(chunks(client, "ndjson")) == ROWS // 100
+            assert len(lines) == ROWS
+            assert list(lines[0]) == columns
+            assert [line["external_id"] for line in lines] == [r["external_id"] for r in records]
+
+            rows = list(csv.DictReader(io.StringIO(export(client, "csv"))))
+            assert len(chunks(client, "csv")) == ROWS // 100
+            assert len(rows) == ROWS  # the header is written once
+            assert rows[7]["title"] == "Title, 7"
+            assert rows[7]["status"] == "plan"
+    finally:
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.like(f"export-{tag}-%")))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
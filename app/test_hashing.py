@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import delete, select
+
+from app import admission, hashing, models
+from app.database import SessionLocal
+from app.main import app
+
+
+def blocking(release: threading.Event, running: list):
+    """A stand-in for bcrypt that holds its thread until `release` is set."""
+
+    def fn():
+        running.append(threading.current_thread().name)
+        release.wait(5)
+        return "done"
+
+    return fn
+
+
+def test_a_full_queue_is_rejected_at_once():
+    async def run():
+        hasher = hashing.PasswordHasher(workers=1, max_pending=2, queue_timeout=5)
+        release, running = threading.Event(), []
+        busy = [asyncio.ensure_future(hasher._run(blocking(release, running))) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        with pytest.raises(hashing.HashingUnavailable):
+            await hasher._run(blocking(release, running))
+        waited = time.perf_counter() - start
+        release.set()
+        return await asyncio.gather(*busy), hasher, waited
+
+    results, hasher, waited = asyncio.run(run())
+    assert results == ["done", "done"]
+    assert waited < 0.5
+    assert (hasher.rejected, hasher.pending) == (1, 0)
+
+
+def test_a_request_waiting_past_its_deadline_is_rejected():
+    async def run():
+        hasher = hashing.PasswordHasher(workers=1, max_pending=10, queue_timeout=0.1)
+        release, running = threading.Event(), []
+        busy = asyncio.ensure_future(hasher._run(blocking(release, running)))
+        await asyncio.sleep(0.05)
+        with pytest.raises(hashing.HashingUnavailable):
+            await hasher._run(blocking(release, running))
+        release.set()
+        return await busy, hasher
+
+    result, hasher = asyncio.run(run())
+    assert result == "done"
+    assert (hasher.rejected, hasher.pending) == (1, 0)
+
+
+def test_hashing_runs_on_a_bounded_pool_of_its_own():
+    async def run():
+        hasher = hashing.PasswordHasher(workers=2, max_pending=50, queue_timeout=5)
+        release, running = threading.Event(), []
+        jobs = [asyncio.ensure_future(hasher._run(blocking(release, running))) for _ in range(20)]
+        await asyncio.sleep(0.1)
+        at_once = len(running)
+        release.set()
+        await asyncio.gather(*jobs)
+        return at_once, running
+
+    at_once, running = asyncio.run(run())
+    assert at_once == 2
+    assert len(running) == 20
+    assert len(set(running)) <= 2 and all(name.startswith("bcrypt") for name in running)
+
+
+def test_login_answers_503_when_hashing_is_saturated(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_RATE_LIMITS", False)
+    monkeypatch.setattr(hashing, "hasher", hashing.PasswordHasher(workers=1, max_pending=0, queue_timeout=1))
+    db = SessionLocal()
+    user = models.User(username=f"hash-{uuid.uuid4().hex}", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    try:
+        with TestClient(app) as client:
+            response = client.post("/auth/login", data={"username": user.username, "password": "pw"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        assert hashing.hasher.rejected == 1
+    finally:
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
+
+
+def test_login_rehashes_passwords_stored_at_another_cost(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_RATE_LIMITS", False)
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw")
+    db = SessionLocal()
+    user = models.User(username=f"hash-{uuid.uuid4().hex}", hashed_password=old_hash)
+    db.add(user)
+    db.commit()
+
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(hashing, "BCRYPT_ROUNDS", 5)
+            hashing.password_context.cache_clear()
+            with TestClient(app) as client:
+                first = client.post("/auth/login", data={"username": user.username, "password": "pw"})
+                stored = db.scalar(select(models.User.hashed_password).where(models.User.id == user.id))
+                again = client.post("/auth/login", data={"username": user.username, "password": "pw"})
+                wrong = client.post("/auth/login", data={"username": user.username, "password": "nope"})
+
+        assert first.status_code == again.status_code == 200
+        assert wrong.status_code == 401
+        assert stored.startswith("$2b$05$") and stored != old_hash
+    finally:
+        hashing.password_context.cache_clear()
+        db.rollback()
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
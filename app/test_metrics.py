@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import subprocess
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+
+# name, optional {label="value",...}, value
+SAMPLE = re.compile(r'^([a-zA-Z_:][\w:]*)(\{(\w+="(\\.|[^"\\])*",?)*\})? (-?[\d.e+-]+|\+Inf|NaN)$')
+
+
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    requests = metrics.Counter("requests_total", "Requests.", ("route", "status"))
+    latency = metrics.Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    in_use = metrics.GaugeFunc("in_use", "In use.", lambda: 2)
+    return requests, latency, in_use
+
+
+def test_metrics_endpoint_speaks_the_text_exposition_format():
+    with TestClient(app) as client:
+        client.get("/health")
+        response = client.get("/metrics")
+
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    lines = response.text.splitlines()
+    types = {}
+    for line in lines:
+        if line.startswith("# TYPE "):
+            _, _, name, type = line.split()
+            types[name] = type
+        elif not line.startswith("# HELP "):
+            match = SAMPLE.match(line)
+            assert match, line
+            # every sample belongs to a metric declared before it
+            name = match.group(1)
+            base = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+            assert base in types, line
+    assert any(line.startswith('http_request_duration_seconds_bucket{route="/health",method="GET",status="200",le="+Inf"}') for line in lines)
+
+
+def test_counters_and_histograms_render_with_escaped_labels(monkeypatch):
+    requests, latency, _ = fresh_registry(monkeypatch)
+    requests.inc(("/a\"b", 200))
+    requests.inc(("/a\"b", 200), 2)
+    latency.observe(0.05, ("/a",))
+    latency.observe(0.5, ("/a",))
+    latency.observe(5, ("/a",))
+
+    assert metrics.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a\\"b",status="200"} 3',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.55',
+        'latency_seconds_count{route="/a"} 3',
+        "# HELP in_use In use.",
+        "# TYPE in_use gauge",
+        "in_use 2",
+    ]
+
+
+def test_workers_add_up_and_exited_workers_keep_their_counts(monkeypatch, tmp_path):
+    requests, latency, _ = fresh_registry(monkeypatch)
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    requests.inc(("/a", 200))
+    latency.observe(0.05, ("/a",))
+
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    worker = {
+        "requests_total": [[["/a", 200], 4], [["/b", 500], 1]],
+        "latency_seconds": [[["/a"], [[1, 1, 0], 0.6]]],
+        "in_use": [[[], 3]],
+    }
+    # another live worker (this process's parent stands in for it), and a recycled one
+    for pid in (os.getppid(), exited.pid):
+        (tmp_path / f"{pid}.json").write_text(json.dumps(worker))
+
+    def scrape():
+        return {line for line in metrics.render().splitlines() if not line.startswith("#")}
+
+    first = scrape()
+    assert 'requests_total{route="/a",status="200"} 9' in first
+    assert 'requests_total{route="/b",status="500"} 2' in first
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 3' in first
+    assert 'latency_seconds_count{route="/a"} 5' in first
+    assert "in_use 5" in first  # gauges of exited workers are dropped
+
+    # the exited worker was folded once and is not counted twice
+    assert not (tmp_path / f"{exited.pid}.json").exists()
+    assert (tmp_path / metrics.EXITED_FILE).exists()
+    assert scrape() == first
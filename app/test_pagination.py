@@ -0,0 +1,119 @@
+import base64
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import models, pagination
+from app.database import SessionLocal
+from app.main import app, create_access_token
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def walk(client, headers, **params):
+    """Every page of /user/items for `params`, as one list of names."""
+    names, cursor = [], None
+    for _ in range(20):
+        query = {"paginate": "true", "limit": 2, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/user/items", params=query, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 2
+        names += [item["name"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return names
+    raise AssertionError("pagination did not end")
+
+
+def test_filters_sort_keys_and_page_walking():
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"pages-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    # name, type, status, rating
+    seeds = [
+        ("Delta", "movie", "watched", 5),
+        ("alpha", "book", "plan", None),
+        ("Charlie", "movie", "plan", 3),
+        ("bravo", "book", "watched", 3),
+        ("Echo", "movie", "watched", None),
+    ]
+    external_ids = [f"pages-{tag}-{n}" for n in range(len(seeds))]
+
+    try:
+        with TestClient(app) as client:
+            for external_id, (name, type, status, rating) in zip(external_ids, seeds):
+                entry = client.post(
+                    "/user/items", json={"external_id": external_id, "title": name, "type": type}, headers=headers
+                ).json()
+                client.put(f"/user/items/{entry['id']}", json={"status": status, "rating": rating}, headers=headers)
+
+            # recent: newest first, across pages of two
+            assert walk(client, headers) == ["Echo", "bravo", "Charlie", "alpha", "Delta"]
+            assert walk(client, headers, order="asc") == ["Delta", "alpha", "Charlie", "bravo", "Echo"]
+            # rating: unrated last, ties broken by id in the same direction
+            assert walk(client, headers, sort="rating") == ["Delta", "bravo", "Charlie", "Echo", "alpha"]
+            # name: byte order of the stored names, as Postgres compares them here
+            names = walk(client, headers, sort="name")
+            assert sorted(names) == sorted(name for name, *_ in seeds) and len(names) == 5
+            assert walk(client, headers, sort="name", order="desc") == names[::-1]
+
+            assert walk(client, headers, status="watched") == ["Echo", "bravo", "Delta"]
+            assert walk(client, headers, type="book", sort="name") == [n for n in names if n in ("alpha", "bravo")]
+            assert walk(client, headers, min_rating=3, max_rating=4) == ["bravo", "Charlie"]
+
+            # unpaginated lists take the same sort
+            plain = client.get("/user/items", params={"sort": "rating"}, headers=headers).json()
+            assert [item["name"] for item in plain] == ["Delta", "bravo", "Charlie", "Echo", "alpha"]
+    finally:
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.in_(external_ids)))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
+
+
+def test_malformed_cursors_are_rejected_with_400():
+    db = SessionLocal()
+    user = models.User(username=f"pages-{uuid.uuid4().hex}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    cursors = {
+        "recent": [
+            raw_cursor(["recent", "desc", "abc", 1]),
+            raw_cursor(["recent", "desc", 5, "x"]),
+            raw_cursor(["recent", "desc", [1], {"a": 1}]),
+            raw_cursor(["recent", "desc", True, 1]),
+            raw_cursor(["recent", "desc", 5]),
+            raw_cursor({"a": 1}),
+            "not base64!",
+            pagination.encode_cursor("rating", "desc", 3, 1),  # another sort's cursor
+        ],
+        "rating": [raw_cursor(["rating", "desc", None, 1]), raw_cursor(["rating", "desc", 2.5, 1])],
+        "name": [raw_cursor(["name", "asc", 7, 1]), raw_cursor(["name", "asc", None, 1])],
+    }
+
+    try:
+        with TestClient(app) as client:
+            for sort, bad in cursors.items():
+                for cursor in bad:
+                    response = client.get(
+                        "/user/items",
+                        params={"paginate": "true", "sort": sort, "cursor": cursor},
+                        headers=headers,
+                    )
+                    assert response.status_code == 400, (sort, cursor, response.text)
+    finally:
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import os
+import uuid
+from io import BytesIO
+
+import httpx
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import delete
+
+from app import models, posters, providers, startup
+from app.database import SessionLocal
+from app.main import app
+
+
+def make_png(width: int = 100, height: int = 150) -> bytes:
+    out = BytesIO()
+    # noise, so the image is well past the compression threshold
+    Image.frombytes("RGB", (width, height), os.urandom(width * height * 3)).save(out, "PNG")
+    return out.getvalue()
+
+
+def image_source(images: dict, calls: list) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        return httpx.Response(200, content=images[str(request.url)], headers={"content-type": "image/png"})
+
+    return httpx.MockTransport(handler)
+
+
+def test_poster_proxy_fetches_once_and_serves_from_disk(monkeypatch, tmp_path):
+    tag = uuid.uuid4().hex
+    url = f"https://image.tmdb.org/t/p/w500/{tag}.png"
+    png = make_png()
+    calls = []
+    monkeypatch.setattr(providers, "create_http_client", lambda: httpx.AsyncClient(
+        transport=image_source({url: png}, calls)
+    ))
+    monkeypatch.setattr(posters, "PosterStore", functools.partial(posters.PosterStore, str(tmp_path)))
+    monkeypatch.setattr(posters, "POSTER_THUMBNAIL_WIDTHS", (40,))
+    # only the proxy's own fetches reach the image source
+    monkeypatch.setattr(startup, "WARMUP_UPSTREAMS", False)
+
+    db = SessionLocal()
+    item = models.Item(external_id=f"poster-{tag}", name="Poster", type="movie", poster_url=url)
+    internal = models.Item(
+        external_id=f"poster-{tag}-internal", name="Internal", type="movie",
+        poster_url="http://169.254.169.254/latest/meta-data",
+    )
+    db.add_all([item, internal])
+    db.commit()
+
+    try:
+        with TestClient(app) as client:
+            first = client.get(f"/posters/{item.id}", headers={"Accept-Encoding": "gzip, br"})
+            assert first.status_code == 200
+            assert first.content == png
+            assert first.headers["content-type"] == "image/png"
+            assert "content-encoding" not in first.headers
+            assert first.headers["cache-control"].startswith("public")
+
+            second = client.get(f"/posters/{item.id}")
+            assert second.content == png
+            assert second.headers["etag"] == first.headers["etag"]
+            assert len(calls) == 1
+
+            cached = client.get(f"/posters/{item.id}", headers={"If-None-Match": first.headers["etag"]})
+            assert cached.status_code == 304
+
+            # thumbnails were made at ingest, so no second fetch
+            thumbnail = client.get(f"/posters/{item.id}?w=40")
+            assert Image.open(BytesIO(thumbnail.content)).width == 40
+            assert len(calls) == 1
+
+            assert client.get(f"/posters/{item.id}?w=41").status_code == 400
+            assert client.get(f"/posters/{internal.id}").status_code == 404
+            assert len(calls) == 1
+    finally:
+        db.execute(delete(models.Item).where(models.Item.id.in_([item.id, internal.id])))
+        db.commit()
+        db.close()
+
+
+def test_poster_store_evicts_least_recently_served(tmp_path):
+    images = {f"https://image.tmdb.org/{n}.png": make_png() for n in range(3)}
+    first, second, third = images
+    calls = []
+    store = posters.PosterStore(str(tmp_path), max_bytes=sum(map(len, images.values())) - 1)
+    store.load()
+
+    async def serve(*urls):
+        async with httpx.AsyncClient(transport=image_source(images, calls)) as client:
+            return [await store.get(client, url) for url in urls]
+
+    (evicted,) = asyncio.run(serve(first))
+    asyncio.run(serve(second, first, third))
+    # `second` was served least recently, so it made room for `third`
+    assert len(calls) == 3
+    assert evicted.path.exists()
+    assert store.total_bytes <= store.max_bytes
+
+    asyncio.run(serve(second))
+    assert calls[-1] == second
+
+
+def test_evicted_blobs_take_their_refs_with_them(tmp_path):
+    images = {f"https://image.tmdb.org/{n}.png": make_png() for n in range(6)}
+    calls = []
+    store = posters.PosterStore(str(tmp_path), max_bytes=2 * max(map(len, images.values())))
+    store.load()
+    refs = lambda: sorted(path.name for path in (tmp_path / "refs").glob("*/*"))  # noqa: E731
+    blobs = lambda: sorted(path.name for path in (tmp_path / "blobs").glob("*/*"))  # noqa: E731
+
+    async def serve(*urls):
+        async with httpx.AsyncClient(transport=image_source(images, calls)) as client:
+            return [await store.get(client, url) for url in urls]
+
+    asyncio.run(serve(*images))
+    assert store.evictions == 4
+    assert len(blobs()) == 2
+    assert refs() == sorted(store.ref_key(url) for url in list(images)[-2:])
+
+    # a ref left dangling (its blob deleted by another worker) is removed
+    # at the next start...
+    older, newest = list(images)[-2:]
+    store.blob_path(store._refs[store.ref_key(newest)][0]).unlink()
+    restarted = posters.PosterStore(str(tmp_path), max_bytes=store.max_bytes)
+    restarted.load()
+    assert refs() == [store.ref_key(older)]
+
+    # ...or when looked up
+    restarted.blob_path(restarted._refs[store.ref_key(older)][0]).unlink()
+    assert asyncio.run(restarted._lookup(older, None)) is None
+    assert refs() == []
@@ -0,0 +1,127 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import catalog, models, providers, resilience, startup
+from app.database import SessionLocal
+from app.main import app
+from bench import stub_providers
+
+
+def upstreams(tag: str, books_status: int = 200, books_delay: float = 0.0):
+    """TMDb answering one movie; Google Books answering `books_status` after `books_delay`."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/search/movie"):
+            calls.append("tmdb")
+            return httpx.Response(200, json={"results": [{"id": f"m{tag}", "title": "Dune", "overview": "Sand."}]})
+        calls.append("google_books")
+        await asyncio.sleep(books_delay)
+        return httpx.Response(books_status, json={"items": [{"id": f"b{tag}", "volumeInfo": {"title": "Dune"}}]})
+
+    return httpx.MockTransport(handler), calls
+
+
+def fresh_guards(monkeypatch):
+    monkeypatch.setattr(providers, "PROVIDER_RETRIES", 0)
+    for provider in providers.PROVIDERS:
+        monkeypatch.setattr(provider, "breaker", resilience.CircuitBreaker(provider.name, 5, reset_seconds=30))
+
+
+def test_breaker_fails_fast_while_provider_is_down_and_recovers(monkeypatch):
+    stub = stub_providers.create_app(latency_ms=0, jitter_ms=0, error_rate=1.0)
+    tmdb = providers.PROVIDERS[0]
+    monkeypatch.setattr(tmdb, "breaker", resilience.CircuitBreaker("tmdb", 2, reset_seconds=0.2))
+    monkeypatch.setattr(providers, "PROVIDER_RETRIES", 1)
+    monkeypatch.setattr(providers, "PROVIDER_RETRY_BACKOFF_SECONDS", 0)
+
+    async def search():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub)) as client:
+            return await providers.search_all(client, "dune", "movie")
+
+    # two failed searches, each retried once, open the circuit
+    for _ in range(2):
+        assert asyncio.run(search()) == ([], False)
+    assert stub.state.requests == 4
+    assert tmdb.breaker.state == "open"
+
+    # open: skipped without a call
+    start = time.perf_counter()
+    assert asyncio.run(search()) == ([], False)
+    assert time.perf_counter() - start < 0.1
+    assert stub.state.requests == 4
+
+    # after reset_seconds one probe goes through, and closes it on success
+    stub.state.faults["error_rate"] = 0
+    time.sleep(0.25)
+    results, complete = asyncio.run(search())
+    assert complete and len(results) == 10
+    assert tmdb.breaker.state == "closed"
+
+
+def test_hedge_returns_the_faster_of_two_calls():
+    delays = [1.0, 0.0]
+
+    async def call():
+        await asyncio.sleep(delays.pop(0))
+        return "done"
+
+    async def hedged():
+        start = time.perf_counter()
+        result = await resilience.hedge(call, delay=0.05)
+        return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(hedged())
+    assert result == "done"
+    assert elapsed < 0.5
+
+
+def test_a_failing_or_slow_provider_is_left_out_of_the_results(monkeypatch):
+    fresh_guards(monkeypatch)
+    monkeypatch.setattr(providers.PROVIDERS[1], "timeout", 0.1)
+    tag = uuid.uuid4().hex
+
+    async def search(**behaviour):
+        transport, _ = upstreams(tag, **behaviour)
+        async with httpx.AsyncClient(transport=transport) as client:
+            start = time.perf_counter()
+            results, complete = await providers.search_all(client, "dune")
+            return [r["externalId"] for r in results], complete, time.perf_counter() - start
+
+    assert asyncio.run(search())[:2] == ([f"tmdb-m{tag}", f"gb-b{tag}"], True)
+    assert asyncio.run(search(books_status=500))[:2] == ([f"tmdb-m{tag}"], False)
+    # a provider past its time budget doesn't hold up the others
+    ids, complete, elapsed = asyncio.run(search(books_delay=1.0))
+    assert (ids, complete) == ([f"tmdb-m{tag}"], False)
+    assert elapsed < 0.5
+
+
+def test_search_answers_partial_results_and_does_not_cache_them(monkeypatch):
+    fresh_guards(monkeypatch)
+    monkeypatch.setattr(startup, "WARMUP_UPSTREAMS", False)
+    tag = uuid.uuid4().hex
+    transport, calls = upstreams(tag, books_status=503)
+    monkeypatch.setattr(providers, "create_http_client", lambda: httpx.AsyncClient(transport=transport))
+    params = {"query": f"dune {tag}", "source": "upstream"}
+
+    try:
+        with TestClient(app) as client:
+            responses = [client.get("/search", params=params) for _ in range(2)]
+            # let the catalog write-back land before removing its rows
+            while catalog._pending_writes:
+                time.sleep(0.05)
+
+        assert [r.status_code for r in responses] == [200, 200]
+        assert [r["externalId"] for r in responses[0].json()] == [f"tmdb-m{tag}"]
+        # incomplete, so not cached: the second search asked both again
+        assert calls.count("tmdb") == calls.count("google_books") == 2
+    finally:
+        db = SessionLocal()
+        db.execute(delete(models.Item).where(models.Item.external_id.in_([f"tmdb-m{tag}", f"gb-b{tag}"])))
+        db.commit()
+        db.close()
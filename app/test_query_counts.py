@@ -0,0 +1,117 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event
+
+from app import etags, models, sqltrace
+from app.database import SessionLocal, async_engine
+from app.main import app, create_access_token
+
+LIST_SIZE = 50
+
+
+def capture_statements(fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        # only statements run by requests, not by background workers
+        if sqltrace.current_request.get() is not None:
+            statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def seed_user_with_items(db):
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"qc-{tag}", hashed_password="x")
+    db.add(user)
+    db.flush()
+    items = [
+        models.Item(external_id=f"qc-{tag}-{i}", name=f"Title {i}", type="movie")
+        for i in range(LIST_SIZE)
+    ]
+    db.add_all(items)
+    db.flush()
+    user_items = [
+        models.UserItem(user_id=user.id, item_id=item.id, status="plan")
+        for item in items
+    ]
+    db.add_all(user_items)
+    db.commit()
+    return user, items, user_items
+
+
+def cleanup(db, user, items):
+    db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+    db.execute(delete(models.Item).where(models.Item.id.in_([i.id for i in items])))
+    db.execute(delete(models.User).where(models.User.id == user.id))
+    db.commit()
+
+
+def test_user_item_endpoints_query_count(monkeypatch):
+    # keep the list version cached for the whole test, however slow the run
+    monkeypatch.setattr(etags.list_versions, "ttl", 60)
+    # fail on N+1 patterns instead of logging them
+    monkeypatch.setattr(sqltrace, "SQL_TRACE_STRICT", True)
+    db = SessionLocal()
+    user, items, user_items = seed_user_with_items(db)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    external_id = items[0].external_id
+    user_item_id = user_items[0].id
+
+    try:
+        with TestClient(app) as client:
+            # first authenticated request loads the principal
+            statements = capture_statements(
+                lambda: client.get("/auth/me", headers=headers)
+            )
+            assert len(statements) == 1
+
+            # principal is cached: one joined SELECT, independent of list size
+            statements = capture_statements(
+                lambda: client.get("/user/items", headers=headers)
+            )
+            assert len(statements) == 1
+
+            response = client.get("/user/items", headers=headers)
+            assert 'desc="1 queries"' in response.headers["server-timing"]
+
+            # unchanged list: 304 from the cached list version, no queries
+            etag = response.headers["etag"]
+            response = None
+
+            def conditional_get():
+                nonlocal response
+                response = client.get("/user/items", headers={**headers, "If-None-Match": etag})
+
+            statements = capture_statements(conditional_get)
+            assert response.status_code == 304
+            assert len(statements) == 0
+
+            statements = capture_statements(
+                lambda: client.get(f"/items/{external_id}", headers=headers)
+            )
+            assert len(statements) == 1
+
+            # list version bump + joined SELECT ... FOR UPDATE + UPDATE
+            # + user_stats upsert
+            statements = capture_statements(
+                lambda: client.put(
+                    f"/user/items/{user_item_id}",
+                    json={"status": "watched", "rating": 5},
+                    headers=headers,
+                )
+            )
+            assert len(statements) == 4
+
+            response = client.get("/user/items", headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+    finally:
+        cleanup(db, user, items)
+        db.close()
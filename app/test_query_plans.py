@@ -0,0 +1,135 @@
+"""
+Query plan regression suite.
+
+Seeds a large fixture inside a transaction, runs EXPLAIN for the query
+behind each endpoint and fails if any of them falls back to a
+sequential scan. Everything is rolled back afterwards.
+"""
+import json
+
+import pytest
+from sqlalchemy import select, text
+
+from app import catalog, models, pagination, sync
+from app.database import engine
+from app.main import user_items_select
+
+USERS = 2_000
+ITEMS = 50_000
+ITEMS_PER_USER = 40
+TABLES = {"users", "items", "user_items"}
+
+USER_ID = 1_000_000_042
+USERNAME = "plan-user-42"
+
+
+def seed(conn):
+    conn.execute(text("""
+        INSERT INTO users (id, username, hashed_password)
+        SELECT 1000000000 + g, 'plan-user-' || g, 'x'
+        FROM generate_series(1, :users) g
+    """), {"users": USERS})
+    conn.execute(text("""
+        INSERT INTO items (id, external_id, name, type)
+        SELECT 1000000000 + g, 'plan-' || g, 'Title ' || g,
+               CASE WHEN g % 2 = 0 THEN 'movie' ELSE 'book' END
+        FROM generate_series(1, :items) g
+    """), {"items": ITEMS})
+    conn.execute(text("""
+        INSERT INTO user_items (user_id, item_id, status, rating)
+        SELECT 1000000000 + u,
+               1000000000 + ((u * 7919 + i * 104729) % :items) + 1,
+               (ARRAY['plan', 'reading', 'watched'])[1 + i % 3],
+               NULLIF(i % 11, 10)
+        FROM generate_series(1, :users) u, generate_series(1, :per_user) i
+        ON CONFLICT DO NOTHING
+    """), {"users": USERS, "items": ITEMS, "per_user": ITEMS_PER_USER})
+    conn.execute(text("ANALYZE users"))
+    conn.execute(text("ANALYZE items"))
+    conn.execute(text("ANALYZE user_items"))
+
+
+def list_query(**where):
+    stmt = user_items_select().where(models.UserItem.user_id == USER_ID)
+    if "status" in where:
+        stmt = stmt.where(models.UserItem.status == where["status"])
+    return stmt
+
+
+QUERIES = {
+    "current_user": select(models.User.id, models.User.username)
+        .where(models.User.username == USERNAME),
+    "list_user_items": list_query(),
+    "list_user_items_by_status": list_query(status="watched"),
+    "list_user_items_page": pagination.apply_sort(list_query(), "recent", "desc").limit(51),
+    "list_user_items_next_page": pagination.apply_sort(
+        list_query(), "recent", "desc",
+        pagination.encode_cursor("recent", "desc", 2**31 - 1, 2**31 - 1),
+    ).limit(51),
+    "list_user_items_by_rating": pagination.apply_sort(list_query(), "rating", "desc").limit(51),
+    "export_user_items": list_query().order_by(models.UserItem.id),
+    "get_item_by_external_id": user_items_select()
+        .where(models.UserItem.user_id == USER_ID, models.Item.external_id == "plan-123")
+        .limit(1),
+    "user_item_changes": sync.changes_query(USER_ID, (1, 123)).limit(501),
+    "update_or_delete_user_item": select(models.UserItem)
+        .join(models.UserItem.item)
+        .where(models.UserItem.id == 123, models.UserItem.user_id == USER_ID),
+}
+
+
+def explain(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + compiled.string, compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def seq_scans(plan):
+    """Tables that a JSON EXPLAIN plan reads with a sequential scan."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def index_names(plan):
+    found = [plan["Index Name"]] if "Index Name" in plan else []
+    for child in plan.get("Plans", []):
+        found.extend(index_names(child))
+    return found
+
+
+@pytest.fixture(scope="module")
+def seeded_connection():
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            seed(conn)
+            yield conn
+        finally:
+            trans.rollback()
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_query_uses_indexes(seeded_connection, name):
+    plan = explain(seeded_connection, QUERIES[name])
+    assert seq_scans(plan) == [], json.dumps(plan, indent=2)
+
+
+def test_search_local_can_use_the_gin_index(seeded_connection):
+    # Row estimates for prefix tsqueries are coarse (about 1000 rows here
+    # whatever the term), so on this fixture the planner may fairly pick a
+    # seq scan. Check instead that the GIN index serves the query at all.
+    savepoint = seeded_connection.begin_nested()
+    try:
+        seeded_connection.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = explain(seeded_connection, catalog.search_local_query(catalog.to_tsquery_text("4242")))
+    finally:
+        savepoint.rollback()
+
+    assert "ix_items_search_vector" in index_names(plan), json.dumps(plan, indent=2)
+    assert seq_scans(plan) == [], json.dumps(plan, indent=2)
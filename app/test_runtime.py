@@ -0,0 +1,20 @@
+from app import runtime
+from app.database import pool_limits
+
+
+def test_cpu_limit_follows_the_cgroup_quota(tmp_path, monkeypatch):
+    cpu_max = tmp_path / "cpu.max"
+    monkeypatch.setattr(runtime, "CGROUP_V2_CPU_MAX", str(cpu_max))
+    monkeypatch.setattr(runtime.os, "sched_getaffinity", lambda pid: set(range(16)))
+
+    cpu_max.write_text("150000 100000\n")
+    assert runtime.cpu_limit() == 2  # 1.5 CPUs round up
+    cpu_max.write_text("max 100000\n")
+    assert runtime.cpu_limit() == 16
+
+
+def test_pools_share_the_connection_budget():
+    assert pool_limits(5, 10, max_connections=0, workers=4) == (5, 10)
+    assert pool_limits(5, 10, max_connections=40, workers=4) == (5, 5)
+    assert pool_limits(5, 10, max_connections=9, workers=4) == (2, 0)
+    assert pool_limits(5, 10, max_connections=2, workers=4) == (1, 0)
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app import models, sqltrace
+from app.database import AsyncSessionLocal, async_engine
+from app.main import app  # noqa: F401  (instruments the async engine)
+
+
+def run_lookups(count: int):
+    async def lookups():
+        try:
+            async with AsyncSessionLocal() as db:
+                for user_id in range(count):
+                    await db.execute(select(models.User.id).where(models.User.id == user_id))
+        finally:
+            # pooled connections are bound to this event loop
+            await async_engine.dispose()
+
+    asyncio.run(lookups())
+
+
+def test_strict_mode_raises_on_repeated_statement(monkeypatch):
+    monkeypatch.setattr(sqltrace, "SQL_TRACE_STRICT", True)
+
+    with sqltrace.track() as stats:
+        run_lookups(sqltrace.SQL_TRACE_REPEAT_THRESHOLD - 1)
+    assert stats.queries == sqltrace.SQL_TRACE_REPEAT_THRESHOLD - 1
+
+    with sqltrace.track():
+        with pytest.raises(sqltrace.NPlusOneDetected):
+            run_lookups(sqltrace.SQL_TRACE_REPEAT_THRESHOLD)
+
+
+def test_expected_repeats_are_allowed(monkeypatch):
+    monkeypatch.setattr(sqltrace, "SQL_TRACE_STRICT", True)
+
+    with sqltrace.track() as stats:
+        sqltrace.expect_repeats()
+        run_lookups(sqltrace.SQL_TRACE_REPEAT_THRESHOLD + 1)
+    assert stats.most_repeated()[1] == sqltrace.SQL_TRACE_REPEAT_THRESHOLD + 1
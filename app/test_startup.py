@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app import enrichment, migrations, startup
+from app.database import DATABASE_URL
+from app.main import app
+
+
+def test_ready_turns_green_after_warm_up(monkeypatch):
+    monkeypatch.setattr(startup, "WARMUP_UPSTREAMS", False)
+    monkeypatch.setattr(startup, "timings", startup.StartupTimer())
+    # an import in a gunicorn master long before this worker was forked
+    startup.timings.record("import", 3600)
+
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        for _ in range(100):
+            response = client.get("/ready")
+            if response.status_code == 200:
+                break
+            assert response.json()["status"] == "warming"
+            time.sleep(0.05)
+
+        assert response.status_code == 200
+        phases = response.json()["startup"]
+        assert {"lifespan", "warm_db", "warm_imports", "warmup", "total"} <= phases.keys()
+        assert phases["import"] == 3600
+        assert phases["total"] < 60
+
+
+def test_migration_check_sees_the_database_at_head():
+    heads = migrations.script_heads()
+    assert len(heads) == 1
+    assert migrations.database_revision(DATABASE_URL) in heads
+
+
+def test_shutdown_waits_for_background_tasks_before_disposing_the_engine(monkeypatch):
+    monkeypatch.setattr(startup, "WARMUP_UPSTREAMS", False)
+    monkeypatch.setattr(enrichment, "ENRICH_INTERVAL_SECONDS", 1)
+    events = []
+
+    async def worker_loop(client):
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await asyncio.sleep(0.05)  # e.g. releasing a lease
+            events.append("worker stopped")
+
+    class Engine:
+        async def dispose(self):
+            events.append("engine disposed")
+            await engine.dispose()
+
+    engine = main.async_engine
+    monkeypatch.setattr(enrichment, "worker_loop", worker_loop)
+    monkeypatch.setattr(main, "async_engine", Engine())
+
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+
+    assert events == ["worker stopped", "engine disposed"]
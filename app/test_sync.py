@@ -0,0 +1,109 @@
+import base64
+import json
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import models, sync
+from app.database import SessionLocal
+from app.main import app, create_access_token
+
+
+def test_changes_feed_returns_only_what_changed():
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"sync-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    records = [
+        {"external_id": f"sync-{tag}-{n}", "title": f"Title {n}", "type": "movie"}
+        for n in range(4)
+    ]
+
+    def changes(**params):
+        response = client.get("/user/items/changes", params=params, headers=headers)
+        assert response.status_code == 200
+        return response.json()
+
+    try:
+        with TestClient(app) as client:
+            ids = [
+                client.post("/user/items", json=record, headers=headers).json()["id"]
+                for record in records
+            ]
+
+            # full sync, two pages
+            first = changes(limit=3)
+            assert first["has_more"]
+            second = changes(since=first["next_cursor"], limit=3)
+            assert not second["has_more"]
+            assert [i["id"] for i in first["items"] + second["items"]] == ids
+            cursor = second["next_cursor"]
+
+            assert changes(since=cursor)["items"] == []
+
+            client.put(f"/user/items/{ids[1]}", json={"rating": 3}, headers=headers)
+            client.delete(f"/user/items/{ids[2]}", headers=headers)
+
+            delta = changes(since=cursor)
+            assert [(i["id"], i["rating"]) for i in delta["items"]] == [(ids[1], 3)]
+            assert delta["deleted"] == [{"id": ids[2], "external_id": records[2]["external_id"]}]
+            # a changed entry is exactly what /user/items has for it
+            listed = {i["id"]: i for i in client.get("/user/items", headers=headers).json()}
+            assert delta["items"][0] == listed[ids[1]]
+
+            # paging on keeps the sync's start time; draining the feed renews it
+            old = int(time.time()) - 3600
+            paused = changes(since=sync.encode_cursor(0, 0, old), limit=1)
+            assert paused["has_more"]
+            assert sync.decode_cursor(paused["next_cursor"])[2] == old
+            drained = changes(since=sync.encode_cursor(0, 0, old))
+            assert not drained["has_more"]
+            assert sync.decode_cursor(drained["next_cursor"])[2] > old
+
+            response = client.get("/user/items/changes", params={"since": "nope"}, headers=headers)
+            assert response.status_code == 400
+    finally:
+        db.execute(delete(models.UserItemTombstone).where(models.UserItemTombstone.user_id == user.id))
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.in_([r["external_id"] for r in records])))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
+
+
+def test_malformed_change_cursors_are_rejected_with_400():
+    db = SessionLocal()
+    user = models.User(username=f"sync-{uuid.uuid4().hex}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    now = int(time.time())
+    raw = lambda value: base64.urlsafe_b64encode(json.dumps(value).encode()).decode()  # noqa: E731
+    cursors = [
+        raw([1, 2, "x"]),
+        raw([1, 2, None]),
+        raw(["1", 2, now]),
+        raw([1, [2], now]),
+        raw([1, 2.5, now]),
+        raw([True, 2, now]),
+        raw([1, 2]),
+        raw({"version": 1}),
+    ]
+
+    try:
+        with TestClient(app) as client:
+            for cursor in cursors:
+                response = client.get("/user/items/changes", params={"since": cursor}, headers=headers)
+                assert response.status_code == 400, (cursor, response.text)
+
+            expired = raw([1, 2, now - int(sync.CURSOR_MAX_AGE_SECONDS) - 60])
+            response = client.get("/user/items/changes", params={"since": expired}, headers=headers)
+            assert response.status_code == 410
+    finally:
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
@@ -0,0 +1,53 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import check_stats, models
+from app.database import SessionLocal
+from app.main import app, create_access_token
+
+
+def test_list_changes_keep_user_stats_consistent():
+    db = SessionLocal()
+    tag = uuid.uuid4().hex
+    user = models.User(username=f"stats-{tag}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    records = [
+        {"external_id": f"stats-{tag}-{n}", "title": f"Title {n}", "type": type}
+        for n, type in enumerate(["movie", "movie", "book", "book"])
+    ]
+
+    try:
+        with TestClient(app) as client:
+            ids = [
+                client.post("/user/items", json=record, headers=headers).json()["id"]
+                for record in records[:2]
+            ]
+            # re-adding an existing entry must not count it twice
+            client.post("/user/items", json=records[0], headers=headers)
+            client.post("/user/items/bulk", json=records[1:], headers=headers)
+
+            client.put(f"/user/items/{ids[0]}", json={"status": "watched", "rating": 4}, headers=headers)
+            client.put(f"/user/items/{ids[1]}", json={"rating": 2}, headers=headers)
+            client.put(f"/user/items/{ids[1]}", json={"rating": None}, headers=headers)
+            client.delete(f"/user/items/{ids[1]}", headers=headers)
+
+            body = client.get("/user/stats", headers=headers).json()
+
+        assert body == {
+            "total": 3,
+            "by_status": {"plan": 2, "watched": 1},
+            "by_type": {"book": 2, "movie": 1},
+            "rating_count": 1,
+            "average_rating": 4.0,
+        }
+        assert check_stats.check(db, user.id) == 0
+    finally:
+        db.execute(delete(models.UserItem).where(models.UserItem.user_id == user.id))
+        db.execute(delete(models.Item).where(models.Item.external_id.in_([r["external_id"] for r in records])))
+        db.execute(delete(models.User).where(models.User.id == user.id))
+        db.commit()
+        db.close()
@@ -0,0 +1,49 @@
+"""
+Password hashing microbenchmark.
+
+Reports bcrypt hashes/sec for each cost factor, single-threaded and
+through a thread pool sized like the API's hashing executor, plus the
+per-core rate. Use it to pick BCRYPT_ROUNDS and HASH_WORKERS.
+
+    python bench/bcrypt_bench.py --rounds 10 11 12 --seconds 3
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+
+def hashes_per_second(context: CryptContext, workers: int, seconds: float) -> float:
+    def worker(deadline):
+        count = 0
+        while time.perf_counter() < deadline:
+            context.hash("correct horse battery staple")
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    deadline = start + seconds
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        total = sum(pool.map(worker, [deadline] * workers))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'1 thread/s':>11} {f'{args.workers} threads/s':>12} {'per core/s':>11}")
+    for rounds in args.rounds:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        single = hashes_per_second(context, 1, args.seconds)
+        pooled = hashes_per_second(context, args.workers, args.seconds)
+        print(f"{rounds:>6} {single:>11.1f} {pooled:>12.1f} {pooled / args.workers:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+API load test.
+
+Drives the real app through register/login, search, list, add, update
+and delete, and reports the error rate and, over successful requests,
+throughput and p50/p95/p99 latency for each.
+TMDb and Google Books are replaced by the deterministic stand-ins in
+bench/stub_providers.py, and everything the run creates is tagged and
+removed afterwards, so it can point at a development database.
+
+By default the app runs in-process behind an ASGI transport, against
+DATABASE_URL. With --url it targets a running server instead (start
+that with the stub provider URLs; see bench/stub_providers.py). In
+process, client and server share one event loop, so compare numbers
+from the same mode only.
+
+Results can be stored as a named baseline under bench/baselines/ and
+later runs diffed against it; --compare exits 1 on a regression.
+
+    python bench/load_bench.py --requests 300 --save-baseline local
+    python bench/load_bench.py --requests 300 --compare local
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+PASSWORD = "bench-password"
+WORDS = (
+    "star dark night river city ghost king blue house war love last "
+    "road moon iron glass winter storm garden silent"
+).split()
+
+SCENARIOS = ("register", "login", "search", "list", "add", "update", "delete")
+
+
+# =========================
+# Measurement
+# =========================
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(
+    requests: List[Callable[[], Awaitable[httpx.Response]]],
+    concurrency: int,
+) -> dict:
+    """
+    Run `requests` with `concurrency` in flight. Throughput and latencies
+    (in ms) cover successful requests only: a fast 429 or 500 would
+    otherwise read as an improvement.
+    """
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    queue = iter(requests)
+
+    async def worker():
+        for send in queue:
+            start = time.perf_counter()
+            try:
+                response = await send()
+                outcome = None if response.status_code < 400 else str(response.status_code)
+            except httpx.HTTPError as exc:
+                outcome = type(exc).__name__
+            if outcome:
+                errors[outcome] = errors.get(outcome, 0) + 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    failed = sum(errors.values())
+    total = len(latencies) + failed
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(failed / total, 4) if total else 0.0,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+# =========================
+# Seeding
+# =========================
+class BenchUser:
+    def __init__(self, username: str, token: str, list_size: int):
+        self.username = username
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.list_size = list_size
+        self.item_ids: List[int] = []
+        self.added_ids: List[int] = []
+
+
+async def register(client: httpx.AsyncClient, username: str) -> httpx.Response:
+    return await client.post("/auth/register", json={"username": username, "password": PASSWORD})
+
+
+async def seed_users(client: httpx.AsyncClient, tag: str, list_sizes, per_size: int) -> List[BenchUser]:
+    users = []
+    for size in list_sizes:
+        for n in range(per_size):
+            username = f"bench-{tag}-{size}-{n}"
+            response = await register(client, username)
+            response.raise_for_status()
+            user = BenchUser(username, response.json()["access_token"], size)
+            records = [
+                {"external_id": f"bench-{tag}-{size}-{n}-{i}", "title": f"Bench Title {i}",
+                 "type": "movie" if i % 2 else "book"}
+                for i in range(size)
+            ]
+            if records:
+                (await client.post("/user/items/bulk", json=records, headers=user.headers)).raise_for_status()
+            listed = await client.get("/user/items", headers=user.headers)
+            listed.raise_for_status()
+            user.item_ids = [row["id"] for row in listed.json()]
+            users.append(user)
+    return users
+
+
+# =========================
+# Scenarios
+# =========================
+def build_requests(name: str, client, users: List[BenchUser], args, tag: str, rng: random.Random):
+    """The request list for one scenario, fixed up front by the seed."""
+    count = args.auth_requests if name in ("register", "login") else args.requests
+
+    if name == "register":
+        return [lambda n=n: register(client, f"bench-{tag}-r{n}") for n in range(count)]
+
+    if name == "login":
+        picks = [rng.choice(users).username for _ in range(count)]
+        return [
+            lambda u=u: client.post("/auth/login", data={"username": u, "password": PASSWORD})
+            for u in picks
+        ]
+
+    if name == "search":
+        queries = [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(args.search_queries)]
+        picks = [(rng.choice(users), rng.choice(queries)) for _ in range(count)]
+        return [
+            lambda u=u, q=q: client.get(
+                "/search", params={"query": q, "source": args.search_source}, headers=u.headers
+            )
+            for u, q in picks
+        ]
+
+    if name.startswith("list"):
+        size = int(name[5:-1])
+        sized = [u for u in users if u.list_size == size]
+        return [
+            lambda u=u: client.get("/user/items", headers=u.headers)
+            for u in (rng.choice(sized) for _ in range(count))
+        ]
+
+    if name == "add":
+        async def add(user: BenchUser, n: int):
+            response = await client.post("/user/items", headers=user.headers, json={
+                "external_id": f"bench-{tag}-add-{n}", "title": f"Added {n}", "type": "movie",
+            })
+            if response.status_code < 400:
+                user.added_ids.append(response.json()["id"])
+            return response
+
+        return [lambda u=u, n=n: add(u, n) for n, u in enumerate(rng.choice(users) for _ in range(count))]
+
+    if name == "update":
+        with_items = [u for u in users if u.item_ids]
+        picks = []
+        for _ in range(count):
+            user = rng.choice(with_items)
+            picks.append((user, rng.choice(user.item_ids), rng.randint(1, 10), rng.choice(("plan", "watched"))))
+        return [
+            lambda u=u, i=i, r=r, s=s: client.put(
+                f"/user/items/{i}", json={"rating": r, "status": s}, headers=u.headers
+            )
+            for u, i, r, s in picks
+        ]
+
+    if name == "delete":
+        # removes what the add scenario created, so lists keep their seeded size
+        return [
+            lambda u=u, i=i: client.delete(f"/user/items/{i}", headers=u.headers)
+            for u in users for i in u.added_ids
+        ]
+
+    raise ValueError(name)
+
+
+# =========================
+# Baselines
+# =========================
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict) -> None:
+    print(f"{'scenario':<12} {'requests':>8} {'errors':>7} {'err %':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, r in results.items():
+        errors = sum(r["errors"].values())
+        print(
+            f"{name:<12} {r['requests']:>8} {errors:>7} {r['error_rate']:>6.1%} {r['rps']:>8.1f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+        )
+
+
+def compare(baseline: dict, results: dict, tolerance: float, error_tolerance: float) -> bool:
+    """
+    Print the diff against `baseline`; True if anything regressed.
+    Latency and throughput are compared relatively, the error rate in
+    absolute terms (baselines saved before it was recorded count as 0).
+    """
+    print(f"\nagainst baseline {baseline['meta']['name']!r} ({baseline['meta']['created']}, "
+          f"commit {baseline['meta'].get('commit')})")
+    print(f"{'scenario':<12} {'err %':>16} {'req/s':>18} {'p95 ms':>20} {'p99 ms':>20}")
+    regressed = False
+    for name, r in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<12} (not in baseline)")
+            continue
+
+        def change(key):
+            return (r[key] - old[key]) / old[key] if old[key] else 0.0
+
+        old_error_rate = old.get("error_rate", 0.0)
+        flags = []
+        if r["error_rate"] > old_error_rate + error_tolerance:
+            flags.append("errors")
+        if change("rps") < -tolerance:
+            flags.append("throughput")
+        if change("p95_ms") > tolerance:
+            flags.append("p95")
+        regressed |= bool(flags)
+        print(
+            f"{name:<12} {old_error_rate:>6.1%} -> {r['error_rate']:>6.1%} "
+            f"{old['rps']:>7.1f} -> {r['rps']:>7.1f} "
+            f"{old['p95_ms']:>8.2f} -> {r['p95_ms']:>8.2f} {change('p95_ms'):>+5.0%} "
+            f"{old['p99_ms']:>7.2f} -> {r['p99_ms']:>8.2f}"
+            + ("  REGRESSION: " + ", ".join(flags) if flags else "")
+        )
+    return regressed
+
+
+# =========================
+# Runner
+# =========================
+async def cleanup(tag: str) -> None:
+    from sqlalchemy import text
+
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        users = "SELECT id FROM users WHERE username LIKE :prefix"
+        await db.execute(text(f"DELETE FROM user_items WHERE user_id IN ({users})"), {"prefix": f"bench-{tag}-%"})
+        await db.execute(text("DELETE FROM users WHERE username LIKE :prefix"), {"prefix": f"bench-{tag}-%"})
+        await db.execute(text(
+            "DELETE FROM items WHERE (external_id LIKE :seeded OR external_id LIKE 'tmdb-stub%' "
+            "OR external_id LIKE 'gb-stub%') "
+            "AND NOT EXISTS (SELECT 1 FROM user_items WHERE user_items.item_id = items.id)"
+        ), {"seeded": f"bench-{tag}-%"})
+        await db.commit()
+
+
+async def bench(args) -> dict:
+    tag = uuid.uuid4().hex[:8]
+    rng = random.Random(args.seed)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        app = None
+    else:
+        # every in-process client shares one address, so per-client rate
+        # limits would measure the limiter rather than the app
+        os.environ.setdefault("ADMISSION_RATE_LIMITS", "false")
+        from bench import stub_providers
+        from app import catalog, providers
+        from app.main import app
+
+        stub = stub_providers.create_app(args.stub_latency_ms, args.stub_jitter_ms, args.stub_error_rate)
+        providers.create_http_client = lambda: httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=stub), base_url="http://stub"
+        )
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    scenarios = [s for s in SCENARIOS if s in args.scenarios]
+    results = {}
+    async with client:
+        lifespan = app.router.lifespan_context(app) if app is not None else None
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            start = time.perf_counter()
+            users = await seed_users(client, tag, args.list_sizes, args.users_per_size)
+            print(f"seeded {len(users)} users in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+            for scenario in scenarios:
+                names = [f"list[{size}]" for size in args.list_sizes] if scenario == "list" else [scenario]
+                for name in names:
+                    requests = build_requests(name, client, users, args, tag, rng)
+                    results[name] = await run_scenario(requests, args.concurrency)
+        finally:
+            if app is not None:
+                # let background catalog write-backs land before removing their rows
+                while catalog._pending_writes:
+                    await asyncio.sleep(0.05)
+            if not args.keep:
+                await cleanup(tag)
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--auth-requests", type=int, default=40, help="requests for register and login")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--list-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--users-per-size", type=int, default=2)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--search-source", default="upstream", choices=("auto", "local", "upstream"))
+    parser.add_argument("--search-queries", type=int, default=50, help="distinct search queries")
+    parser.add_argument("--stub-latency-ms", type=float, default=80)
+    parser.add_argument("--stub-jitter-ms", type=float, default=40)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="leave the seeded data in place")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="relative p95/throughput change counted as a regression")
+    parser.add_argument("--error-tolerance", type=float, default=0.01,
+                        help="rise in the error rate (a fraction of requests) counted as a regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    print_results(results)
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        meta = {
+            "name": args.save_baseline,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "mode": "url" if args.url else "asgi",
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "bcrypt_rounds": int(os.getenv("BCRYPT_ROUNDS", "12")),
+            "options": {
+                key: getattr(args, key)
+                for key in ("requests", "auth_requests", "concurrency", "list_sizes", "users_per_size",
+                            "search_source", "search_queries", "stub_latency_ms", "stub_jitter_ms",
+                            "stub_error_rate", "seed")
+            },
+        }
+        path.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+        print(f"\nsaved baseline {path}")
+
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        if compare(baseline, results, args.tolerance, args.error_tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
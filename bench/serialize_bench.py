@@ -0,0 +1,115 @@
+"""
+List serialization microbenchmark.
+
+Times the per-row cost of turning /user/items query rows into a
+response body, for the previous pipeline (row -> dict -> UserItemOut
+validation -> stdlib json) and the current one (precompiled row
+serializer -> orjson), and the cost and size of compressing the result.
+
+    python bench/serialize_bench.py --rows 50 500 5000
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/bench")  # never connected
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app import compression, schemas, serialization  # noqa: E402
+from app.main import USER_ITEM_COLUMNS, user_item_row_to_out  # noqa: E402
+
+Row = namedtuple("Row", [column.key for column in USER_ITEM_COLUMNS])
+
+
+def make_rows(count: int) -> list:
+    return [
+        Row(
+            id=1000 + n,
+            user_id=42,
+            item_id=5000 + n,
+            external_id=f"tmdb-{n}",
+            name=f"Some Movie Title {n}",
+            type="movie" if n % 2 else "book",
+            poster_url=f"https://image.tmdb.org/t/p/w500/poster{n}.jpg",
+            status=("plan", "watching", "watched")[n % 3],
+            rating=n % 10 or None,
+            review="Pretty good." if n % 4 == 0 else None,
+        )
+        for n in range(count)
+    ]
+
+
+def legacy_row_to_out(row) -> dict:
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "item_id": row.item_id,
+        "external_id": row.external_id,
+        "name": row.name,
+        "title": row.name,
+        "type": row.type,
+        "poster_url": row.poster_url,
+        "status": row.status,
+        "rating": row.rating,
+        "review": row.review,
+    }
+
+
+legacy_adapter = TypeAdapter(List[schemas.UserItemOut])
+
+
+def legacy_body(rows) -> bytes:
+    # what FastAPI did with response_model=List[UserItemOut] + JSONResponse
+    content = legacy_adapter.dump_python(
+        legacy_adapter.validate_python([legacy_row_to_out(row) for row in rows]), mode="json"
+    )
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def current_body(rows) -> bytes:
+    return serialization.dumps([user_item_row_to_out(row) for row in rows])
+
+
+def per_row_us(fn, rows, seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn(rows)
+        calls += 1
+    return (time.perf_counter() - start) / (calls * len(rows)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'before us/row':>14} {'after us/row':>13} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+        before = per_row_us(legacy_body, rows, args.seconds)
+        after = per_row_us(current_body, rows, args.seconds)
+        print(f"{count:>6} {before:>14.2f} {after:>13.2f} {before / after:>7.1f}x")
+
+    body = current_body(make_rows(max(args.rows)))
+    print(f"\n{len(body)} byte body ({max(args.rows)} rows)")
+    print(f"{'coding':>8} {'bytes':>9} {'ms':>7}")
+    codings = [("gzip", lambda b: gzip.compress(b, compresslevel=compression.GZIP_LEVEL))]
+    if compression.brotli is not None:
+        codings.append(("br", lambda b: compression.brotli.compress(b, quality=compression.BROTLI_QUALITY)))
+    for name, compress in codings:
+        start = time.perf_counter()
+        size = len(compress(body))
+        print(f"{name:>8} {size:>9} {(time.perf_counter() - start) * 1e3:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
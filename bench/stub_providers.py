@@ -0,0 +1,129 @@
+"""
+Deterministic local stand-ins for TMDb and Google Books.
+
+Serves the search and details endpoints the API calls, with results
+derived from the query text and a configurable, per-query latency, so
+load tests never touch the real providers and two runs see the same
+data.
+
+In-process, bench/load_bench.py mounts it behind an ASGI transport.
+Against a real server, run it next to the API:
+
+    uvicorn bench.stub_providers:app --port 9100
+    TMDB_SEARCH_URL=http://127.0.0.1:9100/3/search/movie \\
+    TMDB_MOVIE_URL=http://127.0.0.1:9100/3/movie \\
+    GOOGLE_BOOKS_API=http://127.0.0.1:9100/books/v1/volumes \\
+    uvicorn app.main:app
+
+    STUB_LATENCY_MS     base response time (default 80)
+    STUB_JITTER_MS      extra 0..N ms, fixed per query (default 40)
+    STUB_ERROR_RATE     share of queries answered with 503 (default 0)
+    STUB_RESULTS        results per provider per query (default 10)
+
+Faults can be changed while it runs, to exercise retries and circuit
+breakers: POST /_faults with any of latency_ms, jitter_ms, error_rate
+(in-process, update `app.state.faults`). `app.state.requests` counts
+the search requests served.
+"""
+import asyncio
+import hashlib
+import os
+
+from fastapi import Body, FastAPI, Query
+from fastapi.responses import JSONResponse
+
+
+def query_hash(query: str, salt: str = "") -> int:
+    return int.from_bytes(hashlib.sha1(f"{salt}:{query}".encode()).digest()[:8], "big")
+
+
+def create_app(
+    latency_ms: float = 80,
+    jitter_ms: float = 40,
+    error_rate: float = 0.0,
+    results: int = 10,
+) -> FastAPI:
+    stub = FastAPI(title="provider stubs")
+    stub.state.faults = {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate}
+    stub.state.requests = 0
+
+    async def respond(provider: str, query: str, body) -> JSONResponse:
+        stub.state.requests += 1
+        faults = stub.state.faults
+        h = query_hash(query, provider)
+        # the same query always takes the same time and gets the same answer
+        await asyncio.sleep((faults["latency_ms"] + (h % 1000) / 1000 * faults["jitter_ms"]) / 1000)
+        if (h >> 20) % 10000 < faults["error_rate"] * 10000:
+            return JSONResponse({"status_message": "stub outage"}, status_code=503)
+        return JSONResponse(body)
+
+    @stub.post("/_faults")
+    async def set_faults(faults: dict = Body(...)):
+        stub.state.faults.update(
+            (key, float(value)) for key, value in faults.items() if key in stub.state.faults
+        )
+        return stub.state.faults
+
+    @stub.get("/3/search/movie")
+    async def tmdb_search(query: str = Query(...), api_key: str = Query(None)):
+        h = query_hash(query)
+        return await respond("tmdb", query, {
+            "page": 1,
+            "results": [
+                {
+                    "id": f"stub{(h + n) % 1_000_000}",
+                    "title": f"{query.title()} {n}",
+                    "overview": f"Stub movie {n} for {query!r}.",
+                    "poster_path": f"/stub{(h + n) % 1_000_000}.jpg" if n % 4 else None,
+                }
+                for n in range(results)
+            ],
+        })
+
+    @stub.get("/3/movie/{movie_id}")
+    async def tmdb_movie(movie_id: str, api_key: str = Query(None)):
+        return await respond("tmdb", movie_id, {
+            "id": movie_id,
+            "title": f"Stub Movie {movie_id}",
+            "overview": f"Details of stub movie {movie_id}.",
+            "poster_path": f"/{movie_id}.jpg",
+        })
+
+    @stub.get("/books/v1/volumes/{volume_id}")
+    async def google_books_volume(volume_id: str):
+        return await respond("google_books", volume_id, {
+            "id": volume_id,
+            "volumeInfo": {
+                "title": f"Stub Book {volume_id}",
+                "description": f"Details of stub book {volume_id}.",
+                "imageLinks": {"thumbnail": f"http://books.example/{volume_id}.jpg"},
+            },
+        })
+
+    @stub.get("/books/v1/volumes")
+    async def google_books_search(q: str = Query(...)):
+        h = query_hash(q)
+        return await respond("google_books", q, {
+            "kind": "books#volumes",
+            "items": [
+                {
+                    "id": f"stub{(h + n) % 1_000_000}",
+                    "volumeInfo": {
+                        "title": f"{q.title()}: Volume {n}",
+                        "description": f"Stub book {n} for {q!r}.",
+                        "imageLinks": {"thumbnail": f"http://books.example/stub{n}.jpg"} if n % 3 else {},
+                    },
+                }
+                for n in range(results)
+            ],
+        })
+
+    return stub
+
+
+app = create_app(
+    latency_ms=float(os.getenv("STUB_LATENCY_MS", "80")),
+    jitter_ms=float(os.getenv("STUB_JITTER_MS", "40")),
+    error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+    results=int(os.getenv("STUB_RESULTS", "10")),
+)
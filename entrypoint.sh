@@ -1,8 +1,17 @@
 #!/bin/sh
 set -e
 
-echo "Running database migrations..."
-alembic upgrade head
+echo "Checking database migrations..."
+# runs `alembic upgrade head` only when the database isn't already at head
+python -m app.migrations
 
-echo "Starting FastAPI..."
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000
+# SERVER_MODE=production (default): gunicorn with a uvicorn worker per
+# CPU, see gunicorn.conf.py. SERVER_MODE=single: one uvicorn process.
+if [ "${SERVER_MODE:-production}" = "single" ]; then
+    echo "Starting FastAPI (single process)..."
+    exec uvicorn app.main:app --host 0.0.0.0 --port "${PORT:-8000}" --timeout-graceful-shutdown 30 \
+        --proxy-headers --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1,::1}"
+fi
+
+echo "Starting FastAPI (gunicorn)..."
+exec gunicorn app.main:app
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+
+from app import runtime
+
+# =========================
+# Production Server
+# =========================
+# gunicorn supervises uvicorn workers: `gunicorn app.main:app` from the
+# repository root picks this file up. Every worker is a separate process
+# with its own DB pool, caches and metrics.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# One worker per CPU the cgroup quota allows, unless WEB_CONCURRENCY says otherwise
+workers = int(os.getenv("WEB_CONCURRENCY") or runtime.cpu_limit())
+# The app reads it back to split the DB connection budget and the
+# password hashing threads between workers.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Workers add up their metrics through files in this directory, so that
+# /metrics covers the whole server whichever worker answers the scrape.
+# Set before the app is preloaded, which reads it.
+metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "app-metrics"))
+
+
+def on_starting(server):
+    # values left by a previous run would be counted again
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+# Import the app once in the master and fork it: workers start faster,
+# and a broken build fails before any worker is started.
+preload_app = True
+
+# Recycle each worker after this many requests, staggered so that the
+# workers don't all restart at once; 0 disables.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# On SIGTERM workers stop accepting connections and get this long to
+# finish requests in flight and run the lifespan shutdown.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# A worker silent for this long is killed and replaced.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# Idle keep-alive connections are closed after this long; behind a load
+# balancer keep it above the balancer's own idle timeout.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Proxies whose X-Forwarded-For/-Proto are trusted as the client's
+# address and scheme; rate limits are keyed on that address, so behind a
+# load balancer (Render, a k8s ingress) this must include it, or every
+# anonymous client shares the balancer's bucket. "*" trusts any peer:
+# only for a server that can't be reached except through the proxy.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
+
+accesslog = "-"
+errorlog = "-"